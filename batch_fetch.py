@@ -0,0 +1,234 @@
+"""
+銘柄ユニバースの一括取得（非対話のバッチ処理）
+進捗を状態ファイルに記録し、中断した場合は次回の実行で未完了の銘柄から再開する
+"""
+
+import os
+import json
+import time
+import hashlib
+import datetime as dt
+from typing import Optional, Dict, List, Iterable
+import logging
+
+from stock_data_fetcher import JapaneseStockDataFetcher
+
+logger = logging.getLogger(__name__)
+
+
+def load_universe(path: str) -> List[str]:
+    """
+    銘柄コードのファイルを読み込む
+
+    1行に1銘柄（カンマ区切りも可）。#以降はコメントとして無視し、重複は最初の1件のみ残す。
+
+    Args:
+        path (str): 銘柄コードのファイル
+
+    Returns:
+        List[str]: 銘柄コードのリスト
+    """
+    codes = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            codes.extend(code.strip() for code in line.split(',') if code.strip())
+    return list(dict.fromkeys(codes))
+
+
+class FetchCheckpoint:
+    """
+    一括取得の進捗を記録する状態ファイル
+
+    取得条件（データソース・期間・銘柄リスト）が同じ未完了の実行があれば、その進捗を引き継ぐ。
+    書き込みは一時ファイルからの置き換えで行うため、途中で強制終了しても状態ファイルは壊れない。
+    """
+
+    def __init__(self, path: str, source: str, since: str, until: Optional[str], codes: Iterable[str],
+                 flush_interval: float = 1.0):
+        """
+        初期化（条件の一致する未完了の状態ファイルがあれば読み込む）
+
+        Args:
+            path (str): 状態ファイルのパス
+            source (str): データソース
+            since (str): 取得開始日
+            until (str): 取得終了日（Noneの場合は最初の実行の当日。再開時は状態ファイルに記録した日付を使う）
+            codes (Iterable[str]): 銘柄コードのリスト
+            flush_interval (float): 状態ファイルに書き込む最短の間隔（秒）
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        digest = hashlib.sha1("\n".join(codes).encode()).hexdigest()
+        # 終了日を省略した実行は、日付が変わってから再開しても同じ実行として扱う
+        self.run_key = f"{source}|{since}|{until or 'today'}|{digest}"
+        self.until = until
+        self.completed: Dict[str, int] = {}
+        self.failed: Dict[str, str] = {}
+        self.finished = False
+        self._last_flush = 0.0
+
+        state = self._read()
+        if state and state.get('run_key') == self.run_key and not state.get('finished'):
+            self.completed = state.get('completed', {})
+            self.failed = state.get('failed', {})
+            self.until = state.get('until') or until
+            logger.info(f"前回の実行を再開します: 完了 {len(self.completed)}件 ({path})")
+        self.until = self.until or dt.date.today().strftime('%Y-%m-%d')
+
+    def reset(self, until: Optional[str] = None):
+        """進捗を破棄して最初から取得する（終了日を省略した場合は当日に決め直す）"""
+        self.completed, self.failed = {}, {}
+        self.until = until or dt.date.today().strftime('%Y-%m-%d')
+
+    def _read(self) -> Optional[Dict]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"状態ファイルを読み込めないため最初から取得します: {self.path} ({e})")
+            return None
+
+    def mark(self, code: str, rows: Optional[int], error: Optional[str]):
+        """銘柄の処理結果を記録（失敗した銘柄は次回の再開時に再取得する）"""
+        if error is None:
+            self.completed[code] = rows or 0
+            self.failed.pop(code, None)
+        else:
+            self.failed[code] = error
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, finished: bool = False):
+        """状態ファイルに書き込む"""
+        self.finished = finished
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'run_key': self.run_key,
+                'until': self.until,
+                'updated_at': dt.datetime.now().isoformat(timespec='seconds'),
+                'finished': finished,
+                'completed': self.completed,
+                'failed': self.failed,
+            }, f)
+        os.replace(self.path + '.tmp', self.path)
+        self._last_flush = time.monotonic()
+
+
+class ProgressReporter:
+    """処理済み件数からスループットと残り時間を表示する"""
+
+    def __init__(self, total: int, interval: float = 10.0):
+        """
+        初期化
+
+        Args:
+            total (int): 今回処理する銘柄数
+            interval (float): 進捗を表示する間隔（秒）
+        """
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.rows = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def update(self, rows: Optional[int], error: Optional[str]):
+        """1銘柄分の結果を反映し、一定間隔で進捗を表示"""
+        self.done += 1
+        if error is None:
+            self.rows += rows or 0
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.interval or self.done == self.total:
+            self._last_report = now
+            print(self.line(), flush=True)
+
+    def line(self) -> str:
+        """進捗の1行表示"""
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = (self.total - self.done) / rate if rate > 0 else float('nan')
+        eta = str(dt.timedelta(seconds=int(remaining))) if remaining == remaining else "--:--:--"
+        return (f"[{self.done}/{self.total}] {rate:.2f}銘柄/秒, {self.rows / elapsed if elapsed > 0 else 0:.0f}行/秒, "
+                f"失敗 {self.failed}件, 残り約 {eta}")
+
+
+def run_fetch(fetcher: JapaneseStockDataFetcher,
+              codes: List[str],
+              source: str = "stooq",
+              since: str = "2022-01-01",
+              until: Optional[str] = None,
+              workers: int = 4,
+              state_path: str = "stock_data/fetch_state.json",
+              batch_size: Optional[int] = None,
+              max_pending: Optional[int] = None,
+              restart: bool = False,
+              report_interval: float = 10.0) -> Dict:
+    """
+    銘柄ユニバースを一括取得して保存する
+
+    Args:
+        fetcher (JapaneseStockDataFetcher): 取得に使うインスタンス
+        codes (List[str]): 銘柄コードのリスト
+        source (str): データソース
+        since (str): 取得開始日（YYYY-MM-DD形式）
+        until (str): 取得終了日（YYYY-MM-DD形式。省略時は当日。中断した実行の再開時は最初の実行の当日）
+        workers (int): 同時に処理する銘柄数
+        state_path (str): 進捗を記録する状態ファイルのパス
+        batch_size (int): Yahoo Financeから1回のリクエストでまとめて取得する銘柄数
+        max_pending (int): 取得中・受け取り待ちの銘柄数の上限（同時に保持するデータの上限になる）
+        restart (bool): 状態ファイルの進捗を使わず最初から取得するか
+        report_interval (float): 進捗を表示する間隔（秒）
+
+    Returns:
+        Dict: 実行結果の集計（total, skipped, succeeded, failed, rows, seconds, codes_per_sec, rows_per_sec, errors）
+    """
+    checkpoint = FetchCheckpoint(state_path, source, since, until, codes)
+    if restart:
+        checkpoint.reset(until)
+    # 終了日を省略した場合は、中断した実行の再開でも最初の実行と同じ終了日で取得する
+    until = checkpoint.until
+
+    pending = [code for code in codes if code not in checkpoint.completed]
+    skipped = len(codes) - len(pending)
+    if skipped:
+        print(f"前回の実行で完了済みの {skipped}銘柄をスキップします")
+    print(f"{len(pending)}銘柄を{source}から取得します（{since} - {until}, 並列数 {workers}）", flush=True)
+
+    progress = ProgressReporter(len(pending), interval=report_interval)
+
+    def on_result(code: str, data, error: Optional[str]):
+        rows = len(data) if data is not None else None
+        checkpoint.mark(code, rows, error)
+        progress.update(rows, error)
+
+    try:
+        # 保存はiter_stocks内で行うため、受け取ったデータはそのまま破棄する
+        for _ in fetcher.iter_stocks(pending, since, until, source=source, max_workers=workers,
+                                     batch_size=batch_size, max_pending=max_pending, on_result=on_result):
+            pass
+    finally:
+        # 中断された場合も、それまでの進捗を書き込んでおく
+        checkpoint.flush(finished=not any(code not in checkpoint.completed for code in codes))
+
+    elapsed = time.monotonic() - progress.started
+    errors = {code: checkpoint.failed[code] for code in pending if code in checkpoint.failed}
+    return {
+        'total': len(codes),
+        'skipped': skipped,
+        'succeeded': progress.done - progress.failed,
+        'failed': len(errors),
+        'rows': progress.rows,
+        'seconds': round(elapsed, 2),
+        'codes_per_sec': round(progress.done / elapsed, 2) if elapsed > 0 else 0.0,
+        'rows_per_sec': round(progress.rows / elapsed, 1) if elapsed > 0 else 0.0,
+        'errors': errors,
+    }
@@ -0,0 +1,246 @@
+"""
+株価データ取得のオフラインベンチマーク
+ローカルのスタンドインサーバー（stand_in_server.py）に対して取得・保存を実行し、
+スループット・レイテンシ・メモリ使用量を計測する
+
+使用方法:
+    python benchmark.py --tickers 50 --latency 0.02 --workers 8
+    python benchmark.py --json result.json
+    python benchmark.py --baseline result.json --tolerance 0.2
+    python benchmark.py --import-runs 10   # 起動時のimport時間も計測
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+from typing import Callable, Dict, List
+
+from stand_in_server import StandInServer
+from stock_data_fetcher import JapaneseStockDataFetcher
+
+# 値が大きいほど良い指標（それ以外は小さいほど良い）
+HIGHER_IS_BETTER = {"requests_per_sec", "rows_per_sec"}
+
+# 新しいプロセスで計測するimport（プロバイダーは最初に使用する時点で読み込まれる）
+COLD_START_SCENARIOS = {
+    "import_stock_data_fetcher": "import stock_data_fetcher",
+    "import_with_stooq": "import stock_data_fetcher, providers; providers.get_provider('stooq')",
+    "import_with_all_providers": ("import stock_data_fetcher, providers; "
+                                  "providers.get_provider('stooq'); providers.get_provider('yahoo')"),
+}
+
+
+def peak_rss_mb() -> float:
+    """プロセスの最大常駐メモリ（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(calls: List[Callable[[], int]]) -> Dict[str, float]:
+    """
+    呼び出しを順に実行し、レイテンシ・スループットを集計
+
+    Args:
+        calls (List[Callable[[], int]]): 処理した行数を返す関数のリスト
+
+    Returns:
+        Dict[str, float]: 計測結果
+    """
+    latencies = []
+    rows = 0
+    started = time.perf_counter()
+    for call in calls:
+        t0 = time.perf_counter()
+        rows += call()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(time.perf_counter() - started, latencies, rows)
+
+
+def summarize(elapsed: float, latencies: List[float], rows: int) -> Dict[str, float]:
+    """計測値をまとめる"""
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.array([0.0])
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 4),
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+        "rows": rows,
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_benchmarks(args) -> Dict[str, Dict[str, float]]:
+    """スタンドインサーバーを起動してすべてのシナリオを実行"""
+    codes = [str(1000 + i) for i in range(args.tickers)]
+    start_date, end_date = args.start, args.end
+    data_dir = tempfile.mkdtemp(prefix="stock_bench_")
+    results = {}
+
+    try:
+        with StandInServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           recordings_dir=args.recordings) as server:
+            # キャッシュを使うと2回目以降は通信しないため、取得の計測では無効にする
+            fetcher = JapaneseStockDataFetcher(data_dir, use_cache=False,
+                                               session=server.session(pool_maxsize=max(10, args.workers)))
+
+            results["get_stock_data_stooq"] = measure(
+                [lambda c=c: len(fetcher.get_stock_data_stooq(c, start_date, end_date)) for c in codes])
+            results["get_stock_data_yahoo"] = measure(
+                [lambda c=c: len(fetcher.get_stock_data_yahoo(c, start_date, end_date)) for c in codes])
+            results["get_realtime_price"] = measure(
+                [lambda c=c: int(bool(fetcher.get_realtime_price(c, use_cache=False))) for c in codes])
+
+            for source in ("stooq", "yahoo"):
+                per_ticker = []
+                load = getattr(fetcher, f"_load_{source}")
+
+                # 銘柄ごとのレイテンシを計測するため、このインスタンスの取得処理だけを計測付きにする
+                def timed_load(*load_args, load=load, per_ticker=per_ticker):
+                    t0 = time.perf_counter()
+                    try:
+                        return load(*load_args)
+                    finally:
+                        per_ticker.append(time.perf_counter() - t0)
+
+                setattr(fetcher, f"_load_{source}", timed_load)
+                t0 = time.perf_counter()
+                fetched = fetcher.get_multiple_stocks(codes, start_date, end_date,
+                                                      source=source, max_workers=args.workers)
+                elapsed = time.perf_counter() - t0
+                delattr(fetcher, f"_load_{source}")
+                results[f"get_multiple_stocks_{source}"] = summarize(
+                    elapsed, per_ticker, sum(len(df) for df in fetched.values()))
+
+            frame = fetcher.get_stock_data_stooq(codes[0], start_date, end_date)
+            results["save_to_csv"] = measure(
+                [lambda c=c: (fetcher.save_to_csv(frame, c, "stooq"), len(frame))[1] for c in codes])
+            results["save"] = measure(
+                [lambda c=c: (fetcher.save(frame, c, "stooq"), len(frame))[1] for c in codes])
+
+            results["server"] = dict(server.counts)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return results
+
+
+def measure_cold_start(runs: int) -> Dict[str, Dict[str, float]]:
+    """
+    新しいプロセスでのimport時間を計測（CLIを起動するたびに発生する時間）
+
+    Args:
+        runs (int): シナリオごとの計測回数
+
+    Returns:
+        Dict[str, Dict[str, float]]: シナリオ名をキーとした計測結果
+    """
+    results = {}
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    for name, statement in COLD_START_SCENARIOS.items():
+        latencies = []
+        for _ in range(runs):
+            script = f"import time; t0 = time.perf_counter(); {statement}; print(time.perf_counter() - t0)"
+            completed = subprocess.run([sys.executable, "-c", script], cwd=repo_dir,
+                                       capture_output=True, text=True, check=True)
+            latencies.append(float(completed.stdout.split()[-1]))
+        results[name] = summarize(sum(latencies), latencies, 0)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    ベースラインと比べて悪化した指標を返す
+
+    Args:
+        results (Dict): 今回の計測結果
+        baseline (Dict): ベースラインの計測結果
+        tolerance (float): 許容する悪化の割合（0.2なら20%）
+
+    Returns:
+        List[str]: 悪化した指標の説明
+    """
+    regressions = []
+    for name, metrics in results.items():
+        if name == "server" or name not in baseline:
+            continue
+        for key in ("requests_per_sec", "rows_per_sec", "p50_ms", "p99_ms"):
+            old, new = baseline[name].get(key), metrics.get(key)
+            if not old or new is None:
+                continue
+            if key in HIGHER_IS_BETTER:
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append(f"{name}.{key}: {old} -> {new}")
+    return regressions
+
+
+def print_results(results: Dict):
+    """計測結果を表形式で表示"""
+    header = f"{'シナリオ':<28} {'req/s':>9} {'p50(ms)':>9} {'p99(ms)':>9} {'rows/s':>11} {'RSS(MB)':>9}"
+    print(header)
+    print("=" * len(header))
+    for name, m in results.items():
+        if name == "server":
+            continue
+        print(f"{name:<28} {m['requests_per_sec']:>9.1f} {m['p50_ms']:>9.2f} {m['p99_ms']:>9.2f} "
+              f"{m['rows_per_sec']:>11.1f} {m['peak_rss_mb']:>9.1f}")
+    print(f"\nスタンドインサーバーへのリクエスト数: {results.get('server', {})}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="株価データ取得のオフラインベンチマーク")
+    parser.add_argument("--tickers", type=int, default=20, help="銘柄数")
+    parser.add_argument("--start", default="2022-01-01", help="取得開始日")
+    parser.add_argument("--end", default="2024-12-31", help="取得終了日")
+    parser.add_argument("--latency", type=float, default=0.01, help="サーバーの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="応答遅延に加える乱数の最大値（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す割合（0〜1）")
+    parser.add_argument("--workers", type=int, default=8, help="一括取得の並列数")
+    parser.add_argument("--recordings", help="記録済みの応答を置いたディレクトリ")
+    parser.add_argument("--import-runs", type=int, default=5, help="起動時のimport時間の計測回数（0で計測しない）")
+    parser.add_argument("--json", help="計測結果を保存するJSONファイル")
+    parser.add_argument("--baseline", help="比較するベースラインのJSONファイル")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="ベースラインから許容する悪化の割合")
+    args = parser.parse_args(argv)
+
+    # 計測中は取得ごとのログを出さない
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = run_benchmarks(args)
+    if args.import_runs > 0:
+        results.update(measure_cold_start(args.import_runs))
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"計測結果を保存しました: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nベースラインから悪化した指標:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nベースラインからの悪化はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+チャート描画用のデータ集約
+表示期間に応じて日足を週足・月足にまとめる、または折れ線をLTTB法で間引き、
+描画する点の数を期間によらず上限以下に抑える
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+
+# 描画する点の数の上限の既定値
+MAX_POINTS = 500
+
+# 足の種類（細かい順）と、集約に使う期間の単位
+LEVELS = (
+    ("日足", None),
+    ("週足", "W-FRI"),
+    ("月足", "MS"),
+    ("四半期足", "QS"),
+    ("年足", "YS"),
+)
+
+_OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def resample_ohlcv(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """
+    日足を指定した期間単位のOHLCVにまとめる
+
+    Args:
+        df (pd.DataFrame): 日足（日付の古い順）
+        rule (str): 期間の単位（"W-FRI", "MS" など）
+
+    Returns:
+        pd.DataFrame: 期間ごとのOHLCV（インデックスは各期間の最後の取引日）
+    """
+    agg = {col: how for col, how in _OHLCV_AGG.items() if col in df.columns}
+    grouper = pd.Grouper(freq=rule)
+    bars = df[list(agg)].groupby(grouper).agg(agg)
+    # 期間の区切りではなく、実際の最後の取引日を日付にする
+    last_dates = df.index.to_series().groupby(grouper).last()
+    bars = bars[last_dates.notna()]
+    bars.index = pd.DatetimeIndex(last_dates.dropna().to_numpy(), name=df.index.name)
+    return bars
+
+
+def choose_level(df: pd.DataFrame, max_points: int = MAX_POINTS, minimum: str = "日足") -> Tuple[str, Optional[str]]:
+    """
+    点の数が上限以下になる最も細かい足の種類を選ぶ
+
+    Args:
+        df (pd.DataFrame): 日足（日付の古い順）
+        max_points (int): 描画する点の数の上限
+        minimum (str): これより細かい足は選ばない（ユーザーが選んだ足の種類）
+
+    Returns:
+        Tuple[str, Optional[str]]: (足の種類, 期間の単位)。日足の場合の期間の単位はNone
+    """
+    names = [name for name, _ in LEVELS]
+    start = names.index(minimum) if minimum in names else 0
+    for name, rule in LEVELS[start:]:
+        if rule is None:
+            count = len(df)
+        else:
+            count = int((df.index.to_series().groupby(pd.Grouper(freq=rule)).size() > 0).sum())
+        if count <= max_points:
+            return name, rule
+    return LEVELS[-1]
+
+
+def ohlcv_for_chart(df: pd.DataFrame, max_points: int = MAX_POINTS, minimum: str = "日足") -> Tuple[pd.DataFrame, str]:
+    """
+    ローソク足・出来高のチャート用に、点の数が上限以下になるよう日足をまとめる
+
+    Args:
+        df (pd.DataFrame): 日足（日付の古い順）
+        max_points (int): 描画する点の数の上限
+        minimum (str): 最も細かい足の種類
+
+    Returns:
+        Tuple[pd.DataFrame, str]: (まとめたOHLCV, 足の種類)
+    """
+    name, rule = choose_level(df, max_points, minimum)
+    if rule is None:
+        return df, name
+    bars = resample_ohlcv(df, rule)
+    # 年足でも上限を超える場合は末尾（新しい期間）のみ表示する
+    return bars.iloc[-max_points:], name
+
+
+def lttb_indices(y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets法で、折れ線の形を保つように間引く点の位置を選ぶ
+
+    x軸は等間隔（取引日の順番）とみなす。最初と最後の点は必ず残す。
+
+    Args:
+        y (np.ndarray): 値
+        n (int): 残す点の数（3以上）
+
+    Returns:
+        np.ndarray: 残す点の位置（昇順）
+    """
+    length = len(y)
+    if n >= length or n < 3:
+        return np.arange(length)
+
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(length, dtype=np.float64)
+    # 最初と最後を除いた点をn-2個のバケットに分ける
+    edges = np.linspace(1, length - 1, n - 1).astype(np.int64)
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+
+    previous = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 次のバケットの平均（最後のバケットでは最後の点）
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else length
+        avg_x = x[next_lo:next_hi].mean() if next_hi > next_lo else x[-1]
+        avg_y = np.nanmean(y[next_lo:next_hi]) if next_hi > next_lo else y[-1]
+        # 前に選んだ点・次のバケットの平均と作る三角形の面積が最大の点を選ぶ
+        area = np.abs((x[previous] - avg_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (avg_y - y[previous]))
+        previous = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        selected[i + 1] = previous
+    return selected
+
+
+def line_for_chart(series: pd.Series, max_points: int = MAX_POINTS) -> pd.Series:
+    """
+    折れ線のチャート用に、点の数が上限以下になるよう間引く
+
+    Args:
+        series (pd.Series): 値（日付の古い順）
+        max_points (int): 描画する点の数の上限
+
+    Returns:
+        pd.Series: 間引いた値
+    """
+    if len(series) <= max_points:
+        return series
+    return series.iloc[lttb_indices(series.to_numpy(), max_points)]
+
+
+def rows_for_heatmap(df: pd.DataFrame, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """
+    ヒートマップ用に、日付の数が上限以下になるよう等間隔に行を選ぶ（最後の行は必ず残す）
+
+    Args:
+        df (pd.DataFrame): 日付 × 銘柄 の値（日付の古い順）
+        max_points (int): 日付の数の上限
+
+    Returns:
+        pd.DataFrame: 選んだ行
+    """
+    if len(df) <= max_points:
+        return df
+    step = -(-len(df) // max_points)
+    return df.iloc[::-1].iloc[::step].iloc[::-1]
@@ -0,0 +1,222 @@
+"""
+複数銘柄の比較
+終値を共通の日付の軸に1回だけ揃えた 日付 × 銘柄 の2次元配列から、
+正規化終値・リターン・相関行列・ドローダウン・ベータを全銘柄分まとめて計算する
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, Iterable
+import logging
+from indicators import as_array, wrap
+
+logger = logging.getLogger(__name__)
+
+
+def align_closes(closes: Dict[str, pd.Series], dates: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    銘柄ごとの終値を共通の日付の軸に揃える
+
+    Args:
+        closes (Dict[str, pd.Series]): 銘柄コードをキーとした終値（日付インデックス）
+        dates (pd.DatetimeIndex): 日付の軸（JPXCalendar.sessionsなど）
+
+    Returns:
+        pd.DataFrame: 日付 × 銘柄 の終値（データの無い日は欠損。全銘柄にデータの無い日の行は除く）
+    """
+    values = np.full((len(dates), len(closes)), np.nan)
+    for j, series in enumerate(closes.values()):
+        positions = dates.get_indexer(series.index)
+        found = positions >= 0
+        values[positions[found], j] = series.to_numpy(dtype=np.float64)[found]
+    has_data = ~np.isnan(values).all(axis=1)
+    return pd.DataFrame(values[has_data], index=dates[has_data], columns=pd.Index(list(closes), name="code"))
+
+
+def load_closes(fetcher,
+                codes: Iterable[str],
+                start_date: str,
+                end_date: str,
+                source: str = "stooq",
+                from_store: bool = False,
+                max_workers: int = 8,
+                save: bool = False) -> pd.DataFrame:
+    """
+    複数銘柄の終値を取得して共通の日付の軸に揃える
+
+    Args:
+        fetcher (JapaneseStockDataFetcher): 取得に使うインスタンス
+        codes (Iterable[str]): 銘柄コード
+        start_date (str): 開始日（YYYY-MM-DD形式）
+        end_date (str): 終了日（YYYY-MM-DD形式）
+        source (str): データソース（stooq または yahoo）
+        from_store (bool): ストレージに保存済みのデータのみを読み込む（ネットワークにはアクセスしない）
+        max_workers (int): 同時に取得する銘柄数
+        save (bool): 取得したデータをストレージに保存するか
+
+    Returns:
+        pd.DataFrame: 日付 × 銘柄 の終値（列は指定した順。取得できなかった銘柄は含まない）
+    """
+    codes = list(dict.fromkeys(code.replace('.T', '') for code in codes))
+    if not codes:
+        return pd.DataFrame()
+
+    if from_store:
+        wide = fetcher.load_stock_data(codes, start_date, end_date, columns=["Close"], source=source, layout="wide")
+        if wide.empty:
+            return pd.DataFrame()
+        wide = wide[[code for code in codes if code in wide.columns]].astype(np.float64)
+        return wide[wide.notna().any(axis=1)]
+
+    closes = {}
+    for code, df in fetcher.iter_stocks(codes, start_date, end_date, source=source,
+                                        max_workers=max_workers, save=save):
+        closes[code] = df["Close"]
+    if not closes:
+        return pd.DataFrame()
+    if fetcher.last_errors:
+        logger.warning(f"{len(fetcher.last_errors)}銘柄のデータを取得できませんでした")
+
+    first = min(series.index[0] for series in closes.values())
+    last = max(series.index[-1] for series in closes.values())
+    # 取得が完了した順ではなく、指定した銘柄の順に並べる
+    ordered = {code: closes[code] for code in codes if code in closes}
+    return align_closes(ordered, fetcher.calendar.sessions(first, last))
+
+
+def normalized(close, base: float = 100.0):
+    """最初の有効値をbaseとした終値"""
+    values = as_array(close)
+    valid = ~np.isnan(values)
+    first = values[valid.argmax(axis=0), np.arange(values.shape[1])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap(values / first * base, close)
+
+
+def returns(close):
+    """前日比のリターン（先頭の行と、前日または当日が欠損の日は欠損）"""
+    values = as_array(close)
+    result = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[1:] = values[1:] / values[:-1] - 1.0
+    return wrap(result, close)
+
+
+def correlation(returns, min_periods: int = 20) -> pd.DataFrame:
+    """
+    リターンの相関行列
+
+    銘柄の組ごとに両方のリターンがある日のみを使う（pandasのDataFrame.corrと同じ扱い）。
+    全組の和を行列積で一度に求めるため、銘柄数が数百でも組ごとのループは行わない。
+
+    Args:
+        returns (pd.DataFrame): 日付 × 銘柄 のリターン
+        min_periods (int): 相関を求めるのに必要な日数（下回る組は欠損）
+
+    Returns:
+        pd.DataFrame: 銘柄 × 銘柄 の相関係数
+    """
+    values = as_array(returns)
+    valid = (~np.isnan(values)).astype(np.float64)
+    x = np.where(valid > 0, values, 0.0)
+
+    # 組(i, j)ごとの 日数・xiの和・xi^2の和・xi*xjの和（両方のリターンがある日のみ）
+    count = valid.T @ valid
+    sum_x = x.T @ valid
+    sum_xx = (x * x).T @ valid
+    sum_xy = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = count * sum_xy - sum_x * sum_x.T
+        var = (count * sum_xx - sum_x ** 2) * (count * sum_xx - sum_x ** 2).T
+        corr = np.clip(cov / np.sqrt(var), -1.0, 1.0)
+    corr[count < max(min_periods, 2)] = np.nan
+
+    labels = returns.columns if isinstance(returns, pd.DataFrame) else None
+    return pd.DataFrame(corr, index=labels, columns=labels)
+
+
+def drawdown(close):
+    """直近の最高値からの下落率（0以下。欠損の日は欠損）"""
+    values = as_array(close)
+    peak = np.fmax.accumulate(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return wrap(values / peak - 1.0, close)
+
+
+def market_returns(returns) -> np.ndarray:
+    """全銘柄の等加重平均のリターン（ベータの基準に使う）"""
+    values = as_array(returns)
+    with np.errstate(invalid='ignore'):
+        counts = (~np.isnan(values)).sum(axis=1)
+        total = np.where(np.isnan(values), 0.0, values).sum(axis=1)
+        return np.where(counts > 0, total / np.maximum(counts, 1), np.nan)
+
+
+def beta(returns, benchmark, min_periods: int = 20):
+    """
+    基準のリターンに対するベータ
+
+    Args:
+        returns (pd.DataFrame): 日付 × 銘柄 のリターン
+        benchmark (np.ndarray または pd.Series): 同じ日付の基準のリターン
+        min_periods (int): ベータを求めるのに必要な日数（下回る銘柄は欠損）
+
+    Returns:
+        pd.Series: 銘柄ごとのベータ（入力が配列の場合は配列）
+    """
+    values = as_array(returns)
+    bench = as_array(benchmark)[:, :1]
+    valid = ~np.isnan(values) & ~np.isnan(bench)
+    x = np.where(valid, values, 0.0)
+    b = np.where(valid, bench, 0.0)
+
+    count = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = x.sum(axis=0) / count
+        mean_b = b.sum(axis=0) / count
+        b_dev = np.where(valid, b - mean_b, 0.0)
+        cov = (np.where(valid, x - mean_x, 0.0) * b_dev).sum(axis=0)
+        result = cov / (b_dev ** 2).sum(axis=0)
+    result[count < max(min_periods, 2)] = np.nan
+
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(result, index=returns.columns, name="beta")
+    return result
+
+
+def summary(close: pd.DataFrame,
+            benchmark: Optional[pd.Series] = None,
+            periods_per_year: int = 252) -> pd.DataFrame:
+    """
+    銘柄ごとの比較指標
+
+    Args:
+        close (pd.DataFrame): 日付 × 銘柄 の終値
+        benchmark (pd.Series): ベータの基準とする終値（省略時は全銘柄の等加重平均）
+        periods_per_year (int): 年率換算に使う1年の取引日数
+
+    Returns:
+        pd.DataFrame: 銘柄ごとの 騰落率(change)・最高値(high)・最安値(low)・年率ボラティリティ(volatility)・
+                      最大ドローダウン(max_drawdown)・ベータ(beta)・日数(days)
+    """
+    values = as_array(close)
+    daily = returns(values)
+    if benchmark is None:
+        bench = market_returns(daily)
+    else:
+        bench = returns(as_array(benchmark.reindex(close.index)))[:, 0]
+
+    valid = ~np.isnan(values)
+    last = values[values.shape[0] - 1 - valid[::-1].argmax(axis=0), np.arange(values.shape[1])]
+    with np.errstate(invalid='ignore'):
+        result = pd.DataFrame({
+            'change': last / values[valid.argmax(axis=0), np.arange(values.shape[1])] - 1.0,
+            'high': np.nanmax(values, axis=0),
+            'low': np.nanmin(values, axis=0),
+            'volatility': np.nanstd(daily, axis=0, ddof=1) * np.sqrt(periods_per_year),
+            'max_drawdown': np.nanmin(drawdown(values), axis=0),
+            'beta': beta(daily, bench),
+            'days': valid.sum(axis=0),
+        }, index=close.columns)
+    return result
@@ -3,9 +3,14 @@
 参考: https://techblog.gmo-ap.jp/2022/06/07/pythonstockdata/
 """
 
+import logging
 from stock_data_fetcher import JapaneseStockDataFetcher
+from ohlcv_schema import newest_first
 import datetime as dt
 
+# ログ設定
+logging.basicConfig(level=logging.INFO)
+
 def main():
     """使用例のメイン関数"""
     
@@ -24,11 +29,11 @@ def main():
     if not toyota_stooq.empty:
         print(f"取得件数: {len(toyota_stooq)}件")
         print("最新5件:")
-        print(toyota_stooq.head())
+        print(newest_first(toyota_stooq).head())
         print()
         
-        # CSVファイルに保存
-        fetcher.save_to_csv(toyota_stooq, "7203", "stooq")
+        # ストレージに保存
+        fetcher.save(toyota_stooq, "7203", "stooq")
     
     # 例2: ソニーグループの株価データをYahoo Financeから取得
     print("例2: ソニーグループの株価データをYahoo Financeから取得")
@@ -38,11 +43,11 @@ def main():
     if not sony_yahoo.empty:
         print(f"取得件数: {len(sony_yahoo)}件")
         print("最新5件:")
-        print(sony_yahoo.head())
+        print(newest_first(sony_yahoo).head())
         print()
         
-        # CSVファイルに保存
-        fetcher.save_to_csv(sony_yahoo, "6758", "yahoo")
+        # ストレージに保存
+        fetcher.save(sony_yahoo, "6758", "yahoo")
     
     # 例3: リアルタイム株価を取得
     print("例3: トヨタ自動車のリアルタイム株価を取得")
@@ -87,10 +92,21 @@ def main():
         print()
         
         # 価格変化率の計算
-        first_close = toyota_stooq['Close'].iloc[-1]  # 最新の終値
-        last_close = toyota_stooq['Close'].iloc[0]    # 最古の終値
-        total_return = ((first_close - last_close) / last_close) * 100
+        first_close = toyota_stooq['Close'].iloc[0]   # 最古の終値
+        last_close = toyota_stooq['Close'].iloc[-1]   # 最新の終値
+        total_return = ((last_close - first_close) / first_close) * 100
         print(f"期間総リターン: {total_return:+.2f}%")
+        print()
+    
+    # 例6: 保存済みデータの読み込み（ネットワークにアクセスしない）
+    print("例6: 保存済みの終値を日付×銘柄のパネルとして読み込み")
+    print("-" * 50)
+    
+    panel = fetcher.load_stock_data(major_stocks, "2024-01-01", "2024-12-31",
+                                    columns=["Close"], source="yahoo", layout="wide")
+    if not panel.empty:
+        print(panel.tail())
+        print()
     
     print("=== 使用例完了 ===")
 
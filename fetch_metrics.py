@@ -0,0 +1,265 @@
+"""
+取得・保存処理のメトリクス
+処理段階ごとの所要時間のヒストグラム、データソース・銘柄ごとの成功/失敗数、取得行数・バイト数を集計し、
+Prometheus形式のテキストまたはJSONとして出力する
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_CONTEXT = nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Dict[str, str] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class FetchMetrics:
+    """
+    取得・保存処理のメトリクスを集計するクラス
+
+    無効の場合、phase・trackは何もしないコンテキストマネージャーを返し、countは何もしない。
+    """
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, prefix: str = "stock_fetcher"):
+        """
+        初期化
+
+        Args:
+            enabled (bool): メトリクスを集計するか
+            buckets (Tuple[float, ...]): 所要時間のヒストグラムの区切り（秒）
+            prefix (str): 出力するメトリクス名の接頭辞
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], list] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def count(self, name: str, value: float = 1, **labels):
+        """
+        カウンターを加算
+
+        Args:
+            name (str): メトリクス名
+            value (float): 加算する値
+            **labels: ラベル（source, code など）
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        所要時間をヒストグラムに記録
+
+        Args:
+            name (str): 処理段階の名前
+            seconds (float): 所要時間（秒）
+            **labels: ラベル
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # [各区切り以下の件数..., 件数, 合計]
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    def phase(self, name: str, **labels):
+        """
+        処理段階の所要時間を計測するコンテキストマネージャー
+
+        Args:
+            name (str): 処理段階の名前（provider, build, sort, cache_merge, save_csv など）
+            **labels: ラベル
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name, labels)
+
+    @contextmanager
+    def _timed(self, name: str, labels: Dict[str, str]):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def track(self, name: str, source: str, code: str = ""):
+        """
+        処理全体の所要時間と成功/失敗数を記録するコンテキストマネージャー
+
+        所要時間は{name}（source別）、件数は{name}_total（source・code・status別）に記録する。
+
+        Args:
+            name (str): 処理の名前（fetch, quote など）
+            source (str): データソース
+            code (str): 銘柄コード
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._tracked(name, source, code)
+
+    @contextmanager
+    def _tracked(self, name: str, source: str, code: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.count(f"{name}_total", source=source, code=code, status="failure")
+            raise
+        else:
+            self.count(f"{name}_total", source=source, code=code, status="success")
+        finally:
+            self.observe(name, time.perf_counter() - started, source=source)
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]]):
+        """
+        出力時に値を取得するゲージを登録（キャッシュの統計情報など）
+
+        Args:
+            name (str): ゲージ名の接頭辞
+            collect (Callable): 名前と値の辞書を返す関数
+        """
+        self._collectors[name] = collect
+
+    def reset(self):
+        """集計値を消去"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict:
+        """
+        集計値を辞書として取得
+
+        Returns:
+            Dict: counters・histograms・gauges をキーとした集計値
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for (name, key), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(key),
+                    "count": values[-2],
+                    "sum": round(values[-1], 6),
+                    "buckets": {str(bound): values[i] for i, bound in enumerate(self.buckets)},
+                }
+                for (name, key), values in sorted(self._histograms.items())
+            ]
+        gauges = {}
+        for name, collect in self._collectors.items():
+            for key, value in collect().items():
+                gauges[f"{name}_{key}"] = value
+        return {"enabled": self.enabled, "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_json(self) -> str:
+        """集計値をJSON文字列として取得"""
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """集計値をPrometheusのテキスト形式で取得"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        declared = set()
+        for (name, key), value in counters:
+            metric = f"{self.prefix}_{name}"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+
+        for (name, key), values in histograms:
+            metric = f"{self.prefix}_{name}_seconds"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} histogram")
+                declared.add(metric)
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{metric}_bucket{_format_labels(key, {'le': str(bound)})} {values[i]}")
+            lines.append(f"{metric}_bucket{_format_labels(key, {'le': '+Inf'})} {values[-2]}")
+            lines.append(f"{metric}_count{_format_labels(key)} {values[-2]}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {values[-1]}")
+
+        for name, collect in self._collectors.items():
+            for key, value in collect().items():
+                metric = f"{self.prefix}_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(metrics: FetchMetrics, host: str = "127.0.0.1", port: int = 9108) -> ThreadingHTTPServer:
+    """
+    メトリクスを公開するHTTPサーバーをバックグラウンドで起動
+
+    /metrics でPrometheus形式のテキスト、/metrics.json でJSONを返す。
+
+    Args:
+        metrics (FetchMetrics): 公開するメトリクス
+        host (str): 待ち受けるアドレス
+        port (int): 待ち受けるポート
+
+    Returns:
+        ThreadingHTTPServer: 起動したサーバー（shutdown()で停止）
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = metrics.to_prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = metrics.to_json().encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"メトリクスを公開しました: http://{host}:{server.server_address[1]}/metrics")
+    return server
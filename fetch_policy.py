@@ -0,0 +1,277 @@
+"""
+データソースへの取得ポリシー
+タイムアウト、ジッター付きリトライ、データソースごとのサーキットブレーカー、
+ヘッジ（一定時間内に応答が無い場合に別のデータソースへ同時に問い合わせる）の設定と状態を保持する
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, TypeVar
+import numpy as np
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため取得を行わなかったことを示す例外"""
+
+
+class DataNotFoundError(Exception):
+    """
+    データソースは応答したが銘柄のデータが無い（上場廃止・誤った銘柄コードなど）ことを示す例外
+
+    再試行しても結果は変わらないため再試行せず、データソースの障害ではないためサーキットブレーカーの失敗にも数えない。
+    """
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    再試行すれば成功し得る、データソース側の一時的な失敗か
+
+    接続エラー・タイムアウト・HTTP 5xx・429のみを一時的な失敗とする。
+    銘柄のデータが無い場合（DataNotFoundError）やその他の例外は、再試行せずサーキットブレーカーの失敗にも数えない。
+
+    Args:
+        error (BaseException): 取得処理が送出した例外
+
+    Returns:
+        bool: 一時的な失敗の場合はTrue
+    """
+    if isinstance(error, DataNotFoundError):
+        return False
+    if isinstance(error, requests.HTTPError):
+        # 応答の無いHTTPErrorは、状態コードの分からない失敗の応答として一時的な失敗に数える
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status >= 500 or status == 429
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                              ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    連続した失敗回数でデータソースへの取得を一時停止するサーキットブレーカー
+
+    closed: 通常どおり取得する
+    open: failure_threshold回連続で失敗した後、reset_timeout秒間は取得せずに失敗させる
+    half_open: reset_timeout秒経過後、1件だけ試行し、成功すればclosed・失敗すればopenに戻る
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        初期化
+
+        Args:
+            failure_threshold (int): 開くまでの連続失敗回数
+            reset_timeout (float): 開いてから試行を再開するまでの秒数
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """現在の状態（closed / open / half_open）"""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """取得を行ってよいか（half_openでは同時に1件のみ許可）"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """成功を記録"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """
+        失敗を記録
+
+        Returns:
+            bool: この失敗でブレーカーが開いたか
+        """
+        with self._lock:
+            self._failures += 1
+            reopened = self._probing
+            self._probing = False
+            if reopened or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+class FetchPolicy:
+    """
+    データソースへの取得ポリシー
+
+    callで実行した取得はサーキットブレーカーを確認したうえで、一時的な失敗（is_transient）の場合はジッター付きの指数バックオフで再試行する。
+    一時的な失敗のみをサーキットブレーカーの失敗に数え、銘柄のデータが無い場合などはそのまま送出する。
+    成功した取得の所要時間をデータソースごとに記録し、ヘッジを開始するまでの待ち時間（パーセンタイル）に使用する。
+    """
+
+    def __init__(self,
+                 timeout: float = 10.0,
+                 retries: int = 2,
+                 backoff: float = 0.5,
+                 max_backoff: float = 8.0,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 hedge: bool = False,
+                 hedge_percentile: float = 95.0,
+                 hedge_min_samples: int = 20,
+                 hedge_delay: float = 2.0,
+                 latency_window: int = 200):
+        """
+        初期化
+
+        Args:
+            timeout (float): 1回のHTTPリクエストのタイムアウト（秒）
+            retries (int): 失敗時の再試行回数
+            backoff (float): 再試行までの待ち時間の基準（秒。試行ごとに倍にし、0からその値までの乱数を待つ）
+            max_backoff (float): 再試行までの待ち時間の上限（秒）
+            failure_threshold (int): サーキットブレーカーが開くまでの連続失敗回数
+            reset_timeout (float): サーキットブレーカーが開いてから試行を再開するまでの秒数
+            hedge (bool): 応答が遅い場合・失敗した場合に別のデータソースへも問い合わせるか
+            hedge_percentile (float): ヘッジを開始するまでの待ち時間とする、過去の所要時間のパーセンタイル
+            hedge_min_samples (int): パーセンタイルを使うのに必要な所要時間の記録数
+            hedge_delay (float): 記録が足りない場合のヘッジ開始までの待ち時間（秒）
+            latency_window (int): データソースごとに保持する所要時間の記録数
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.default_hedge_delay = hedge_delay
+        self.latency_window = latency_window
+
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "not_found": 0, "permanent": 0,
+                       "rejected": 0, "circuit_opened": 0}
+
+    def breaker(self, source: str) -> CircuitBreaker:
+        """データソースのサーキットブレーカーを取得"""
+        with self._lock:
+            if source not in self._breakers:
+                self._breakers[source] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[source]
+
+    def record_latency(self, source: str, seconds: float):
+        """成功した取得の所要時間を記録"""
+        with self._lock:
+            if source not in self._latencies:
+                self._latencies[source] = deque(maxlen=self.latency_window)
+            self._latencies[source].append(seconds)
+
+    def hedge_delay(self, source: str) -> float:
+        """
+        ヘッジを開始するまでの待ち時間を取得
+
+        Args:
+            source (str): 最初に問い合わせるデータソース
+
+        Returns:
+            float: 過去の所要時間のパーセンタイル（記録が足りない場合はhedge_delay）
+        """
+        with self._lock:
+            samples = list(self._latencies.get(source, ()))
+        if len(samples) < self.hedge_min_samples:
+            return self.default_hedge_delay
+        return float(np.percentile(samples, self.hedge_percentile))
+
+    def backoff_delay(self, attempt: int) -> float:
+        """attempt回目（0始まり）の再試行までの待ち時間（フルジッター）"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def call(self, source: str, fn: Callable[[], T]) -> T:
+        """
+        サーキットブレーカーとリトライを適用して取得を実行
+
+        Args:
+            source (str): データソース
+            fn (Callable): 取得処理（失敗時は例外を送出すること）
+
+        Returns:
+            fnの戻り値
+
+        Raises:
+            CircuitOpenError: サーキットブレーカーが開いている場合
+            DataNotFoundError: 銘柄のデータが無い場合（再試行しない）
+            Exception: 一時的でない失敗の場合はその例外、すべての試行が失敗した場合は最後の例外
+        """
+        breaker = self.breaker(source)
+        self._count("calls")
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError(f"{source} への取得を一時停止しています（連続して失敗したため）")
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                self._count("failures")
+                if not is_transient(e):
+                    # データソースは応答しているため、連続失敗の回数を戻して再試行せずに送出する
+                    self._count("not_found" if isinstance(e, DataNotFoundError) else "permanent")
+                    breaker.record_success()
+                    raise
+                opened = breaker.record_failure()
+                if opened:
+                    self._count("circuit_opened")
+                    logger.warning(f"{source} への取得を{self.reset_timeout}秒間停止します: {e}")
+                if opened or attempt == self.retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                self._count("retries")
+                logger.info(f"{source} からの取得に失敗したため{delay:.2f}秒後に再試行します（{attempt + 1}/{self.retries}）: {e}")
+                time.sleep(delay)
+            else:
+                breaker.record_success()
+                self.record_latency(source, time.perf_counter() - started)
+                return result
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        統計情報を取得
+
+        Returns:
+            Dict[str, float]: 取得回数・再試行回数・失敗回数（うちデータが無い・一時的でない失敗の回数）・
+                              ブレーカーによる拒否回数・ブレーカーが開いた回数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            breakers = dict(self._breakers)
+        for source, breaker in breakers.items():
+            stats[f"{source}_open"] = int(breaker.state != "closed")
+        return stats
@@ -0,0 +1,142 @@
+"""
+データソースへのHTTPリクエストで共有する接続プール付きセッション
+ホストごとにキープアライブ接続を再利用し、TLSハンドシェイクの回数を減らす
+"""
+
+import threading
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; japanese-stock-data-fetcher)"
+
+
+def _host_key(scheme: str, host: str, port: Optional[int]) -> str:
+    return f"{scheme}://{host}:{port or _DEFAULT_PORTS.get(scheme)}"
+
+
+def pool_stats(session: requests.Session) -> Dict[str, Dict[str, float]]:
+    """
+    セッションの接続プールの状態をホストごとに取得
+
+    Args:
+        session (requests.Session): 対象のセッション（PooledSession以外も可）
+
+    Returns:
+        Dict[str, Dict[str, float]]: ホストをキーとした
+            requests（リクエスト数）, connections（新規接続数）, reuse_ratio（接続の再利用率）,
+            maxsize（プールの大きさ）, idle（待機中の接続数）
+    """
+    stats: Dict[str, Dict[str, float]] = {}
+    for adapter in set(session.adapters.values()):
+        manager = getattr(adapter, 'poolmanager', None)
+        if manager is None:
+            continue
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            host = _host_key(pool.scheme, pool.host, pool.port)
+            entry = stats.setdefault(host, {'requests': 0, 'connections': 0, 'maxsize': 0, 'idle': 0})
+            entry['requests'] += pool.num_requests
+            entry['connections'] += pool.num_connections
+            entry['maxsize'] += pool.pool.maxsize if pool.pool is not None else 0
+            entry['idle'] += sum(conn is not None for conn in list(pool.pool.queue)) if pool.pool is not None else 0
+    for entry in stats.values():
+        entry['reuse_ratio'] = round(1 - entry['connections'] / entry['requests'], 4) if entry['requests'] else 0.0
+    return stats
+
+
+class PooledSession(requests.Session):
+    """
+    接続プールの大きさ・デフォルトのタイムアウト・User-Agentを設定したセッション
+
+    ホストごとの同時リクエスト数（使用中の接続数）とその最大値を記録し、プールの使用率を確認できる。
+    """
+
+    def __init__(self,
+                 pool_maxsize: int = 10,
+                 pool_connections: int = 10,
+                 timeout: Union[float, Tuple[float, float]] = (5.0, 30.0),
+                 user_agent: Optional[str] = DEFAULT_USER_AGENT):
+        """
+        初期化
+
+        Args:
+            pool_maxsize (int): ホストごとに保持する接続数の上限（同時リクエスト数の上限以上にする）
+            pool_connections (int): 接続プールを保持するホスト数
+            timeout (float | Tuple[float, float]): 呼び出し側でタイムアウトを指定しない場合のタイムアウト（秒。(接続, 読み込み)も可）
+            user_agent (str): User-Agentヘッダー（Noneの場合はrequestsの既定）
+        """
+        super().__init__()
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        if user_agent:
+            self.headers['User-Agent'] = user_agent
+
+        self._lock = threading.Lock()
+        self._in_use: Dict[str, int] = {}
+        self._peak: Dict[str, int] = {}
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        host = _host_key(parts.scheme, parts.hostname, parts.port)
+        with self._lock:
+            in_use = self._in_use[host] = self._in_use.get(host, 0) + 1
+            self._peak[host] = max(self._peak.get(host, 0), in_use)
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            with self._lock:
+                self._in_use[host] -= 1
+
+    def utilization(self) -> Dict[str, Dict[str, float]]:
+        """
+        ホストごとの接続プールの使用状況を取得
+
+        Returns:
+            Dict[str, Dict[str, float]]: pool_statsの項目に加え、
+                in_use（使用中の接続数）, peak_in_use（使用中の接続数の最大値）, peak_utilization（最大値 / pool_maxsize）
+        """
+        stats = pool_stats(self)
+        with self._lock:
+            in_use, peak = dict(self._in_use), dict(self._peak)
+        for host in peak:
+            entry = stats.setdefault(host, {'requests': 0, 'connections': 0, 'maxsize': 0,
+                                            'idle': 0, 'reuse_ratio': 0.0})
+            entry['in_use'] = in_use.get(host, 0)
+            entry['peak_in_use'] = peak.get(host, 0)
+            entry['peak_utilization'] = round(peak.get(host, 0) / self.pool_maxsize, 4)
+        return stats
+
+    def stats(self) -> Dict[str, float]:
+        """
+        全ホストの合計（メトリクスのゲージ用）
+
+        Returns:
+            Dict[str, float]: requests, connections, reuse_ratio, in_use, peak_utilization
+        """
+        hosts = self.utilization().values()
+        requests_total = sum(entry['requests'] for entry in hosts)
+        connections = sum(entry['connections'] for entry in hosts)
+        return {
+            'requests': requests_total,
+            'connections': connections,
+            'reuse_ratio': round(1 - connections / requests_total, 4) if requests_total else 0.0,
+            'in_use': sum(entry.get('in_use', 0) for entry in hosts),
+            'peak_utilization': max((entry.get('peak_utilization', 0.0) for entry in hosts), default=0.0),
+        }
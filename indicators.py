@@ -0,0 +1,288 @@
+"""
+テクニカル指標の計算
+日付 × 銘柄 の2次元配列（OHLCVPanelの列やload_stock_data(layout="wide")の結果）に対して、
+全銘柄分を銘柄ごとのループなしで一度に計算する
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, Sequence, Tuple
+
+
+def as_array(x) -> np.ndarray:
+    """DataFrame・Series・配列を 日付 × 銘柄 のfloat64配列に変換"""
+    values = np.asarray(x.to_numpy() if isinstance(x, (pd.DataFrame, pd.Series)) else x, dtype=np.float64)
+    return values.reshape(-1, 1) if values.ndim == 1 else values
+
+
+def wrap(values: np.ndarray, like):
+    """入力がDataFrame・Seriesの場合は同じ日付・銘柄のラベルを付けて返す"""
+    if isinstance(like, pd.DataFrame):
+        return pd.DataFrame(values, index=like.index, columns=like.columns)
+    if isinstance(like, pd.Series):
+        return pd.Series(values[:, 0], index=like.index, name=like.name)
+    return values
+
+
+def _padded_cumsum(values: np.ndarray) -> np.ndarray:
+    """先頭に0の行を付けた日付方向の累積和"""
+    cumulative = np.empty((values.shape[0] + 1, values.shape[1]))
+    cumulative[0] = 0.0
+    np.cumsum(values, axis=0, out=cumulative[1:])
+    return cumulative
+
+
+class _RollingWindows:
+    """
+    累積和を1回だけ計算しておき、任意の期間の移動平均・標準偏差を差分で求める
+
+    窓内に欠損がある場合は欠損を返す（pandasのrolling(window)と同じ扱い）。
+    """
+
+    def __init__(self, x: np.ndarray):
+        valid = ~np.isnan(x)
+        self.shape = x.shape
+        self.has_nan = not valid.all()
+        self.values = np.where(valid, x, 0.0) if self.has_nan else x
+        self.cum = _padded_cumsum(self.values)
+        self.cum_count = _padded_cumsum(valid) if self.has_nan else None
+        self._cum_sq = None
+
+    def _window_sum(self, cumulative: np.ndarray, window: int) -> np.ndarray:
+        result = np.full(self.shape, np.nan)
+        if self.shape[0] >= window:
+            np.subtract(cumulative[window:], cumulative[:-window], out=result[window - 1:])
+        return result
+
+    def mean(self, window: int) -> np.ndarray:
+        mean = self._window_sum(self.cum, window)
+        mean /= window
+        if self.has_nan:
+            mean[self._window_sum(self.cum_count, window) != window] = np.nan
+        return mean
+
+    def mean_std(self, window: int, ddof: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        if self._cum_sq is None:
+            self._cum_sq = _padded_cumsum(self.values * self.values)
+        mean = self.mean(window)
+        if window <= ddof:
+            return mean, np.full(self.shape, np.nan)
+        var = self._window_sum(self._cum_sq, window)
+        var -= window * mean * mean
+        var /= window - ddof
+        # 丸め誤差で負になる場合は0とする（欠損はそのまま）
+        np.maximum(var, 0.0, out=var, where=~np.isnan(var))
+        return mean, np.sqrt(var)
+
+
+def _log_returns(values: np.ndarray) -> np.ndarray:
+    """前日比の対数リターン（先頭の行は欠損）"""
+    returns = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = np.log(values[1:] / values[:-1])
+    return returns
+
+
+def _ema_scan(x: np.ndarray, alpha: float, state: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    指数移動平均を日付方向に1日ずつ、全銘柄まとめて計算
+
+    最初の有効値で初期化し、欠損の日は値を更新せず欠損を出力する。
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 計算結果と、続きを計算するための最終状態
+    """
+    current = np.full(x.shape[1], np.nan) if state is None else state.copy()
+    out = np.full(x.shape, np.nan)
+    for t in range(x.shape[0]):
+        row = x[t]
+        valid = ~np.isnan(row)
+        started = ~np.isnan(current)
+        current = np.where(valid, np.where(started, current + alpha * (row - current), row), current)
+        out[t] = np.where(valid, current, np.nan)
+    return out, current
+
+
+def sma(close, window: int):
+    """単純移動平均"""
+    return wrap(_RollingWindows(as_array(close)).mean(window), close)
+
+
+def ema(close, span: int):
+    """指数移動平均（alpha = 2 / (span + 1)）"""
+    return wrap(_ema_scan(as_array(close), 2.0 / (span + 1))[0], close)
+
+
+def bollinger_bands(close, window: int = 20, k: float = 2.0) -> Dict[str, object]:
+    """ボリンジャーバンド（中心線・上限・下限）"""
+    mean, std = _RollingWindows(as_array(close)).mean_std(window)
+    return {
+        'middle': wrap(mean, close),
+        'upper': wrap(mean + k * std, close),
+        'lower': wrap(mean - k * std, close),
+    }
+
+
+def rolling_volatility(close, window: int = 20, periods_per_year: int = 252):
+    """対数リターンの標準偏差（年率換算）"""
+    returns = _log_returns(as_array(close))
+    return wrap(_RollingWindows(returns).mean_std(window)[1] * np.sqrt(periods_per_year), close)
+
+
+def rsi(close, period: int = 14):
+    """RSI（Wilderの平滑化）"""
+    engine = IndicatorEngine(sma_windows=(), ema_spans=(), rsi_period=period)
+    values = as_array(close)
+    return wrap(engine.compute(values, values, values)['rsi'], close)
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, object]:
+    """MACD（MACD線・シグナル線・ヒストグラム）"""
+    engine = IndicatorEngine(sma_windows=(), ema_spans=(), macd_params=(fast, slow, signal))
+    values = as_array(close)
+    result = engine.compute(values, values, values)
+    return {key: wrap(result[f'macd{suffix}'], close)
+            for key, suffix in (('macd', ''), ('signal', '_signal'), ('hist', '_hist'))}
+
+
+def atr(high, low, close, period: int = 14):
+    """ATR（Wilderの平滑化）"""
+    engine = IndicatorEngine(sma_windows=(), ema_spans=(), atr_period=period)
+    return wrap(engine.compute(as_array(high), as_array(low), as_array(close))['atr'], close)
+
+
+class IndicatorEngine:
+    """
+    複数銘柄のテクニカル指標をまとめて計算し、追記された日付分だけを続きから計算できるクラス
+
+    computeで全期間を計算した後は、updateに新しい日付の行だけを渡すと、
+    移動平均系は保持している直近の行、指数平滑系は保持している最終状態から続きを計算する。
+    """
+
+    def __init__(self,
+                 sma_windows: Sequence[int] = (5, 25, 75),
+                 ema_spans: Sequence[int] = (12, 26),
+                 rsi_period: int = 14,
+                 macd_params: Tuple[int, int, int] = (12, 26, 9),
+                 bollinger_window: int = 20,
+                 bollinger_k: float = 2.0,
+                 atr_period: int = 14,
+                 volatility_window: int = 20,
+                 periods_per_year: int = 252):
+        """
+        初期化
+
+        Args:
+            sma_windows (Sequence[int]): 単純移動平均の期間
+            ema_spans (Sequence[int]): 指数移動平均の期間
+            rsi_period (int): RSIの期間
+            macd_params (Tuple[int, int, int]): MACDの短期・長期・シグナルの期間
+            bollinger_window (int): ボリンジャーバンドの期間
+            bollinger_k (float): ボリンジャーバンドの標準偏差の倍率
+            atr_period (int): ATRの期間
+            volatility_window (int): ボラティリティの期間
+            periods_per_year (int): ボラティリティの年率換算に使う年間の取引日数
+        """
+        self.sma_windows = tuple(sma_windows)
+        self.ema_spans = tuple(ema_spans)
+        self.rsi_period = rsi_period
+        self.macd_params = macd_params
+        self.bollinger_window = bollinger_window
+        self.bollinger_k = bollinger_k
+        self.atr_period = atr_period
+        self.volatility_window = volatility_window
+        self.periods_per_year = periods_per_year
+
+        # 移動平均系の計算に必要な直近の行数（リターン計算用に1行多く持つ）
+        self._tail_size = max(self.sma_windows + (bollinger_window, volatility_window + 1, 1))
+        self._reset()
+
+    def _reset(self):
+        self._tail = None
+        self._state: Dict[str, np.ndarray] = {}
+
+    def compute(self, high, low, close) -> Dict[str, np.ndarray]:
+        """
+        全期間の指標を計算し、続きの計算に使う状態を保持する
+
+        Args:
+            high: 高値（日付 × 銘柄）
+            low: 安値（日付 × 銘柄）
+            close: 終値（日付 × 銘柄）
+
+        Returns:
+            Dict[str, np.ndarray]: 指標名をキーとした 日付 × 銘柄 の配列
+                                   （入力がDataFrameの場合は同じラベルのDataFrame）
+        """
+        self._reset()
+        return self.update(high, low, close)
+
+    def update(self, high, low, close) -> Dict[str, np.ndarray]:
+        """
+        前回の計算の続きとして、新しい日付の行だけの指標を計算する
+
+        Args:
+            high: 新しい日付の高値（日付 × 銘柄、銘柄の並びは前回と同じ）
+            low: 新しい日付の安値
+            close: 新しい日付の終値
+
+        Returns:
+            Dict[str, np.ndarray]: 新しい日付分の指標（指標名をキーとした 日付 × 銘柄 の配列）
+        """
+        h, l, c = as_array(high), as_array(low), as_array(close)
+
+        if self._tail is None:
+            tail_h, tail_l, tail_c = (np.empty((0, c.shape[1])),) * 3
+        else:
+            tail_h, tail_l, tail_c = self._tail
+        k = tail_c.shape[0]
+        all_h = np.vstack([tail_h, h])
+        all_l = np.vstack([tail_l, l])
+        all_c = np.vstack([tail_c, c])
+        prev_c = all_c[k - 1:-1] if k else np.vstack([np.full((1, c.shape[1]), np.nan), c[:-1]])
+
+        out: Dict[str, np.ndarray] = {}
+
+        # 移動平均系（保持している直近の行と合わせて計算し、新しい行だけを取り出す）
+        windows = _RollingWindows(all_c)
+        for window in self.sma_windows:
+            out[f'sma_{window}'] = windows.mean(window)[k:]
+
+        mid, std = windows.mean_std(self.bollinger_window)
+        out['bb_middle'] = mid[k:]
+        out['bb_upper'] = (mid + self.bollinger_k * std)[k:]
+        out['bb_lower'] = (mid - self.bollinger_k * std)[k:]
+
+        returns = _RollingWindows(_log_returns(all_c))
+        out['volatility'] = returns.mean_std(self.volatility_window)[1][k:] * np.sqrt(self.periods_per_year)
+
+        # 指数平滑系（保持している最終状態から続きを計算する）
+        def scan(name: str, values: np.ndarray, alpha: float) -> np.ndarray:
+            result, self._state[name] = _ema_scan(values, alpha, self._state.get(name))
+            return result
+
+        for span in self.ema_spans:
+            out[f'ema_{span}'] = scan(f'ema_{span}', c, 2.0 / (span + 1))
+
+        fast, slow, signal = self.macd_params
+        macd_line = scan('macd_fast', c, 2.0 / (fast + 1)) - scan('macd_slow', c, 2.0 / (slow + 1))
+        out['macd'] = macd_line
+        out['macd_signal'] = scan('macd_signal', macd_line, 2.0 / (signal + 1))
+        out['macd_hist'] = macd_line - out['macd_signal']
+
+        delta = c - prev_c
+        gain = scan('rsi_gain', np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), 1.0 / self.rsi_period)
+        loss = scan('rsi_loss', np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), 1.0 / self.rsi_period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['rsi'] = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gain / loss))
+        out['rsi'] = np.where(np.isnan(gain) | np.isnan(loss), np.nan, out['rsi'])
+
+        with np.errstate(invalid='ignore'):
+            true_range = np.fmax(h - l, np.fmax(np.abs(h - prev_c), np.abs(l - prev_c)))
+        out['atr'] = scan('atr', true_range, 1.0 / self.atr_period)
+
+        self._tail = tuple(values[-self._tail_size:] for values in (all_h, all_l, all_c))
+
+        if isinstance(close, (pd.DataFrame, pd.Series)):
+            return {name: wrap(values, close) for name, values in out.items()}
+        return out
@@ -0,0 +1,241 @@
+"""
+日本取引所（JPX・東京証券取引所）の取引カレンダー
+休日（jpx_holidays.csv）と立会時間から、日足が存在し得る日・公開済みの最新の取引日を判定する
+"""
+
+import os
+import csv
+import bisect
+import datetime as dt
+from zoneinfo import ZoneInfo
+from typing import Optional, Dict, List, Tuple
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKYO = ZoneInfo("Asia/Tokyo")
+
+HOLIDAYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jpx_holidays.csv")
+
+# 立会時間（前場・後場）。大引けは2024-11-05から15:30（それ以前は15:00）
+MORNING_SESSION = (dt.time(9, 0), dt.time(11, 30))
+AFTERNOON_OPEN = dt.time(12, 30)
+CLOSE_TIMES = (
+    (dt.date(2024, 11, 5), dt.time(15, 30)),
+    (dt.date.min, dt.time(15, 0)),
+)
+
+# 祝日以外の休業日（年末年始）
+_YEAR_END_CLOSED = ((12, 31), (1, 1), (1, 2), (1, 3))
+
+
+def load_holidays(path: str = HOLIDAYS_FILE) -> Dict[dt.date, str]:
+    """
+    休日のファイルを読み込む
+
+    Args:
+        path (str): date,name 列のCSVファイル
+
+    Returns:
+        Dict[dt.date, str]: 日付をキーとした休日名の辞書
+    """
+    with open(path, encoding='utf-8') as f:
+        return {dt.date.fromisoformat(row['date']): row['name'] for row in csv.DictReader(f)}
+
+
+class JPXCalendar:
+    """
+    東京証券取引所の取引日・立会時間
+
+    休日のファイルに含まれない年は、土日と年末年始（12/31〜1/3）以外をすべて取引日として扱う
+    （祝日を取引日とみなすため、取得を省略しすぎることはない）。
+    """
+
+    def __init__(self,
+                 holidays: Optional[Dict[dt.date, str]] = None,
+                 publish_delay: dt.timedelta = dt.timedelta(minutes=30)):
+        """
+        初期化
+
+        Args:
+            holidays (Dict[dt.date, str]): 休日の辞書（省略時はjpx_holidays.csvを読み込む）
+            publish_delay (dt.timedelta): 大引けから日足がデータソースに反映されるまでの目安
+        """
+        self.holidays = load_holidays() if holidays is None else dict(holidays)
+        self.publish_delay = publish_delay
+        years = [d.year for d in self.holidays]
+        self.covered_years: Tuple[int, int] = (min(years), max(years)) if years else (0, -1)
+        self._cache: Dict[int, List[dt.date]] = {}
+
+    def covers(self, day: dt.date) -> bool:
+        """休日のファイルにその年が含まれているか"""
+        return self.covered_years[0] <= day.year <= self.covered_years[1]
+
+    def is_trading_day(self, day: dt.date) -> bool:
+        """
+        取引日か判定
+
+        Args:
+            day (dt.date): 日付
+
+        Returns:
+            bool: 取引日の場合はTrue
+        """
+        if day.weekday() >= 5 or (day.month, day.day) in _YEAR_END_CLOSED:
+            return False
+        return day not in self.holidays
+
+    def _year_sessions(self, year: int) -> List[dt.date]:
+        """1年分の取引日（年ごとに計算して保持する）"""
+        days = self._cache.get(year)
+        if days is None:
+            if not self.covers(dt.date(year, 1, 1)):
+                logger.debug(f"{year}年の休日は未登録のため、土日と年末年始のみを休日として扱います")
+            day, days = dt.date(year, 1, 1), []
+            while day.year == year:
+                if self.is_trading_day(day):
+                    days.append(day)
+                day += dt.timedelta(days=1)
+            self._cache[year] = days
+        return days
+
+    def trading_days(self, start: dt.date, end: dt.date) -> List[dt.date]:
+        """
+        期間内（終了日を含む）の取引日
+
+        Args:
+            start (dt.date): 開始日
+            end (dt.date): 終了日
+
+        Returns:
+            List[dt.date]: 取引日のリスト（古い順）
+        """
+        result = []
+        for year in range(start.year, end.year + 1):
+            days = self._year_sessions(year)
+            lo = bisect.bisect_left(days, start) if year == start.year else 0
+            hi = bisect.bisect_right(days, end) if year == end.year else len(days)
+            result.extend(days[lo:hi])
+        return result
+
+    def sessions(self, start, end) -> pd.DatetimeIndex:
+        """
+        期間内（終了日を含む）の取引日を日付の軸として取得（複数銘柄のデータを揃える際に使用）
+
+        Args:
+            start (str または dt.date): 開始日
+            end (str または dt.date): 終了日
+
+        Returns:
+            pd.DatetimeIndex: 取引日のインデックス（名前はDate）
+        """
+        days = self.trading_days(pd.Timestamp(start).date(), pd.Timestamp(end).date())
+        return pd.DatetimeIndex(days, name="Date")
+
+    def previous_trading_day(self, day: dt.date, inclusive: bool = False) -> dt.date:
+        """
+        直前の取引日
+
+        Args:
+            day (dt.date): 基準日
+            inclusive (bool): 基準日が取引日の場合に基準日を返すか
+
+        Returns:
+            dt.date: 取引日
+        """
+        if not inclusive:
+            day -= dt.timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= dt.timedelta(days=1)
+        return day
+
+    def next_trading_day(self, day: dt.date, inclusive: bool = False) -> dt.date:
+        """
+        直後の取引日
+
+        Args:
+            day (dt.date): 基準日
+            inclusive (bool): 基準日が取引日の場合に基準日を返すか
+
+        Returns:
+            dt.date: 取引日
+        """
+        if not inclusive:
+            day += dt.timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += dt.timedelta(days=1)
+        return day
+
+    @staticmethod
+    def close_time(day: dt.date) -> dt.time:
+        """その日の大引けの時刻"""
+        for since, close in CLOSE_TIMES:
+            if day >= since:
+                return close
+        return CLOSE_TIMES[-1][1]
+
+    def is_open(self, now: Optional[dt.datetime] = None) -> bool:
+        """
+        立会時間中か判定
+
+        Args:
+            now (dt.datetime): 判定する時刻（省略時は現在。タイムゾーン無しの場合は日本時間とみなす）
+
+        Returns:
+            bool: 前場・後場の立会時間中の場合はTrue
+        """
+        now = self._to_tokyo(now)
+        day, time = now.date(), now.time()
+        if not self.is_trading_day(day):
+            return False
+        return (MORNING_SESSION[0] <= time < MORNING_SESSION[1]
+                or AFTERNOON_OPEN <= time < self.close_time(day))
+
+    def latest_session(self, now: Optional[dt.datetime] = None) -> dt.date:
+        """
+        日足が公開済みの最新の取引日（これより後の日足はまだ存在しない）
+
+        Args:
+            now (dt.datetime): 基準の時刻（省略時は現在。タイムゾーン無しの場合は日本時間とみなす）
+
+        Returns:
+            dt.date: 取引日
+        """
+        now = self._to_tokyo(now)
+        day = now.date()
+        published = dt.datetime.combine(day, self.close_time(day), tzinfo=TOKYO) + self.publish_delay
+        if self.is_trading_day(day) and now >= published:
+            return day
+        return self.previous_trading_day(day)
+
+    def fetch_window(self,
+                     start: dt.date,
+                     end: dt.date,
+                     now: Optional[dt.datetime] = None) -> Optional[Tuple[dt.date, dt.date]]:
+        """
+        期間を日足が存在し得る範囲（最初・最後の取引日）に絞る
+
+        Args:
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
+            now (dt.datetime): 基準の時刻（省略時は現在）
+
+        Returns:
+            Optional[Tuple[dt.date, dt.date]]: (最初の取引日, 最後の取引日)。日足が存在し得ない場合はNone
+        """
+        end = min(end, self.latest_session(now))
+        if start > end:
+            return None
+        first = self.next_trading_day(start, inclusive=True)
+        if first > end:
+            return None
+        return first, self.previous_trading_day(end, inclusive=True)
+
+    @staticmethod
+    def _to_tokyo(now: Optional[dt.datetime]) -> dt.datetime:
+        if now is None:
+            return dt.datetime.now(TOKYO)
+        if now.tzinfo is None:
+            return now.replace(tzinfo=TOKYO)
+        return now.astimezone(TOKYO)
@@ -3,32 +3,56 @@
 参考: https://techblog.gmo-ap.jp/2022/06/07/pythonstockdata/
 
 使用方法:
-    python main.py
+    python main.py                # 対話メニュー
+    python main.py fetch --universe codes.txt --source stooq --workers 8 --since 2024-01-01
+    python main.py import-archive d_jp_txt.zip --processes 8
+    python main.py export stocks.parquet --all --store-only --format parquet
+    python main.py quote-service --port 8765   # リアルタイム株価の配信（QUOTE_SERVICE_URLを指定した対話メニュー・Webアプリが購読）
+    python main.py store-api --port 8766       # 保存済みデータの参照API
 """
 
+import os
+import sys
+import argparse
 import datetime as dt
+import logging
 from stock_data_fetcher import JapaneseStockDataFetcher
+from batch_fetch import load_universe, run_fetch
+from stooq_archive import import_archive
+from ohlcv_export import export_stocks
+from quote_service import QuoteHub, QuoteServer, QuoteClient
+from store_api import StoreAPIServer
+from ohlcv_schema import newest_first
 import pandas as pd
 
-def main():
-    """メイン実行関数"""
+# ログ設定
+logging.basicConfig(level=logging.INFO)
+
+# 主要な日本株の銘柄コード
+MAJOR_STOCKS = [
+    "7203",  # トヨタ自動車
+    "6758",  # ソニーグループ
+    "9984",  # ソフトバンクグループ
+    "6861",  # キーエンス
+    "6954",  # ファナック
+    "7974",  # 任天堂
+    "8306",  # 三菱UFJフィナンシャル・グループ
+    "9433",  # KDDI
+    "9432",  # NTT
+    "4502",  # 武田薬品工業
+]
+
+def interactive():
+    """対話メニュー"""
     
     # 株価データ取得クラスのインスタンスを作成
     fetcher = JapaneseStockDataFetcher()
     
-    # 主要な日本株の銘柄コード
-    major_stocks = [
-        "7203",  # トヨタ自動車
-        "6758",  # ソニーグループ
-        "9984",  # ソフトバンクグループ
-        "6861",  # キーエンス
-        "6954",  # ファナック
-        "7974",  # 任天堂
-        "8306",  # 三菱UFJフィナンシャル・グループ
-        "9433",  # KDDI
-        "9432",  # NTT
-        "4502",  # 武田薬品工業
-    ]
+    major_stocks = MAJOR_STOCKS
+    
+    # 配信サービスを指定した場合、主要銘柄の株価は直接取得せずに購読する
+    quote_service_url = os.environ.get("QUOTE_SERVICE_URL")
+    quote_client = None
     
     print("=== 日本の株価データ取得プログラム ===")
     print("参考: https://techblog.gmo-ap.jp/2022/06/07/pythonstockdata/")
@@ -57,8 +81,8 @@ def main():
                 df = fetcher.get_stock_data_stooq(ticker)
                 if not df.empty:
                     print("\n取得したデータ（最新5件）:")
-                    print(df.head())
-                    fetcher.save_to_csv(df, ticker, "stooq")
+                    print(newest_first(df).head())
+                    fetcher.save(df, ticker, "stooq")
                 else:
                     print("データの取得に失敗しました。")
                     
@@ -70,8 +94,8 @@ def main():
                 df = fetcher.get_stock_data_yahoo(ticker)
                 if not df.empty:
                     print("\n取得したデータ（最新5件）:")
-                    print(df.head())
-                    fetcher.save_to_csv(df, ticker, "yahoo")
+                    print(newest_first(df).head())
+                    fetcher.save(df, ticker, "yahoo")
                 else:
                     print("データの取得に失敗しました。")
                     
@@ -139,8 +163,13 @@ def main():
             print(f"{'銘柄コード':<8} {'会社名':<20} {'現在値':<12} {'変動':<15} {'出来高':<12}")
             print("="*80)
             
+            if quote_service_url and quote_client is None:
+                quote_client = QuoteClient(quote_service_url, major_stocks[:5])
+                quote_client.wait(timeout=10)
+            get_price = quote_client.get if quote_client is not None else fetcher.get_realtime_price
+            
             for ticker in major_stocks[:5]:  # 最初の5銘柄のみ表示
-                realtime_data = fetcher.get_realtime_price(ticker)
+                realtime_data = get_price(ticker)
                 if realtime_data and realtime_data['current_price']:
                     name = realtime_data['name'][:18] + "..." if len(realtime_data['name']) > 20 else realtime_data['name']
                     current_price = f"¥{realtime_data['current_price']:,.0f}"
@@ -158,10 +187,192 @@ def main():
                     print(f"{ticker:<8} {'取得失敗':<20} {'N/A':<12} {'N/A':<15} {'N/A':<12}")
             
             print("="*80)
-            print(f"取得時刻: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"取得時刻: {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                  + (f"（配信サービス: {quote_service_url}）" if quote_client is not None else ""))
             
         else:
             print("無効な選択です。0-5の数字を入力してください。")
 
+def fetch_command(args) -> int:
+    """fetchサブコマンド: 銘柄ユニバースを一括取得（中断した場合は次回の実行で再開）"""
+    codes = load_universe(args.universe) if args.universe else list(MAJOR_STOCKS)
+    if not codes:
+        print("銘柄がありません。")
+        return 1
+    
+    # 銘柄ごとのログは出さず、進捗と集計のみ表示する
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    fetcher = JapaneseStockDataFetcher(args.data_dir)
+    summary = run_fetch(fetcher, codes,
+                        source=args.source,
+                        since=args.since,
+                        until=args.until,
+                        workers=args.workers,
+                        state_path=args.state or f"{args.data_dir}/fetch_state_{args.source}.json",
+                        batch_size=args.batch_size,
+                        max_pending=args.max_pending,
+                        restart=args.restart,
+                        report_interval=args.report_interval)
+    
+    print("\n=== 一括取得の結果 ===")
+    print(f"対象: {summary['total']}銘柄（前回完了済み {summary['skipped']}銘柄）")
+    print(f"成功: {summary['succeeded']}銘柄, 失敗: {summary['failed']}銘柄, 取得行数: {summary['rows']:,}")
+    print(f"所要時間: {summary['seconds']}秒 ({summary['codes_per_sec']}銘柄/秒, {summary['rows_per_sec']:,}行/秒)")
+    for code, error in list(summary['errors'].items())[:20]:
+        print(f"  {code}: {error}")
+    if summary['failed'] > 20:
+        print(f"  ...他 {summary['failed'] - 20}銘柄")
+    return 1 if summary['failed'] else 0
+
+def import_archive_command(args) -> int:
+    """import-archiveサブコマンド: Stooqの一括ダウンロードのアーカイブをストレージに取り込む"""
+    codes = load_universe(args.universe) if args.universe else None
+    
+    # 銘柄ごとのログは出さず、集計のみ表示する
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    fetcher = JapaneseStockDataFetcher(args.data_dir)
+    print(f"{args.archive} を取り込み中...", flush=True)
+    summary = import_archive(args.archive, fetcher.store,
+                             processes=args.processes,
+                             codes=codes,
+                             since=args.since,
+                             until=args.until)
+    
+    print("\n=== 取り込みの結果 ===")
+    print(f"対象: {summary['members']}銘柄")
+    print(f"成功: {summary['imported']}銘柄, 変更無し: {summary['unchanged']}銘柄, 失敗: {summary['failed']}銘柄, "
+          f"書き込み行数: {summary['rows']:,}")
+    if summary['skipped_rows']:
+        print(f"保存済みのため書き込まなかった行: {summary['skipped_rows']:,}行（{len(summary['skipped'])}銘柄）")
+    print(f"所要時間: {summary['seconds']}秒 ({summary['codes_per_sec']}銘柄/秒, {summary['rows_per_sec']:,}行/秒)")
+    for code, error in list(summary['errors'].items())[:20]:
+        print(f"  {code}: {error}")
+    if summary['failed'] > 20:
+        print(f"  ...他 {summary['failed'] - 20}銘柄")
+    return 1 if summary['failed'] else 0
+
+def export_command(args) -> int:
+    """exportサブコマンド: 複数銘柄の株価データを圧縮したアーカイブに書き出す"""
+    fetcher = JapaneseStockDataFetcher(args.data_dir)
+    if args.all:
+        codes = fetcher.store.codes(args.source)
+    else:
+        codes = load_universe(args.universe) if args.universe else list(MAJOR_STOCKS)
+    if not codes:
+        print("銘柄がありません。")
+        return 1
+    
+    # 銘柄ごとのログは出さず、集計のみ表示する
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    print(f"{len(codes)}銘柄を {args.output} に書き出し中...", flush=True)
+    summary = export_stocks(fetcher, codes, args.output,
+                            fmt=args.format,
+                            source=args.source,
+                            start_date=args.since,
+                            end_date=args.until,
+                            fetch_missing=not args.store_only,
+                            max_workers=args.workers)
+    
+    print("\n=== 書き出しの結果 ===")
+    print(f"成功: {summary['exported']}銘柄（保存済みデータ {summary['from_store']}銘柄, 取得 {summary['fetched']}銘柄）, "
+          f"失敗: {summary['failed']}銘柄, 行数: {summary['rows']:,}")
+    print(f"ファイルサイズ: {summary['bytes']:,}バイト, 所要時間: {summary['seconds']}秒")
+    for code, error in list(summary['errors'].items())[:20]:
+        print(f"  {code}: {error}")
+    if summary['failed'] > 20:
+        print(f"  ...他 {summary['failed'] - 20}銘柄")
+    return 1 if summary['failed'] else 0
+
+def quote_service_command(args) -> int:
+    """quote-serviceサブコマンド: リアルタイム株価を取得して購読者に配信する（Ctrl+Cで終了）"""
+    fetcher = JapaneseStockDataFetcher(args.data_dir)
+    hub = QuoteHub(fetcher, interval=args.interval, closed_interval=args.closed_interval)
+    server = QuoteServer(hub, host=args.host, port=args.port)
+    print(f"リアルタイム株価を配信中: {server.base_url}（Ctrl+Cで終了）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n配信を終了します。")
+    return 0
+
+def store_api_command(args) -> int:
+    """store-apiサブコマンド: 保存済みデータを参照するHTTP APIを起動する（Ctrl+Cで終了）"""
+    fetcher = JapaneseStockDataFetcher(args.data_dir)
+    server = StoreAPIServer(fetcher.store, host=args.host, port=args.port, cache_entries=args.cache_entries)
+    print(f"保存済みデータのAPIを公開中: {server.base_url}/ohlcv?codes=7203&format=csv（Ctrl+Cで終了）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nAPIを終了します。")
+    return 0
+
+def main(argv=None) -> int:
+    """メイン実行関数（サブコマンドが無い場合は対話メニュー）"""
+    parser = argparse.ArgumentParser(description="日本の株価データ取得プログラム")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    fetch_parser = subparsers.add_parser("fetch", help="銘柄ユニバースを一括取得して保存")
+    fetch_parser.add_argument("--universe", help="銘柄コードのファイル（1行に1銘柄。省略時は主要銘柄）")
+    fetch_parser.add_argument("--source", default="stooq", choices=["stooq", "yahoo"], help="データソース")
+    fetch_parser.add_argument("--workers", type=int, default=4, help="同時に処理する銘柄数")
+    fetch_parser.add_argument("--since", default="2022-01-01", help="取得開始日（YYYY-MM-DD）")
+    fetch_parser.add_argument("--until", help="取得終了日（YYYY-MM-DD。省略時は当日）")
+    fetch_parser.add_argument("--data-dir", default="stock_data", help="データ保存ディレクトリ")
+    fetch_parser.add_argument("--state", help="進捗を記録する状態ファイル（省略時は data-dir/fetch_state_<source>.json）")
+    fetch_parser.add_argument("--batch-size", type=int, help="Yahoo Financeから1回のリクエストでまとめて取得する銘柄数")
+    fetch_parser.add_argument("--max-pending", type=int, help="取得中・受け取り待ちの銘柄数の上限（省略時は並列数の2倍）")
+    fetch_parser.add_argument("--restart", action="store_true", help="前回の進捗を使わず最初から取得")
+    fetch_parser.add_argument("--report-interval", type=float, default=10.0, help="進捗を表示する間隔（秒）")
+    
+    archive_parser = subparsers.add_parser("import-archive", help="Stooqの一括ダウンロード（zip）をストレージに取り込む")
+    archive_parser.add_argument("archive", help="ダウンロード済みのzipファイル（例: d_jp_txt.zip）")
+    archive_parser.add_argument("--universe", help="取り込む銘柄コードのファイル（省略時はすべて）")
+    archive_parser.add_argument("--processes", type=int, help="並列に処理するプロセス数（省略時はCPU数）")
+    archive_parser.add_argument("--since", help="取り込む開始日（YYYY-MM-DD）")
+    archive_parser.add_argument("--until", help="取り込む終了日（YYYY-MM-DD）")
+    archive_parser.add_argument("--data-dir", default="stock_data", help="データ保存ディレクトリ")
+    
+    export_parser = subparsers.add_parser("export", help="複数銘柄の株価データを圧縮したアーカイブに書き出す")
+    export_parser.add_argument("output", help="書き出し先のファイル（csvは銘柄別CSVのzip、parquetは全銘柄を1ファイル）")
+    export_parser.add_argument("--format", default="csv", choices=["csv", "parquet"], help="ファイル形式")
+    export_parser.add_argument("--universe", help="銘柄コードのファイル（1行に1銘柄。省略時は主要銘柄）")
+    export_parser.add_argument("--all", action="store_true", help="保存済みの全銘柄を書き出す")
+    export_parser.add_argument("--source", default="stooq", choices=["stooq", "yahoo"], help="データソース")
+    export_parser.add_argument("--since", help="開始日（YYYY-MM-DD）")
+    export_parser.add_argument("--until", help="終了日（YYYY-MM-DD）")
+    export_parser.add_argument("--store-only", action="store_true", help="保存済みデータのみを書き出す（取得しない）")
+    export_parser.add_argument("--workers", type=int, default=4, help="同時に読み込み・取得する銘柄数")
+    export_parser.add_argument("--data-dir", default="stock_data", help="データ保存ディレクトリ")
+    
+    quote_parser = subparsers.add_parser("quote-service", help="リアルタイム株価を取得して購読者に配信する")
+    quote_parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    quote_parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    quote_parser.add_argument("--interval", type=float, default=5.0, help="立会時間中の取得間隔（秒）")
+    quote_parser.add_argument("--closed-interval", type=float, default=60.0, help="立会時間外の取得間隔（秒）")
+    quote_parser.add_argument("--data-dir", default="stock_data", help="データ保存ディレクトリ")
+    
+    api_parser = subparsers.add_parser("store-api", help="保存済みデータを参照するHTTP APIを起動する")
+    api_parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    api_parser.add_argument("--port", type=int, default=8766, help="待ち受けるポート")
+    api_parser.add_argument("--cache-entries", type=int, default=256, help="メモリに保持する応答の最大件数")
+    api_parser.add_argument("--data-dir", default="stock_data", help="データ保存ディレクトリ")
+    
+    args = parser.parse_args(argv)
+    if args.command == "fetch":
+        return fetch_command(args)
+    if args.command == "import-archive":
+        return import_archive_command(args)
+    if args.command == "export":
+        return export_command(args)
+    if args.command == "quote-service":
+        return quote_service_command(args)
+    if args.command == "store-api":
+        return store_api_command(args)
+    interactive()
+    return 0
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main()) 
\ No newline at end of file
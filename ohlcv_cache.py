@@ -0,0 +1,319 @@
+"""
+株価データ（OHLCV）のローカルキャッシュ
+銘柄・データソースごとに取得済みの期間を記録し、不足分のみ再取得できるようにする
+（データは列指向ストレージに保存済みでない行のみを追記し、キャッシュには期間のみを記録する）
+"""
+
+import os
+import json
+import threading
+import datetime as dt
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple, List
+import logging
+from ohlcv_schema import PRICE_COLUMNS, conform
+from ohlcv_store import OHLCVStore
+
+logger = logging.getLogger(__name__)
+
+
+def to_date(value) -> dt.date:
+    """文字列・datetime・dateをdateに変換"""
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    return dt.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def prices_differ(cached: pd.DataFrame, fetched: pd.DataFrame, rtol: float = 1e-4) -> bool:
+    """
+    同じ日付のキャッシュ済みの価格と取得し直した価格が異なるか
+
+    データソースは分割・配当で調整後の価格を返すため、調整があると取得済みの期間の価格も変わる。
+    キャッシュ済みのデータに新しく取得したデータを統合する前に、重複する日付の価格を比較して検出する。
+
+    Args:
+        cached (pd.DataFrame): キャッシュ済みデータ
+        fetched (pd.DataFrame): 取得したデータ
+        rtol (float): 同じ価格とみなす相対誤差
+
+    Returns:
+        bool: 重複する日付のいずれかの価格が異なる場合はTrue（重複する日付が無い場合はFalse）
+    """
+    if cached.empty or fetched.empty:
+        return False
+    dates = cached.index.intersection(fetched.index)
+    columns = [col for col in PRICE_COLUMNS if col in cached.columns and col in fetched.columns]
+    if dates.empty or not columns:
+        return False
+    before = cached.loc[dates, columns].to_numpy(dtype=np.float64)
+    after = fetched.loc[dates, columns].to_numpy(dtype=np.float64)
+    return not np.allclose(before, after, rtol=rtol, atol=0.0, equal_nan=True)
+
+
+class OHLCVCache:
+    """
+    銘柄・データソース単位で取得済み期間を記録するディスクキャッシュ
+
+    取得したデータはOHLCVStoreに保存済みでない行のみを追記し、このキャッシュには取得済み期間
+    （{source}/{code}.json）のみを書く。ストレージに保存済みの期間（アーカイブの取り込み・saveで保存した分）も
+    取得済みとみなすため、同じ期間をデータソースから取得し直すことはない。
+    """
+
+    def __init__(self, cache_dir: str, store: OHLCVStore):
+        """
+        初期化
+
+        Args:
+            cache_dir (str): 取得済み期間の保存ディレクトリ
+            store (OHLCVStore): データの保存先（JapaneseStockDataFetcher.store）
+        """
+        self.cache_dir = cache_dir
+        self.store = store
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _paths(self, source: str, code: str) -> Tuple[str, str]:
+        """以前の形式のデータファイルとメタ情報ファイルのパスを返す"""
+        directory = os.path.join(self.cache_dir, source)
+        return (os.path.join(directory, f"{code}.pkl"),
+                os.path.join(directory, f"{code}.json"))
+
+    def lock(self, source: str, code: str) -> threading.Lock:
+        """銘柄・データソース単位のロックを返す"""
+        with self._locks_guard:
+            key = (source, code)
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _read_meta(self, source: str, code: str) -> Optional[dict]:
+        _, meta_path = self._paths(source, code)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"キャッシュのメタ情報が読み込めません: {meta_path} ({e})")
+            return None
+
+    def _write_meta(self, source: str, code: str, meta: dict):
+        _, meta_path = self._paths(source, code)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _migrate(self, source: str, code: str):
+        """以前の形式（銘柄ごとの全期間のpickle）のキャッシュ済みデータをストレージに移し、pickleを削除する"""
+        data_path, _ = self._paths(source, code)
+        if not os.path.exists(data_path):
+            return
+        try:
+            df = conform(pd.read_pickle(data_path))
+            rows = self.store.append_new(df, source, code) if not df.empty else 0
+            logger.info(f"以前の形式のキャッシュをストレージに移しました: {source}/{code} ({rows}件)")
+        except Exception as e:
+            # 読み込めないデータは取得済み期間ごと破棄し、次回に取得し直す
+            logger.warning(f"キャッシュデータが読み込めません: {data_path} ({e})")
+            self._write_meta(source, code, {'invalidated': True})
+        os.remove(data_path)
+
+    def is_invalidated(self, source: str, code: str) -> bool:
+        """
+        clearで破棄された銘柄か（次回の取得で、保存済みの行を取得し直したデータで置き換える）
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            bool: 破棄された銘柄の場合はTrue
+        """
+        meta = self._read_meta(source, code)
+        return bool(meta and meta.get('invalidated'))
+
+    def get_range(self, source: str, code: str) -> Optional[Tuple[dt.date, dt.date]]:
+        """
+        取得済み期間を返す（データソースから取得した期間と、ストレージに保存済みの期間を合わせた期間）
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            Optional[Tuple[dt.date, dt.date]]: 取得済み期間（開始日, 終了日）。未取得・破棄された場合はNone
+        """
+        self._migrate(source, code)
+        meta = self._read_meta(source, code)
+        if meta and meta.get('invalidated'):
+            return None
+        fetched = None
+        if meta:
+            try:
+                fetched = to_date(meta['start']), to_date(meta['end'])
+            except (KeyError, ValueError) as e:
+                logger.warning(f"キャッシュのメタ情報が読み込めません: {source}/{code} ({e})")
+
+        stored = self.store.date_range(source, code)
+        if stored is None:
+            # 取得したデータが保存されていない（ストレージを削除した）場合は取得し直す
+            return fetched if fetched is not None and not meta.get('rows') else None
+        stored = stored[0].date(), stored[1].date()
+        if fetched is None:
+            return stored
+        one_day = dt.timedelta(days=1)
+        if fetched[0] <= stored[1] + one_day and stored[0] <= fetched[1] + one_day:
+            return min(fetched[0], stored[0]), max(fetched[1], stored[1])
+        return fetched
+
+    def load(self, source: str, code: str, start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> pd.DataFrame:
+        """
+        キャッシュ済みデータを読み込む（期間内の年パーティションのみ読み込む）
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            start (dt.date): 開始日（省略時は最初から）
+            end (dt.date): 終了日（この日を含む。省略時は最後まで）
+
+        Returns:
+            pd.DataFrame: キャッシュ済みデータ（日付の古い順）
+        """
+        self._migrate(source, code)
+        return self.store.read(source, code, start, end)
+
+    def edges(self, source: str, code: str) -> pd.DataFrame:
+        """
+        キャッシュ済みの最初・最後の日足（調整後の価格の変化の検出に使う）
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            pd.DataFrame: 最初・最後の日足（日付の古い順、キャッシュ済みデータが無い場合は空のDataFrame）
+        """
+        frames = [df for df in (self.store.first_row(source, code), self.store.last_row(source, code)) if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames)
+        return df[~df.index.duplicated(keep='last')]
+
+    def missing_ranges(self,
+                       source: str,
+                       code: str,
+                       start: dt.date,
+                       end: dt.date) -> List[Tuple[dt.date, dt.date]]:
+        """
+        要求期間のうちキャッシュに無い期間（先頭・末尾）を返す
+
+        取得する際は、調整後の価格の変化を検出するためにキャッシュ済みの最初・最後の日足も取得し直す
+        （JapaneseStockDataFetcherが期間を広げる）。
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
+
+        Returns:
+            List[Tuple[dt.date, dt.date]]: 取得が必要な期間のリスト
+        """
+        cached = self.get_range(source, code)
+        if cached is None:
+            return [(start, end)]
+
+        cached_start, cached_end = cached
+        one_day = dt.timedelta(days=1)
+        ranges = []
+        if start < cached_start:
+            # 取得済み期間と連続させるため、隙間も含めて取得する
+            ranges.append((start, cached_start - one_day))
+        if end > cached_end:
+            ranges.append((cached_end + one_day, end))
+        return ranges
+
+    def merge(self,
+              source: str,
+              code: str,
+              df: pd.DataFrame,
+              start: Optional[dt.date] = None,
+              end: Optional[dt.date] = None) -> int:
+        """
+        新たに取得したデータのうち保存済みでない行をストレージに追記し、取得済み期間を広げる
+
+        書き込む量は保存済みの期間によらず、新しい行数に比例する。
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            df (pd.DataFrame): 取得したデータ
+            start (dt.date): 取得した期間の開始日（省略時は取得済み期間を変えない）
+            end (dt.date): 取得した期間の終了日（この日を含む）
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        rows = self.store.append_new(df, source, code) if not df.empty else 0
+        if start is None or start > end:
+            return rows
+
+        meta = self._read_meta(source, code) or {}
+        cached = self.get_range(source, code)
+        if cached is not None:
+            start = min(start, cached[0])
+            end = max(end, cached[1])
+        self._write_meta(source, code, {'start': start.isoformat(), 'end': end.isoformat(),
+                                        'rows': meta.get('rows', 0) + rows})
+        logger.info(f"キャッシュを更新しました: {source}/{code} ({start} - {end}, {rows}件追記)")
+        return rows
+
+    def replace(self, source: str, code: str, df: pd.DataFrame, start: dt.date, end: dt.date) -> int:
+        """
+        取得し直したデータで期間内の保存済みの行を置き換え、取得済み期間を記録し直す
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            df (pd.DataFrame): 取得し直したデータ
+            start (dt.date): 取得した期間の開始日
+            end (dt.date): 取得した期間の終了日（この日を含む）
+
+        Returns:
+            int: 書き込んだ行数（期間が空の場合は置き換えずに0）
+        """
+        if start > end:
+            return 0
+        rows = self.store.replace(df, source, code, start, end)
+        self._write_meta(source, code, {'start': start.isoformat(), 'end': end.isoformat(), 'rows': rows})
+        return rows
+
+    def clear(self, source: Optional[str] = None, code: Optional[str] = None):
+        """
+        キャッシュを破棄（次回の取得で指定期間を取得し直し、保存済みの行を置き換える）
+
+        ストレージの行はすぐには削除せず、取得し直したデータで置き換えるまで残す。
+
+        Args:
+            source (str): データソース（省略時はすべて）
+            code (str): 銘柄コード（省略時はデータソース内のすべて）
+        """
+        sources = [source] if source else sorted(
+            set(os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else [])
+            | {name[len("source="):] for name in (os.listdir(self.store.root_dir) if os.path.isdir(self.store.root_dir) else [])
+               if name.startswith("source=")})
+        for src in sources:
+            directory = os.path.join(self.cache_dir, src)
+            cached = {os.path.splitext(name)[0] for name in os.listdir(directory)} if os.path.isdir(directory) else set()
+            targets = [code] if code is not None else sorted(cached | set(self.store.codes(src)))
+            for target in targets:
+                data_path, meta_path = self._paths(src, target)
+                if os.path.exists(data_path):
+                    os.remove(data_path)
+                elif not os.path.exists(meta_path) and self.store.last_row(src, target).empty:
+                    continue
+                self._write_meta(src, target, {'invalidated': True})
@@ -0,0 +1,219 @@
+"""
+複数銘柄の株価データの書き出し
+銘柄ごとに保存済みデータ（無い場合は取得したデータ）を1銘柄ずつ読み込み、
+圧縮したアーカイブ（銘柄別CSVのzip、またはParquet）に順に書き込む。
+同時にメモリに置くのは数銘柄分のみのため、全銘柄を書き出してもメモリ使用量は銘柄数によらない。
+"""
+
+import io
+import os
+import time
+import uuid
+import zipfile
+import datetime as dt
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator, Union, Callable
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import logging
+from ohlcv_cache import to_date
+from ohlcv_schema import INDEX_NAME, PRICE_COLUMNS, conform
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "parquet")
+
+# 書き出す列（Parquetでは銘柄コードを文字列の列として持つ）
+_SCHEMA = pa.schema([(INDEX_NAME, pa.timestamp("ns")), ("code", pa.string())]
+                    + [(col, pa.float32()) for col in PRICE_COLUMNS] + [("Volume", pa.int64())])
+
+# 書き出し対象（銘柄コード, 開始日, 終了日）。日付はYYYY-MM-DD形式で、終了日を含む
+ExportItem = Tuple[str, Optional[str], Optional[str]]
+
+
+def _covers(calendar, df: pd.DataFrame, start: Optional[str], end: Optional[str]) -> bool:
+    """保存済みデータが期間内の取引日（公開済みの最新の取引日まで）をすべて含むか"""
+    if df.empty:
+        return False
+    window = calendar.fetch_window(to_date(start) if start else df.index[0].date(),
+                                   to_date(end) if end else dt.date.today())
+    if window is None:
+        return True
+    return df.index[0].date() <= window[0] and df.index[-1].date() >= window[1]
+
+
+def iter_export_frames(fetcher,
+                       items: Iterable[ExportItem],
+                       source: str = "stooq",
+                       fetch_missing: bool = True,
+                       max_workers: int = 4,
+                       errors: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, pd.DataFrame, str]]:
+    """
+    書き出す銘柄のデータを1銘柄ずつ返すジェネレーター
+
+    保存済みデータが期間をすべて含む銘柄はストレージから読み込み、それ以外の銘柄はまとめて並列に取得する
+    （取得したデータはストレージにも保存するため、次回はストレージから読み込む）。
+
+    Args:
+        fetcher (JapaneseStockDataFetcher): 読み込み・取得に使うインスタンス
+        items (Iterable[ExportItem]): (銘柄コード, 開始日, 終了日) のリスト
+        source (str): データソース（stooq または yahoo）
+        fetch_missing (bool): 保存済みデータが期間を含まない銘柄を取得するか（Falseの場合は保存済みの範囲のみ返す）
+        max_workers (int): 同時に取得する銘柄数
+        errors (Dict[str, str]): 返せなかった銘柄と理由を記録する辞書
+
+    Yields:
+        Tuple[str, pd.DataFrame, str]: 銘柄コード, データ（日付の古い順）, 読み込み元（"store" または "fetch"）
+    """
+    errors = {} if errors is None else errors
+    missing: Dict[Tuple[Optional[str], Optional[str]], List[str]] = defaultdict(list)
+
+    def read(item: ExportItem) -> Tuple[str, Optional[str], Optional[str], pd.DataFrame]:
+        code, start, end = item
+        code = code.replace('.T', '')
+        return code, start, end, fetcher.store.read(source, code, start, end)
+
+    def classify(code: str, start: Optional[str], end: Optional[str], df: pd.DataFrame):
+        if _covers(fetcher.calendar, df, start, end) or (not fetch_missing and not df.empty):
+            yield code, df, "store"
+        elif fetch_missing:
+            missing[(start, end)].append(code)
+        else:
+            errors[code] = "保存済みデータがありません"
+
+    # Parquetの読み込みはGILを解放するため、max_workers銘柄分を先読みする（先読みした銘柄のみをメモリに置く）
+    window = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=window) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(read, item))
+            if len(pending) >= window:
+                yield from classify(*pending.popleft().result())
+        while pending:
+            yield from classify(*pending.popleft().result())
+
+    # 同じ期間の銘柄をまとめて取得する（取得中・受け取り待ちの銘柄数はiter_stocksが制限する）
+    for (start, end), codes in missing.items():
+        fetch_end = end
+        if end and source == "yahoo":
+            # Yahoo Financeの終了日は当日を含まないため1日後を指定する
+            fetch_end = (to_date(end) + dt.timedelta(days=1)).isoformat()
+        for code, df in fetcher.iter_stocks(codes, start, fetch_end, source=source, max_workers=max_workers):
+            yield code, df.loc[start:end], "fetch"
+        errors.update(fetcher.last_errors)
+
+
+class _CsvZipWriter:
+    """銘柄ごとのCSVをzipのメンバーとして順に書き込む"""
+
+    def __init__(self, path: str):
+        self._archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+
+    def write(self, code: str, df: pd.DataFrame):
+        with self._archive.open(f"{code}.csv", "w", force_zip64=True) as member:
+            with io.TextIOWrapper(member, encoding="utf-8-sig", newline="") as text:
+                df.drop(columns="code", errors="ignore").to_csv(text, index=True)
+
+    def close(self):
+        self._archive.close()
+
+
+class _ParquetWriter:
+    """全銘柄を縦に連結した1つのParquetファイルに、一定行数ごとの行グループとして書き込む"""
+
+    def __init__(self, path: str, compression: str = "zstd", row_group_rows: int = 250_000):
+        self._writer = pq.ParquetWriter(path, _SCHEMA, compression=compression)
+        self._row_group_rows = row_group_rows
+        self._pending: List[pa.Table] = []
+        self._pending_rows = 0
+
+    def write(self, code: str, df: pd.DataFrame):
+        df = df.drop(columns="code", errors="ignore")
+        columns = {INDEX_NAME: df.index.to_numpy(dtype="datetime64[ns]"), "code": [code] * len(df)}
+        columns.update({col: df[col].to_numpy() for col in _SCHEMA.names[2:]})
+        self._pending.append(pa.Table.from_pydict(columns, schema=_SCHEMA))
+        self._pending_rows += len(df)
+        if self._pending_rows >= self._row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_table(pa.concat_tables(self._pending), row_group_size=self._pending_rows)
+            self._pending, self._pending_rows = [], 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def export_stocks(fetcher,
+                  items: Iterable[Union[str, ExportItem]],
+                  path: str,
+                  fmt: str = "csv",
+                  source: str = "stooq",
+                  start_date: Optional[str] = None,
+                  end_date: Optional[str] = None,
+                  fetch_missing: bool = True,
+                  max_workers: int = 4,
+                  on_result: Optional[Callable[[str, int, Optional[str]], None]] = None) -> Dict:
+    """
+    複数銘柄の株価データを圧縮したアーカイブに書き出す
+
+    Args:
+        fetcher (JapaneseStockDataFetcher): 読み込み・取得に使うインスタンス
+        items (Iterable): 銘柄コード、または (銘柄コード, 開始日, 終了日)。銘柄コードのみの場合はstart_date・end_dateを使う
+        path (str): 書き出し先のファイル（"csv"は銘柄別CSVのzip、"parquet"は全銘柄を縦に連結したParquet）
+        fmt (str): 形式（csv または parquet）
+        source (str): データソース（stooq または yahoo）
+        start_date (str): 開始日（YYYY-MM-DD形式、省略時は最初から）
+        end_date (str): 終了日（YYYY-MM-DD形式、この日を含む。省略時は最後まで）
+        fetch_missing (bool): 保存済みデータが期間を含まない銘柄を取得するか
+        max_workers (int): 同時に取得する銘柄数
+        on_result (Callable[[str, int, Optional[str]], None]): 銘柄ごとに (銘柄コード, 書き出した行数, エラー) で呼び出す関数
+
+    Returns:
+        Dict: 集計（path, exported, failed, rows, from_store, fetched, bytes, seconds, errors）
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"サポートされていない形式: {fmt}")
+
+    started = time.monotonic()
+    jobs = [(item, start_date, end_date) if isinstance(item, str) else tuple(item) for item in items]
+    summary = {'path': path, 'exported': 0, 'failed': 0, 'rows': 0, 'from_store': 0, 'fetched': 0, 'errors': {}}
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    writer = _CsvZipWriter(temp_path) if fmt == "csv" else _ParquetWriter(temp_path)
+    errors: Dict[str, str] = {}
+    try:
+        for code, df, origin in iter_export_frames(fetcher, jobs, source, fetch_missing, max_workers, errors):
+            if df.empty:
+                errors[code] = "期間内のデータがありません"
+                continue
+            writer.write(code, conform(df))
+            summary['exported'] += 1
+            summary['rows'] += len(df)
+            summary['from_store' if origin == "store" else 'fetched'] += 1
+            if on_result is not None:
+                on_result(code, len(df), None)
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+    for code, error in errors.items():
+        if on_result is not None:
+            on_result(code, 0, error)
+    summary['errors'] = errors
+    summary['failed'] = len(errors)
+    summary['bytes'] = os.path.getsize(path)
+    summary['seconds'] = round(time.monotonic() - started, 2)
+    logger.info(f"書き出しが完了しました: {path} ({summary['exported']}銘柄, {summary['rows']}行, "
+                f"保存済み {summary['from_store']}銘柄, 取得 {summary['fetched']}銘柄, 失敗 {summary['failed']}銘柄)")
+    return summary
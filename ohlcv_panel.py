@@ -0,0 +1,241 @@
+"""
+メモリマップを使用した株価パネル（日付 × 銘柄 × 列）
+複数プロセスで同じファイルを共有でき、日付・銘柄による切り出しはコピーせずにビューを返す
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, List, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+_META_FILE = "meta.json"
+_VALUES_FILE = "values.bin"
+
+
+def _normalize_dates(index) -> pd.DatetimeIndex:
+    """タイムゾーンを除き、日付単位に揃える"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+class OHLCVPanel:
+    """
+    日付 × 銘柄 × 列 の3次元配列をメモリマップファイルとして保持する株価パネル
+
+    配列は日付が先頭の軸（C順）のため、日付範囲の切り出しは連続領域、
+    銘柄・列の切り出しはストライド付きのビューになる。どちらもコピーは発生しない。
+    日付の軸は容量を先に確保しておき、新しい取引日はファイル内にそのまま追記する。
+    """
+
+    def __init__(self, path: str, mode: str = "r"):
+        """
+        既存のパネルを開く（作成にはbuildを使用）
+
+        Args:
+            path (str): パネルのディレクトリ
+            mode (str): "r"は読み込み専用、"r+"は追記可能
+        """
+        self.path = path
+        self.mode = mode
+        self.refresh()
+
+    @classmethod
+    def build(cls,
+              path: str,
+              frames: Dict[str, pd.DataFrame],
+              fields: Sequence[str] = DEFAULT_FIELDS,
+              dates: Optional[Sequence] = None,
+              capacity: Optional[int] = None,
+              dtype: str = "float64") -> "OHLCVPanel":
+        """
+        銘柄ごとのデータからパネルを作成
+
+        Args:
+            path (str): パネルのディレクトリ
+            frames (Dict[str, pd.DataFrame]): 銘柄コードをキーとしたデータ辞書（get_multiple_stocksの戻り値など）
+            fields (Sequence[str]): パネルに含める列
+            dates (Sequence): 日付の軸（省略時は全銘柄の日付の和集合）
+            capacity (int): 日付の軸の確保数（省略時は日付数+約1年分）
+            dtype (str): 値の型（float32を指定するとメモリは半分になるが、出来高が約1,600万を超えると丸められるため
+                         Volumeを含まないfieldsでの使用を推奨）
+
+        Returns:
+            OHLCVPanel: 追記可能な状態で開いたパネル
+        """
+        fields = list(fields)
+        if np.dtype(dtype).itemsize < 8 and "Volume" in fields:
+            logger.warning(f"{dtype}のパネルでは出来高が約1,600万を超えると丸められます: {path}")
+        codes = sorted(frames)
+        if dates is None:
+            all_dates = [_normalize_dates(df.index) for df in frames.values() if not df.empty]
+            dates = all_dates[0].append(all_dates[1:]).unique().sort_values() if all_dates else pd.DatetimeIndex([])
+        dates = _normalize_dates(dates)
+        capacity = max(capacity or len(dates) + 260, len(dates), 1)
+
+        os.makedirs(path, exist_ok=True)
+        values = np.memmap(os.path.join(path, _VALUES_FILE), dtype=dtype, mode="w+",
+                           shape=(capacity, len(codes), len(fields)))
+        values[:] = np.nan
+
+        for j, code in enumerate(codes):
+            df = frames[code]
+            if df.empty:
+                continue
+            df = df[~df.index.duplicated(keep='last')]
+            aligned = df.set_axis(_normalize_dates(df.index)).reindex(index=dates, columns=fields)
+            values[:len(dates), j, :] = aligned.to_numpy(dtype=dtype, na_value=np.nan)
+        values.flush()
+        del values
+
+        cls._write_meta(path, {
+            'dates': [d.strftime('%Y-%m-%d') for d in dates],
+            'codes': codes,
+            'fields': fields,
+            'dtype': dtype,
+            'capacity': capacity,
+        })
+        logger.info(f"パネルを作成しました: {path} ({len(dates)}日 × {len(codes)}銘柄 × {len(fields)}列)")
+        return cls(path, mode="r+")
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict):
+        meta_path = os.path.join(path, _META_FILE)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def refresh(self):
+        """メタ情報を読み直し、他のプロセスが追記した日付を反映する"""
+        with open(os.path.join(self.path, _META_FILE), encoding='utf-8') as f:
+            self._meta = json.load(f)
+        self.dates = pd.DatetimeIndex(self._meta['dates'])
+        self.codes: List[str] = self._meta['codes']
+        self.fields: List[str] = self._meta['fields']
+        self._code_pos = {code: i for i, code in enumerate(self.codes)}
+        self._field_pos = {field: i for i, field in enumerate(self.fields)}
+        self._values = np.memmap(os.path.join(self.path, _VALUES_FILE), dtype=self._meta['dtype'],
+                                 mode=self.mode,
+                                 shape=(self._meta['capacity'], len(self.codes), len(self.fields)))
+
+    @property
+    def values(self) -> np.ndarray:
+        """日付 × 銘柄 × 列 の配列（ビュー）"""
+        return self._values[:len(self.dates)]
+
+    def _date_slice(self, start=None, end=None) -> slice:
+        lo = self.dates.searchsorted(pd.Timestamp(start)) if start is not None else 0
+        hi = self.dates.searchsorted(pd.Timestamp(end), side='right') if end is not None else len(self.dates)
+        return slice(lo, hi)
+
+    def field(self, field: str, start=None, end=None) -> np.ndarray:
+        """
+        1列分の 日付 × 銘柄 の配列を取得（ビュー）
+
+        Args:
+            field (str): 列名（例: "Close"）
+            start: 開始日（省略時は最初から）
+            end: 終了日（この日を含む。省略時は最後まで）
+
+        Returns:
+            np.ndarray: 日付 × 銘柄 の配列
+        """
+        return self.values[self._date_slice(start, end), :, self._field_pos[field]]
+
+    def code(self, code: str, start=None, end=None) -> np.ndarray:
+        """
+        1銘柄分の 日付 × 列 の配列を取得（ビュー）
+
+        Args:
+            code (str): 銘柄コード
+            start: 開始日（省略時は最初から）
+            end: 終了日（この日を含む。省略時は最後まで）
+
+        Returns:
+            np.ndarray: 日付 × 列 の配列
+        """
+        return self.values[self._date_slice(start, end), self._code_pos[code], :]
+
+    def to_frame(self, field: str, start=None, end=None) -> pd.DataFrame:
+        """
+        1列分を 日付 × 銘柄 のDataFrameとして取得（値はコピーしない）
+
+        Args:
+            field (str): 列名
+            start: 開始日
+            end: 終了日（この日を含む）
+
+        Returns:
+            pd.DataFrame: 日付 × 銘柄 のデータ
+        """
+        window = self._date_slice(start, end)
+        return pd.DataFrame(self.values[window, :, self._field_pos[field]],
+                            index=self.dates[window], columns=self.codes, copy=False)
+
+    def append(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """
+        最終日より後の取引日をファイル内に追記
+
+        容量が足りない場合はファイルを拡張する。パネルに無い銘柄のデータは無視する。
+
+        Args:
+            frames (Dict[str, pd.DataFrame]): 銘柄コードをキーとしたデータ辞書
+
+        Returns:
+            int: 追記した日数
+        """
+        if self.mode == "r":
+            raise PermissionError("読み込み専用で開いたパネルには追記できません")
+
+        last = self.dates[-1] if len(self.dates) else None
+        new_dates = []
+        for df in frames.values():
+            if df.empty:
+                continue
+            dates = _normalize_dates(df.index)
+            new_dates.extend(dates[dates > last] if last is not None else dates)
+        if not new_dates:
+            return 0
+        new_dates = pd.DatetimeIndex(new_dates).unique().sort_values()
+
+        n_old = len(self.dates)
+        n_total = n_old + len(new_dates)
+        if n_total > self._meta['capacity']:
+            self._grow(max(n_total, self._meta['capacity'] * 2))
+
+        dtype = self._meta['dtype']
+        block = self._values[n_old:n_total]
+        block[:] = np.nan
+        for code, df in frames.items():
+            if code not in self._code_pos or df.empty:
+                continue
+            df = df[~df.index.duplicated(keep='last')]
+            aligned = df.set_axis(_normalize_dates(df.index)).reindex(index=new_dates, columns=self.fields)
+            block[:, self._code_pos[code], :] = aligned.to_numpy(dtype=dtype, na_value=np.nan)
+        self._values.flush()
+
+        # 値を書き込んでからメタ情報を更新し、読み込み側に途中の状態が見えないようにする
+        self._meta['dates'].extend(d.strftime('%Y-%m-%d') for d in new_dates)
+        self._write_meta(self.path, self._meta)
+        self.refresh()
+        logger.info(f"パネルに追記しました: {self.path} ({len(new_dates)}日)")
+        return len(new_dates)
+
+    def _grow(self, capacity: int):
+        """日付の軸の容量を拡張する（日付が先頭の軸のため、ファイル末尾を伸ばすだけでよい）"""
+        itemsize = np.dtype(self._meta['dtype']).itemsize
+        row_bytes = len(self.codes) * len(self.fields) * itemsize
+        self._values.flush()
+        del self._values
+        with open(os.path.join(self.path, _VALUES_FILE), 'r+b') as f:
+            f.truncate(capacity * row_bytes)
+        self._meta['capacity'] = capacity
+        self._write_meta(self.path, self._meta)
+        self.refresh()
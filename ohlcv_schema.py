@@ -0,0 +1,152 @@
+"""
+株価データ（OHLCV）の共通形式
+取得時に1回だけ変換し、データソースによらず同じ列・型・日付の並びにする
+
+    インデックス: Date（datetime64、タイムゾーン無し、日付の古い順、重複無し）
+    列: code（category）, Open, High, Low, Close（float32）, Volume（int64）
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional
+
+INDEX_NAME = "Date"
+PRICE_COLUMNS = ("Open", "High", "Low", "Close")
+COLUMNS = ("code",) + PRICE_COLUMNS + ("Volume",)
+PRICE_DTYPE = np.dtype("float32")
+VOLUME_DTYPE = np.dtype("int64")
+
+
+def _expected_dtype(column: str):
+    if column == "code":
+        return "category"
+    return VOLUME_DTYPE if column == "Volume" else PRICE_DTYPE
+
+
+def _is_conformed(df: pd.DataFrame) -> bool:
+    """すでに共通形式の列・型・日付になっているか"""
+    if not isinstance(df.index, pd.DatetimeIndex) or df.index.tz is not None or df.index.name != INDEX_NAME:
+        return False
+    if list(df.columns) != [col for col in COLUMNS if col in df.columns]:
+        return False
+    for col, dtype in df.dtypes.items():
+        expected = _expected_dtype(col)
+        if expected == "category":
+            if not isinstance(dtype, pd.CategoricalDtype):
+                return False
+        elif dtype != expected:
+            return False
+    return True
+
+
+def conform(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    存在する列のみを共通形式の列名・型・日付に揃える（列の追加や並べ替えは行わない）
+
+    共通形式以外の列（Dividends, Stock Splits など）は除く。列を絞って読み込んだデータや、
+    以前の形式で保存されたデータの読み込みに使用する。すでに共通形式の場合はそのまま返す。
+
+    Args:
+        df (pd.DataFrame): 日付インデックスのデータ
+
+    Returns:
+        pd.DataFrame: 共通形式の型に揃えたデータ
+    """
+    if df.empty or _is_conformed(df):
+        return df
+
+    df = df.rename(columns={col: col if col == "code" else str(col).title() for col in df.columns})
+    df = df[[col for col in COLUMNS if col in df.columns]]
+
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        # 取引所の現地日付のままタイムゾーンを外す
+        index = index.tz_localize(None)
+    df = df.set_axis(index.normalize().rename(INDEX_NAME))
+
+    dtypes = {}
+    for col in df.columns:
+        if col == "code":
+            dtypes[col] = "category"
+        elif col == "Volume":
+            if df[col].dtype != VOLUME_DTYPE:
+                df = df.assign(Volume=df[col].fillna(0).round())
+            dtypes[col] = VOLUME_DTYPE
+        else:
+            dtypes[col] = PRICE_DTYPE
+    return df.astype(dtypes)
+
+
+def normalize(df: pd.DataFrame, code: Optional[str] = None) -> pd.DataFrame:
+    """
+    取得したデータを共通形式に変換
+
+    Args:
+        df (pd.DataFrame): データソースから取得したデータ
+        code (str): 銘柄コード（省略時はデータのcode列を使用）
+
+    Returns:
+        pd.DataFrame: 共通形式のデータ（日付の古い順、同じ日付は後の行を優先）
+    """
+    if df.empty:
+        return empty_frame(code)
+
+    df = conform(df)
+    if code is not None and not (
+            "code" in df.columns and len(df["code"].cat.categories) == 1 and df["code"].cat.categories[0] == code):
+        df = df.assign(code=pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[code]))
+
+    missing = [col for col in COLUMNS if col not in df.columns]
+    if missing:
+        df = df.assign(**{col: np.zeros(len(df), dtype=VOLUME_DTYPE) if col == "Volume"
+                          else np.full(len(df), np.nan, dtype=PRICE_DTYPE)
+                          for col in missing if col != "code"})
+        df = df[[col for col in COLUMNS if col in df.columns]]
+
+    if df.index.has_duplicates:
+        df = df[~df.index.duplicated(keep='last')]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    return df
+
+
+def empty_frame(code: Optional[str] = None) -> pd.DataFrame:
+    """共通形式の空のデータ"""
+    data = {col: pd.Series(dtype=_expected_dtype(col)) for col in COLUMNS}
+    if code is not None:
+        data["code"] = pd.Categorical([], categories=[code])
+    return pd.DataFrame(data, index=pd.DatetimeIndex([], name=INDEX_NAME))
+
+
+def newest_first(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    日付の新しい順に並べたビュー（値はコピーしない）
+
+    Args:
+        df (pd.DataFrame): 日付の古い順のデータ
+
+    Returns:
+        pd.DataFrame: 日付の新しい順のデータ
+    """
+    return df.iloc[::-1]
+
+
+def concat(frames: Iterable[pd.DataFrame], codes: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    複数銘柄の共通形式のデータを縦に連結（code列はcategoryのまま）
+
+    Args:
+        frames (Iterable[pd.DataFrame]): 銘柄ごとのデータ
+        codes (List[str]): code列のカテゴリ（省略時は各データのcode列の和集合）
+
+    Returns:
+        pd.DataFrame: 連結したデータ
+    """
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return empty_frame()
+    if codes is None:
+        codes = sorted({code for df in frames if "code" in df.columns for code in df["code"].unique()})
+    category = pd.CategoricalDtype(codes)
+    frames = [df.astype({"code": category}) if "code" in df.columns else df for df in frames]
+    return pd.concat(frames)
@@ -0,0 +1,481 @@
+"""
+株価データ（OHLCV）の列指向ストレージ
+データソース/銘柄コード/年 で分割したParquetファイルに保存済みでない行のみを追記し、
+追記ファイルが増えたパーティションはまとめ直す（コンパクション）
+"""
+
+import os
+import re
+import hashlib
+import time
+import uuid
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Optional, List, Dict, Tuple
+import logging
+from ohlcv_schema import conform
+
+logger = logging.getLogger(__name__)
+
+# 追記ファイル・コンパクション後のファイル名（名前順が書き込み順になる）
+_PART_PATTERN = re.compile(r'^part-(\d{19})-[0-9a-z]+\.parquet$')
+
+# 読み込み中にコンパクションでファイルが削除された場合に、パーティションを一覧し直して読み込む回数
+_READ_ATTEMPTS = 5
+
+
+class OHLCVStore:
+    """データソース/銘柄コード/年 単位で分割して株価データを保存するストレージ"""
+
+    def __init__(self, root_dir: str, compression: str = "zstd", compact_parts: Optional[int] = 16):
+        """
+        初期化
+
+        Args:
+            root_dir (str): 保存先ディレクトリ
+            compression (str): Parquetの圧縮方式
+            compact_parts (int): 追記でパーティション内のファイル数がこの数に達したらまとめ直す（Noneの場合はcompactの呼び出し時のみ）
+        """
+        self.root_dir = root_dir
+        self.compression = compression
+        self.compact_parts = compact_parts
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # 銘柄ごとの保存済みの最終行（append_newで既存データを読み直さないためのキャッシュ）
+        self._last_rows: Dict[Tuple[str, str], pd.DataFrame] = {}
+
+    def _lock(self, directory: str) -> threading.Lock:
+        """パーティション単位のロックを返す"""
+        with self._locks_guard:
+            if directory not in self._locks:
+                self._locks[directory] = threading.Lock()
+            return self._locks[directory]
+
+    def _code_dir(self, source: str, code: str) -> str:
+        return os.path.join(self.root_dir, f"source={source}", f"code={code}")
+
+    def _partition_dirs(self, source: str, code: str) -> List[str]:
+        """銘柄の年パーティションのディレクトリ（年の古い順）"""
+        code_dir = self._code_dir(source, code)
+        if not os.path.isdir(code_dir):
+            return []
+        return [os.path.join(code_dir, name) for name in sorted(os.listdir(code_dir))
+                if name.startswith("year=")]
+
+    def _partition_dirs_in_range(self, source: str, code: str, start=None, end=None) -> List[str]:
+        """期間を含む年パーティションのディレクトリ（年の古い順）"""
+        start_year = int(str(start)[:4]) if start else None
+        end_year = int(str(end)[:4]) if end else None
+        directories = []
+        for directory in self._partition_dirs(source, code):
+            year = int(os.path.basename(directory)[len("year="):])
+            if (start_year and year < start_year) or (end_year and year > end_year):
+                continue
+            directories.append(directory)
+        return directories
+
+    @staticmethod
+    def _parts(directory: str) -> List[str]:
+        """パーティション内のファイル（書き込みの古い順）"""
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if _PART_PATTERN.match(name)]
+
+    def _read_parts(self, directory: str, columns: Optional[List[str]] = None) -> List[pd.DataFrame]:
+        """
+        パーティション内のファイルを書き込みの古い順に読み込む
+
+        一覧してから読み込むまでの間に別のスレッド・プロセスのコンパクションでファイルが削除された場合は、
+        まとめたファイルを読み込むためにパーティションを一覧し直す。
+        """
+        for attempt in range(_READ_ATTEMPTS):
+            try:
+                return [conform(pd.read_parquet(path, columns=columns)) for path in self._parts(directory)]
+            except FileNotFoundError:
+                if attempt == _READ_ATTEMPTS - 1:
+                    raise
+                logger.debug(f"読み込み中にまとめ直されたため一覧し直します: {directory}")
+        return []
+
+    def codes(self, source: str) -> List[str]:
+        """
+        保存済みの銘柄コード一覧を取得
+
+        Args:
+            source (str): データソース
+
+        Returns:
+            List[str]: 銘柄コードのリスト
+        """
+        source_dir = os.path.join(self.root_dir, f"source={source}")
+        if not os.path.isdir(source_dir):
+            return []
+        return sorted(name[len("code="):] for name in os.listdir(source_dir) if name.startswith("code="))
+
+    def last_row(self, source: str, code: str) -> pd.DataFrame:
+        """
+        保存済みデータの最終日の行を取得（最新の年パーティションのみ読み込む）
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            pd.DataFrame: 最終日の1行（保存済みデータが無い場合は空のDataFrame）
+        """
+        key = (source, code)
+        with self._lock(self._code_dir(source, code)):
+            if key not in self._last_rows:
+                self._last_rows[key] = self._read_last_row(source, code)
+            return self._last_rows[key]
+
+    def version(self, source: str, code: str, start: Optional[str] = None, end: Optional[str] = None) -> str:
+        """
+        期間内の保存済みデータの版（ファイルを読み込まずに、ファイル名・サイズから求める）
+
+        追記・コンパクションで期間内のファイルが変わった場合のみ値が変わる（ETagなどに使用）。
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            start (str): 開始日（YYYY-MM-DD形式、省略時は最初から）
+            end (str): 終了日（YYYY-MM-DD形式、省略時は最後まで）
+
+        Returns:
+            str: 版を表す16進数の文字列（保存済みデータが無い場合も一定の値）
+        """
+        digest = hashlib.blake2b(digest_size=12)
+        for directory in self._partition_dirs_in_range(source, code, start, end):
+            for path in self._parts(directory):
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    # コンパクションで削除されたファイル（まとめたファイルの名前で版が変わる）
+                    continue
+                digest.update(f"{os.path.basename(directory)}/{os.path.basename(path)}:{size}\n".encode())
+        return digest.hexdigest()
+
+    def invalidate(self, source: Optional[str] = None, code: Optional[str] = None):
+        """
+        保持している保存済みの最終行を破棄（別のプロセスがストレージに書き込んだ後に使用）
+
+        Args:
+            source (str): データソース（省略時はすべて）
+            code (str): 銘柄コード（省略時はデータソース内のすべて）
+        """
+        with self._locks_guard:
+            for key in list(self._last_rows):
+                if (source is None or key[0] == source) and (code is None or key[1] == code):
+                    del self._last_rows[key]
+
+    def first_row(self, source: str, code: str) -> pd.DataFrame:
+        """
+        保存済みデータの最初の日の行を取得（最も古い年パーティションのみ読み込む）
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            pd.DataFrame: 最初の日の1行（保存済みデータが無い場合は空のDataFrame）
+        """
+        for directory in self._partition_dirs(source, code):
+            frames = self._read_parts(directory)
+            if frames:
+                df = pd.concat(frames)
+                df = df[~df.index.duplicated(keep='last')].sort_index()
+                return df.iloc[:1]
+        return pd.DataFrame()
+
+    def date_range(self, source: str, code: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        保存済みデータの最初の日と最終日を取得
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            Optional[Tuple[pd.Timestamp, pd.Timestamp]]: (最初の日, 最終日)。保存済みデータが無い場合はNone
+        """
+        last = self.last_row(source, code)
+        if last.empty:
+            return None
+        first = self.first_row(source, code)
+        return (first.index[0] if not first.empty else last.index[-1]), last.index[-1]
+
+    def _read_last_row(self, source: str, code: str) -> pd.DataFrame:
+        for directory in reversed(self._partition_dirs(source, code)):
+            frames = self._read_parts(directory)
+            if frames:
+                df = pd.concat(frames)
+                df = df[~df.index.duplicated(keep='last')].sort_index()
+                return df.iloc[-1:]
+        return pd.DataFrame()
+
+    def append_new(self, df: pd.DataFrame, source: str, code: str) -> int:
+        """
+        保存済みでない行のみを追記
+
+        保存済みの期間より新しい行・古い行（過去分の取得）と、期間内で保存されていない日付の行を書き込む。
+        保存済みの最終日の行は、値が変わっている場合（取引時間中に保存した当日分など）のみ書き直す。
+        期間内の日付の確認は日付の列のみを読み込むため、書き込む量は保存済みの期間によらず、新しい行数に比例する。
+
+        Args:
+            df (pd.DataFrame): 保存するデータ（日付インデックス）
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        new = self.unstored(df, source, code)
+        if new.empty:
+            logger.debug(f"追記する新しい行はありません: {source}/{code}")
+            return 0
+
+        self.append(new, source, code)
+        return len(new)
+
+    def unstored(self, df: pd.DataFrame, source: str, code: str) -> pd.DataFrame:
+        """
+        保存済みでない行を取り出す（append_newで書き込む行）
+
+        Args:
+            df (pd.DataFrame): 保存するデータ（日付インデックス）
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            pd.DataFrame: 保存済みでない行と、値が変わった保存済みの最終日の行（日付の古い順）
+        """
+        if df.empty:
+            return df
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+
+        last = self.last_row(source, code)
+        if last.empty:
+            return df
+
+        last_date = last.index[-1]
+        inner = df.iloc[:df.index.searchsorted(last_date, side='left')]
+        newer = df.iloc[df.index.searchsorted(last_date, side='right'):]
+        if not inner.empty:
+            # 保存済みの最終日より前の行は、保存済みの日付を除いて書き込む（過去分の取得・途中の欠け）
+            stored = self._stored_dates(source, code, inner.index[0], inner.index[-1])
+            inner = inner[~inner.index.isin(stored)]
+
+        frames = [inner]
+        if last_date in df.index:
+            current = conform(df.loc[[last_date]].iloc[-1:])
+            columns = [col for col in current.columns if col in last.columns and col != "code"]
+            if not current[columns].reset_index(drop=True).equals(last[columns].reset_index(drop=True)):
+                frames.append(current)
+        frames.append(newer)
+        return pd.concat([frame for frame in frames if not frame.empty] or [newer])
+
+    def _stored_dates(self, source: str, code: str, start, end) -> pd.DatetimeIndex:
+        """期間内の保存済みの日付（日付の列のみを読み込む）"""
+        dates = [frame.index
+                 for directory in self._partition_dirs_in_range(source, code, start, end)
+                 for frame in self._read_parts(directory, columns=[])]
+        return dates[0].append(dates[1:]) if dates else pd.DatetimeIndex([])
+
+    def append(self, df: pd.DataFrame, source: str, code: str) -> int:
+        """
+        データを年パーティションごとの新しいファイルとして追記（保存済みの行も含めてすべて書き込む）
+
+        既存ファイルは書き換えない。同じ日付の行が複数ある場合は、読み込み時に新しく書いた行が優先される。
+        パーティション内のファイル数がcompact_partsに達した場合は、そのパーティションをまとめ直す。
+
+        Args:
+            df (pd.DataFrame): 保存するデータ（日付インデックス）
+            source (str): データソース
+            code (str): 銘柄コード
+
+        Returns:
+            int: 書き込んだファイル数
+        """
+        if df.empty:
+            return 0
+
+        df = df.sort_index()
+        written = 0
+        to_compact = []
+        # Arrowへの変換は1回だけ行い、年ごとの範囲を切り出して書き込む（切り出しはコピーしない）
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        years, starts = np.unique(df.index.year, return_index=True)
+        stops = list(starts[1:]) + [len(df)]
+        for year, start, stop in zip(years, starts, stops):
+            directory = os.path.join(self._code_dir(source, code), f"year={year}")
+            os.makedirs(directory, exist_ok=True)
+            filename = f"part-{time.time_ns():019d}-{uuid.uuid4().hex[:8]}.parquet"
+            path = os.path.join(directory, filename)
+
+            # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+            with self._lock(directory):
+                pq.write_table(table.slice(start, stop - start), path + '.tmp', compression=self.compression)
+                os.replace(path + '.tmp', path)
+                if self.compact_parts and len(self._parts(directory)) >= self.compact_parts:
+                    to_compact.append(directory)
+            written += 1
+
+        key = (source, code)
+        with self._lock(self._code_dir(source, code)):
+            last = self._last_rows.get(key)
+            if last is not None and (last.empty or df.index[-1] >= last.index[-1]):
+                self._last_rows[key] = conform(df.iloc[-1:])
+
+        for directory in to_compact:
+            self._compact_partition(directory, self.compact_parts)
+
+        logger.info(f"データを追記しました: {source}/{code} ({len(df)}件, {written}ファイル)")
+        return written
+
+    def replace(self,
+                df: pd.DataFrame,
+                source: str,
+                code: str,
+                start: Optional[str] = None,
+                end: Optional[str] = None) -> int:
+        """
+        期間内の保存済みの行をdfの行で置き換える（期間外の保存済みの行は残す）
+
+        分割・配当で調整後の価格が変わった場合など、保存済みの値を書き直す場合に使用する。
+        対象の年パーティションは置き換えた内容を1ファイルに書き、既存のファイルを削除する。
+
+        Args:
+            df (pd.DataFrame): 保存するデータ（日付インデックス、期間外の行も書き込む）
+            source (str): データソース
+            code (str): 銘柄コード
+            start (str): 置き換える期間の開始日（YYYY-MM-DD形式、省略時は最初から）
+            end (str): 置き換える期間の終了日（YYYY-MM-DD形式、この日を含む。省略時は最後まで）
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        df = df.sort_index()
+        lo = pd.Timestamp(str(start)[:10]) if start else None
+        hi = pd.Timestamp(str(end)[:10]) if end else None
+        directories = set(self._partition_dirs_in_range(source, code, start, end))
+        directories.update(os.path.join(self._code_dir(source, code), f"year={year}")
+                           for year in np.unique(df.index.year))
+
+        for directory in sorted(directories):
+            year = int(os.path.basename(directory)[len("year="):])
+            with self._lock(directory):
+                parts = self._parts(directory) if os.path.isdir(directory) else []
+                frames = [conform(pd.read_parquet(path)) for path in parts]
+                if frames:
+                    stored = pd.concat(frames)
+                    stored = stored[~stored.index.duplicated(keep='last')]
+                    outside = np.zeros(len(stored), dtype=bool)
+                    if lo is not None:
+                        outside |= stored.index < lo
+                    if hi is not None:
+                        outside |= stored.index > hi
+                    frames = [stored[outside]]
+                frames.append(df[df.index.year == year])
+                merged = pd.concat([frame for frame in frames if not frame.empty] or frames[-1:])
+                merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+
+                if not merged.empty:
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f"part-{time.time_ns():019d}-{uuid.uuid4().hex[:8]}.parquet")
+                    merged.to_parquet(path + '.tmp', compression=self.compression)
+                    os.replace(path + '.tmp', path)
+                for old in parts:
+                    os.remove(old)
+                if merged.empty and os.path.isdir(directory) and not os.listdir(directory):
+                    os.rmdir(directory)
+
+        self.invalidate(source, code)
+        logger.info(f"データを置き換えました: {source}/{code} ({start or '最初'} - {end or '最後'}, {len(df)}件)")
+        return len(df)
+
+    def read(self,
+             source: str,
+             code: str,
+             start: Optional[str] = None,
+             end: Optional[str] = None,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        保存済みデータを読み込む
+
+        期間外の年パーティションは読み込まず、指定した列のみをファイルから読み込む。
+
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            start (str): 開始日（YYYY-MM-DD形式、省略時は最初から）
+            end (str): 終了日（YYYY-MM-DD形式、この日を含む。省略時は最後まで）
+            columns (List[str]): 読み込む列（省略時はすべて）
+
+        Returns:
+            pd.DataFrame: 保存済みデータ（日付の古い順、重複日付は新しく書いた行を優先。以前の形式のファイルは共通形式に揃える）
+        """
+        frames = []
+        for directory in self._partition_dirs_in_range(source, code, start, end):
+            frames.extend(self._read_parts(directory, columns))
+        if not frames:
+            return pd.DataFrame()
+
+        df = pd.concat(frames)
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        if start or end:
+            df = df.loc[str(start)[:10] if start else None:str(end)[:10] if end else None]
+        return df
+
+    def compact(self, source: Optional[str] = None, code: Optional[str] = None, min_parts: int = 2) -> int:
+        """
+        パーティション内の追記ファイルを1ファイルにまとめ、重複日付を除去する
+
+        Args:
+            source (str): データソース（省略時はすべて）
+            code (str): 銘柄コード（省略時はデータソース内のすべて）
+            min_parts (int): まとめる対象とするファイル数の下限
+
+        Returns:
+            int: まとめたパーティション数
+        """
+        if source is None:
+            if not os.path.isdir(self.root_dir):
+                return 0
+            sources = [name[len("source="):] for name in sorted(os.listdir(self.root_dir))
+                       if name.startswith("source=")]
+        else:
+            sources = [source]
+
+        compacted = 0
+        for src in sources:
+            for target in ([code] if code is not None else self.codes(src)):
+                for directory in self._partition_dirs(src, target):
+                    if self._compact_partition(directory, min_parts):
+                        compacted += 1
+
+        if compacted:
+            logger.info(f"コンパクションが完了しました: {compacted}パーティション")
+        return compacted
+
+    def _compact_partition(self, directory: str, min_parts: int) -> bool:
+        """1つのパーティションをまとめ直す"""
+        with self._lock(directory):
+            parts = self._parts(directory)
+            if len(parts) < max(min_parts, 2):
+                return False
+
+            df = pd.concat(conform(pd.read_parquet(path)) for path in parts)
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+
+            # まとめたファイルは最後に書かれたファイルと同じ位置に並ぶ名前にする
+            timestamp = _PART_PATTERN.match(os.path.basename(parts[-1])).group(1)
+            path = os.path.join(directory, f"part-{timestamp}-compacted.parquet")
+            df.to_parquet(path + '.tmp', compression=self.compression)
+            os.replace(path + '.tmp', path)
+            for old in parts:
+                if old != path:
+                    os.remove(old)
+            return True
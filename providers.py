@@ -0,0 +1,81 @@
+"""
+データソースの実装（プロバイダー）のレジストリ
+プロバイダーはデータソース名で登録し、最初に使用する時点でモジュールを読み込む。
+pandas_datareader・yfinanceは読み込みに時間がかかるため、使わないデータソースの分は読み込まない。
+"""
+
+import importlib
+import threading
+from typing import Dict, List, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# データソース名 -> "モジュール名:クラス名"
+_REGISTRY: Dict[str, Union[str, object]] = {
+    "stooq": "stooq_provider:StooqProvider",
+    "yahoo": "yahoo_provider:YahooProvider",
+}
+_INSTANCES: Dict[str, object] = {}
+_LOCK = threading.Lock()
+
+
+def register_provider(name: str, provider: Union[str, object]):
+    """
+    プロバイダーを登録（同じ名前の登録済みプロバイダーは置き換える）
+
+    プロバイダーは history(code, start, end, session=None, timeout=10.0) で指定期間（終了日を含む）の日足
+    （Open, High, Low, Close, Volume 列、日付インデックス）を返すこと。新しい名前で登録したデータソースは
+    JapaneseStockDataFetcherのsourceに指定でき、キャッシュ・取得ポリシー・同時リクエスト数の上限
+    （source_limitsに指定が無い場合はDEFAULT_PROVIDER_LIMIT）はStooq・Yahoo Financeと同じように適用される。
+
+    Args:
+        name (str): データソース名（get_multiple_stocksのsourceに指定する名前）
+        provider (str | object): "モジュール名:クラス名"（最初に使用する時点で読み込む）またはプロバイダーのインスタンス
+    """
+    with _LOCK:
+        _REGISTRY[name] = provider
+        _INSTANCES.pop(name, None)
+
+
+def get_provider(name: str):
+    """
+    プロバイダーを取得（未読み込みの場合はここでモジュールを読み込む）
+
+    Args:
+        name (str): データソース名
+
+    Returns:
+        データソース名に登録されたプロバイダーのインスタンス
+
+    Raises:
+        ValueError: 登録されていないデータソース名の場合
+    """
+    provider = _INSTANCES.get(name)
+    if provider is not None:
+        return provider
+
+    with _LOCK:
+        if name in _INSTANCES:
+            return _INSTANCES[name]
+        if name not in _REGISTRY:
+            raise ValueError(f"サポートされていないデータソース: {name}")
+        target = _REGISTRY[name]
+        if isinstance(target, str):
+            module_name, _, class_name = target.partition(":")
+            logger.debug(f"プロバイダーを読み込みます: {name} ({target})")
+            provider = getattr(importlib.import_module(module_name), class_name)()
+        else:
+            provider = target
+        _INSTANCES[name] = provider
+        return provider
+
+
+def available_providers() -> List[str]:
+    """登録されているデータソース名の一覧"""
+    return sorted(_REGISTRY)
+
+
+def is_loaded(name: str) -> bool:
+    """プロバイダーが読み込み済みか"""
+    return name in _INSTANCES
@@ -0,0 +1,136 @@
+"""
+リアルタイム株価のプロセス内キャッシュ
+有効期限（TTL）付きで保持し、同じ銘柄への同時リクエストは1回の取得にまとめる
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class _InFlight:
+    """取得中のリクエスト（同じキーの呼び出し元が結果を待ち合わせる）"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """TTL・件数上限付きのキャッシュ（同時リクエストの集約機能付き）"""
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 1000):
+        """
+        初期化
+
+        Args:
+            ttl (float): キャッシュの有効期限（秒）
+            max_entries (int): 保持する最大件数（超えた場合は最も古く使われたものから削除）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'errors': 0,
+        }
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        キャッシュから値を取得し、無い場合や期限切れの場合はloaderで取得する
+
+        同じキーを取得中の場合は、その結果を待って共有する。
+        loaderが例外を送出した場合は、待っていた呼び出し元すべてに同じ例外を送出する（キャッシュはしない）。
+
+        Args:
+            key (Hashable): キャッシュキー
+            loader (Callable): 値を取得する関数
+
+        Returns:
+            Any: キャッシュまたはloaderから取得した値
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fetched_at = entry
+                if time.monotonic() - fetched_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                # 期限切れ
+                del self._entries[key]
+                self._stats['stale'] += 1
+
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+                self._stats['misses'] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if isinstance(flight.error, Exception):
+                raise flight.error
+            if flight.error is not None:
+                # 取得中のスレッドが中断された（KeyboardInterruptなど）場合は、待っていたスレッドには例外として伝える
+                raise RuntimeError(f"同じキーの取得が中断されました: {key!r}") from flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            with self._lock:
+                self._entries[key] = (flight.value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            # どのような例外でも取得中の登録を外して待っているスレッドを起こす
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, key: Hashable = None):
+        """
+        キャッシュを削除
+
+        Args:
+            key (Hashable): 削除するキー（省略時はすべて削除）
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            Dict[str, float]: ヒット数・ミス数・期限切れ数・集約数・削除数・エラー数・件数・ヒット率
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        requests = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = (stats['hits'] + stats['coalesced']) / requests if requests else 0.0
+        return stats
@@ -0,0 +1,576 @@
+"""
+リアルタイム株価の配信サービス
+監視する銘柄の組ごとに1つのポーラーがJapaneseStockDataFetcherでリアルタイム株価を取得し、
+変化した項目のみをServer-Sent Events（SSE）で任意の数の購読者に配信する。
+購読者（Streamlitのセッション・main.pyなど）の数によらず、データソースへのリクエスト数は一定になる。
+
+    GET /quotes?codes=7203,6758    SSE（最初に snapshot、以降は変化した項目のみの update）
+    GET /snapshot?codes=7203,6758  現在の株価（JSON）
+    GET /stats                     ポーラー・購読者・取得回数（JSON）
+"""
+
+import json
+import queue
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 変化の判定に使わない項目（取得のたびに変わるため、他の項目が変化した場合のみ送る）
+_VOLATILE_FIELDS = ("timestamp",)
+
+
+def parse_codes(codes) -> Tuple[str, ...]:
+    """
+    銘柄コードの並びを重複の無い、並び順によらないタプルに揃える
+
+    Args:
+        codes (str または Iterable[str]): 銘柄コード（カンマ区切りの文字列も可）
+
+    Returns:
+        Tuple[str, ...]: 銘柄コード（昇順）
+    """
+    if isinstance(codes, str):
+        codes = codes.split(",")
+    return tuple(sorted({code.strip().replace('.T', '') for code in codes if code.strip()}))
+
+
+def diff_quote(previous: Dict, current: Dict) -> Dict:
+    """
+    前回から変化した項目のみを取り出す
+
+    Args:
+        previous (Dict): 前回のリアルタイム株価（初回は空の辞書）
+        current (Dict): 今回のリアルタイム株価
+
+    Returns:
+        Dict: 変化した項目（変化が無い場合は空の辞書。変化がある場合は code と timestamp を含む）
+    """
+    changes = {key: value for key, value in current.items()
+               if key not in _VOLATILE_FIELDS and previous.get(key) != value}
+    if not changes:
+        return {}
+    changes['code'] = current.get('code')
+    for key in _VOLATILE_FIELDS:
+        if key in current:
+            changes[key] = current[key]
+    return changes
+
+
+class Subscription:
+    """1購読者分の配信キュー"""
+
+    def __init__(self, codes: Tuple[str, ...], max_queue: int = 1000):
+        self.codes = codes
+        self.queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        次の更新を受け取る
+
+        Args:
+            timeout (float): 待つ時間（秒）
+
+        Returns:
+            Optional[Dict]: 変化した項目。時間内に更新が無い場合・購読が終了した場合はNone
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _Poller:
+    """1つの銘柄の組のリアルタイム株価を一定間隔で取得し、変化を購読者に配信する"""
+
+    def __init__(self, hub: "QuoteHub", codes: Tuple[str, ...]):
+        self.hub = hub
+        self.codes = codes
+        self.quotes: Dict[str, Dict] = {}
+        self.subscribers: List[Subscription] = []
+        self.polls = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.idle_since: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"quote-poller-{','.join(codes)[:40]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscription in subscribers:
+            self._close(subscription)
+
+    def join(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+
+    def attach(self, subscription: Subscription) -> Dict[str, Dict]:
+        """購読者を追加し、現在の株価を返す"""
+        with self.lock:
+            self.subscribers.append(subscription)
+            self.idle_since = None
+            return {code: dict(quote) for code, quote in self.quotes.items()}
+
+    def detach(self, subscription: Subscription):
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+            if not self.subscribers:
+                self.idle_since = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.lock:
+            return {code: dict(quote) for code, quote in self.quotes.items()}
+
+    @staticmethod
+    def _close(subscription: Subscription):
+        subscription.closed = True
+        try:
+            subscription.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _publish(self, changes: Dict):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(changes)
+            except queue.Full:
+                # 受け取りが追いつかない購読者は切断する（再接続時にsnapshotから受け取り直す）
+                logger.warning(f"受け取りが遅い購読者を切断します: {','.join(self.codes)}")
+                self.detach(subscription)
+                self._close(subscription)
+
+    def poll(self):
+        """全銘柄を1回取得し、変化した項目を配信する"""
+        self.polls += 1
+        for code in self.codes:
+            if self._stop.is_set():
+                return
+            self.requests += 1
+            current = self.hub.fetcher.get_realtime_price(code)
+            if not current:
+                continue
+            with self.lock:
+                changes = diff_quote(self.quotes.get(code, {}), current)
+                if changes:
+                    self.quotes[code] = current
+            if changes:
+                self._publish(changes)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"リアルタイム株価の取得に失敗しました: {e}")
+            with self.lock:
+                idle = self.idle_since is not None and time.monotonic() - self.idle_since >= self.hub.linger
+            if idle and self.hub._remove(self):
+                # 購読者がいなくなってからlinger秒経過したため停止した
+                return
+            self._stop.wait(max(0.0, self.hub.current_interval() - (time.monotonic() - started)))
+
+
+class QuoteHub:
+    """
+    銘柄の組ごとのポーラーと購読者を管理する
+
+    同じ銘柄の組の購読者は1つのポーラーを共有する。銘柄の組が異なるポーラー間で重複する銘柄は、
+    JapaneseStockDataFetcherのリアルタイム株価のキャッシュ（quote_ttl）によりまとめて取得される。
+    """
+
+    def __init__(self,
+                 fetcher,
+                 interval: float = 5.0,
+                 closed_interval: float = 60.0,
+                 linger: float = 30.0,
+                 max_queue: int = 1000):
+        """
+        初期化
+
+        Args:
+            fetcher (JapaneseStockDataFetcher): リアルタイム株価の取得に使うインスタンス
+            interval (float): 立会時間中の取得間隔（秒）
+            closed_interval (float): 立会時間外の取得間隔（秒）
+            linger (float): 購読者がいなくなってからポーラーを停止するまでの時間（秒）
+            max_queue (int): 購読者ごとの未受信の更新の上限（超えた購読者は切断する）
+        """
+        self.fetcher = fetcher
+        self.interval = interval
+        self.closed_interval = closed_interval
+        self.linger = linger
+        self.max_queue = max_queue
+        self._pollers: Dict[Tuple[str, ...], _Poller] = {}
+        self._lock = threading.Lock()
+
+    def current_interval(self) -> float:
+        """現在の取得間隔（立会時間外は日中の値が変わらないため間隔を広げる）"""
+        calendar = getattr(self.fetcher, "calendar", None)
+        if calendar is not None and not calendar.is_open():
+            return max(self.interval, self.closed_interval)
+        return self.interval
+
+    def _poller(self, codes: Tuple[str, ...]) -> _Poller:
+        """銘柄の組のポーラー（無い場合は作成して開始する）。呼び出し側でself._lockを取得すること"""
+        poller = self._pollers.get(codes)
+        if poller is None:
+            poller = _Poller(self, codes)
+            self._pollers[codes] = poller
+            poller.start()
+            logger.info(f"ポーラーを開始しました: {','.join(codes)}")
+        return poller
+
+    def _remove(self, poller: _Poller) -> bool:
+        """購読者がいない場合のみポーラーを停止して削除する（停止した場合はTrue）"""
+        with self._lock:
+            with poller.lock:
+                if poller.subscribers:
+                    return False
+            if self._pollers.get(poller.codes) is poller:
+                del self._pollers[poller.codes]
+        poller.stop()
+        logger.info(f"購読者がいないためポーラーを停止しました: {','.join(poller.codes)}")
+        return True
+
+    def subscribe(self, codes) -> Tuple[Subscription, Dict[str, Dict]]:
+        """
+        銘柄の組の更新を購読
+
+        Args:
+            codes (str または Iterable[str]): 銘柄コード
+
+        Returns:
+            Tuple[Subscription, Dict[str, Dict]]: 購読と、購読開始時点の株価（取得前の銘柄は含まない）
+        """
+        codes = parse_codes(codes)
+        subscription = Subscription(codes, self.max_queue)
+        with self._lock:
+            snapshot = self._poller(codes).attach(subscription)
+        return subscription, snapshot
+
+    def unsubscribe(self, subscription: Subscription):
+        """購読を終了"""
+        with self._lock:
+            poller = self._pollers.get(subscription.codes)
+        if poller is not None:
+            poller.detach(subscription)
+        subscription.closed = True
+
+    def snapshot(self, codes, timeout: float = 10.0) -> Dict[str, Dict]:
+        """
+        銘柄の組の現在の株価を取得（ポーラーが無い場合は開始し、全銘柄を取得するまで待つ）
+
+        Args:
+            codes (str または Iterable[str]): 銘柄コード
+            timeout (float): 最初の取得を待つ時間（秒）
+
+        Returns:
+            Dict[str, Dict]: 銘柄コードをキーとした株価（取得できなかった銘柄は含まない）
+        """
+        codes = parse_codes(codes)
+        subscription, quotes = self.subscribe(codes)
+        try:
+            deadline = time.monotonic() + timeout
+            while len(quotes) < len(codes):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                changes = subscription.get(timeout=remaining)
+                if changes is None:
+                    break
+                quotes.setdefault(changes['code'], {}).update(changes)
+            return quotes
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict:
+        """
+        ポーラーごとの状態
+
+        Returns:
+            Dict: pollers（銘柄の組ごとの subscribers, polls, requests）, subscribers, requests, interval
+        """
+        with self._lock:
+            pollers = list(self._pollers.values())
+        items = []
+        for poller in pollers:
+            with poller.lock:
+                items.append({'codes': list(poller.codes), 'subscribers': len(poller.subscribers),
+                              'polls': poller.polls, 'requests': poller.requests})
+        return {
+            'pollers': items,
+            'subscribers': sum(item['subscribers'] for item in items),
+            'requests': sum(item['requests'] for item in items),
+            'interval': self.current_interval(),
+        }
+
+    def close(self):
+        """すべてのポーラーを停止"""
+        with self._lock:
+            pollers, self._pollers = list(self._pollers.values()), {}
+        for poller in pollers:
+            poller.stop()
+        for poller in pollers:
+            poller.join(timeout=5)
+
+
+class QuoteServer:
+    """QuoteHubの配信をHTTP（SSE）で公開するサーバー"""
+
+    def __init__(self, hub: QuoteHub, host: str = "127.0.0.1", port: int = 8765, keepalive: float = 15.0):
+        """
+        初期化
+
+        Args:
+            hub (QuoteHub): 配信元
+            host (str): 待ち受けるアドレス
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            keepalive (float): 更新が無い場合に接続維持のコメントを送る間隔（秒）
+        """
+        self.hub = hub
+        self.keepalive = keepalive
+        self._thread: Optional[threading.Thread] = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "QuoteServer":
+        """別スレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="quote-server", daemon=True)
+        self._thread.start()
+        logger.info(f"リアルタイム株価の配信を開始しました: {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        """このスレッドで待ち受ける（Ctrl+Cで終了）"""
+        logger.info(f"リアルタイム株価の配信を開始しました: {self.base_url}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        self.hub.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def _send_json(handler: BaseHTTPRequestHandler, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        url = urlsplit(handler.path)
+        query = parse_qs(url.query)
+        codes = parse_codes(",".join(query.get("codes", [])))
+        if url.path == "/stats":
+            return self._send_json(handler, 200, self.hub.stats())
+        if url.path not in ("/quotes", "/snapshot"):
+            return self._send_json(handler, 404, {'error': "not found"})
+        if not codes:
+            return self._send_json(handler, 400, {'error': "codes を指定してください"})
+        if url.path == "/snapshot":
+            return self._send_json(handler, 200, self.hub.snapshot(codes))
+        self._stream(handler, codes)
+
+    def _stream(self, handler: BaseHTTPRequestHandler, codes: Tuple[str, ...]):
+        """SSEで購読開始時点の株価と、以降の変化を送り続ける"""
+        subscription, snapshot = self.hub.subscribe(codes)
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            handler.send_header("Cache-Control", "no-cache")
+            # イベントごとに1チャンクで送り、受信側がイベントの区切りで読み込めるようにする
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.send_header("Connection", "close")
+            handler.end_headers()
+            handler.close_connection = True
+            _write_chunk(handler, _event("snapshot", snapshot))
+            while not subscription.closed:
+                changes = subscription.get(timeout=self.keepalive)
+                if changes is None:
+                    if subscription.closed:
+                        break
+                    _write_chunk(handler, b": keepalive\n\n")
+                else:
+                    _write_chunk(handler, _event("update", changes))
+            _write_chunk(handler, b"")
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"購読者が切断しました: {','.join(codes)}")
+        finally:
+            self.hub.unsubscribe(subscription)
+
+
+def _write_chunk(handler: BaseHTTPRequestHandler, data: bytes):
+    """chunked形式で1チャンクを送る（空のデータは終端）"""
+    handler.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+    handler.wfile.flush()
+
+
+def _event(name: str, payload) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def subscribe(base_url: str,
+              codes,
+              session: Optional[requests.Session] = None,
+              timeout: float = 60.0) -> Iterator[Tuple[str, Dict]]:
+    """
+    配信サービスに接続し、イベントを1つずつ返すジェネレーター
+
+    Args:
+        base_url (str): 配信サービスのURL（例: "http://127.0.0.1:8765"）
+        codes (str または Iterable[str]): 銘柄コード
+        session (requests.Session): 接続に使うセッション
+        timeout (float): 読み込みのタイムアウト（秒。keepaliveの間隔より長くすること）
+
+    Yields:
+        Tuple[str, Dict]: イベント名（"snapshot" または "update"）とデータ
+    """
+    session = session or requests.Session()
+    params = {'codes': ",".join(parse_codes(codes))}
+    with session.get(f"{base_url.rstrip('/')}/quotes", params=params, stream=True, timeout=(5, timeout)) as response:
+        response.raise_for_status()
+        name, data = "message", []
+        # チャンク（イベント）を受け取った時点で処理する（一定量たまるまで待たない）
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if line:
+                if line.startswith("event:"):
+                    name = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                continue
+            if data:
+                yield name, json.loads("\n".join(data))
+            name, data = "message", []
+
+
+class QuoteClient:
+    """
+    配信サービスを購読し、最新の株価を保持するクライアント
+
+    バックグラウンドのスレッドで受け取った変化を銘柄ごとの株価に反映する。切断された場合は再接続する。
+    """
+
+    def __init__(self, base_url: str, codes, session: Optional[requests.Session] = None, retry_interval: float = 5.0):
+        """
+        初期化（購読を開始する）
+
+        Args:
+            base_url (str): 配信サービスのURL
+            codes (str または Iterable[str]): 銘柄コード
+            session (requests.Session): 接続に使うセッション
+            retry_interval (float): 切断後に再接続するまでの時間（秒）
+        """
+        self.base_url = base_url
+        self.codes = parse_codes(codes)
+        self.session = session or requests.Session()
+        self.retry_interval = retry_interval
+        self.quotes: Dict[str, Dict] = {}
+        self.updates = 0
+        self.last_error: Optional[str] = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="quote-client", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                for name, payload in subscribe(self.base_url, self.codes, self.session):
+                    with self._condition:
+                        if name == "snapshot":
+                            self.quotes = {code: dict(quote) for code, quote in payload.items()}
+                        else:
+                            self.quotes.setdefault(payload['code'], {}).update(payload)
+                        self.updates += 1
+                        self.last_error = None
+                        self._condition.notify_all()
+                    if self._stop.is_set():
+                        return
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                self.last_error = str(e)
+                logger.warning(f"配信サービスとの接続が切れました（{self.retry_interval}秒後に再接続）: {e}")
+            self._stop.wait(self.retry_interval)
+
+    def wait(self, codes: Optional[Iterable[str]] = None, timeout: float = 10.0) -> bool:
+        """
+        指定した銘柄の株価を受け取るまで待つ
+
+        Args:
+            codes (Iterable[str]): 銘柄コード（省略時は購読しているすべての銘柄）
+            timeout (float): 待つ時間（秒）
+
+        Returns:
+            bool: すべて受け取った場合はTrue
+        """
+        wanted = parse_codes(codes) if codes is not None else self.codes
+        with self._condition:
+            return self._condition.wait_for(lambda: all(code in self.quotes for code in wanted), timeout)
+
+    def get(self, code: str, timeout: float = 10.0) -> Dict:
+        """
+        銘柄の最新の株価（JapaneseStockDataFetcher.get_realtime_priceと同じ形式）
+
+        Args:
+            code (str): 銘柄コード
+            timeout (float): まだ受け取っていない場合に待つ時間（秒）
+
+        Returns:
+            Dict: リアルタイム株価情報（受け取れない場合は空の辞書）
+        """
+        code = code.replace('.T', '')
+        self.wait([code], timeout)
+        with self._condition:
+            return dict(self.quotes.get(code, {}))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """受け取り済みの全銘柄の株価"""
+        with self._condition:
+            return {code: dict(quote) for code, quote in self.quotes.items()}
+
+    def close(self):
+        """購読を終了"""
+        self._stop.set()
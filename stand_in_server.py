@@ -0,0 +1,380 @@
+"""
+Stooq・Yahoo Financeの代わりに応答するローカルHTTPサーバー（ベンチマーク・オフライン検証用）
+合成データまたは記録済みの応答を、指定した遅延・エラー率で返す
+"""
+
+import os
+import json
+import time
+import zlib
+import zipfile
+import functools
+import random
+import threading
+import datetime as dt
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+from typing import Optional, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from jpx_calendar import load_holidays
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 転送対象のホスト（StandInSessionがこのホストへのリクエストをローカルサーバーに送る）
+STOOQ_HOST = "https://stooq.com"
+YAHOO_HOSTS = ("https://query1.finance.yahoo.com", "https://query2.finance.yahoo.com")
+
+_JST = dt.timezone(dt.timedelta(hours=9))
+
+
+@functools.lru_cache(maxsize=1)
+def _closed_days() -> np.ndarray:
+    """取引所の休日（祝日と年末年始）"""
+    holidays = set(load_holidays())
+    for year in range(1990, 2051):
+        holidays.update({dt.date(year, 1, 1), dt.date(year, 1, 2), dt.date(year, 1, 3), dt.date(year, 12, 31)})
+    return np.array(sorted(holidays), dtype='datetime64[D]')
+
+
+def _synthetic_arrays(symbol: str, start: dt.date, end: dt.date) -> Tuple[np.ndarray, ...]:
+    """合成の日足を配列で生成（日付, 始値, 高値, 安値, 終値, 出来高）"""
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    days = days[np.is_busday(days, holidays=_closed_days())]
+
+    # 同じ日付には常に同じ値を返すよう、基準日からの営業日数で価格を決める
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    base = 1000 + rng.random() * 9000
+    offsets = np.busday_count(np.datetime64('2000-01-03'), days)
+    close = base * np.exp(0.2 * np.sin(offsets / 50.0) + 0.05 * np.sin(offsets / 7.0))
+    open_ = close * (1 + 0.005 * np.cos(offsets))
+    high = np.maximum(open_, close) * 1.01
+    low = np.minimum(open_, close) * 0.99
+    volume = (1_000_000 + 500_000 * np.abs(np.sin(offsets / 3.0))).astype(np.int64)
+    return days, open_.round(1), high.round(1), low.round(1), close.round(1), volume
+
+
+def synthetic_bars(symbol: str, start: dt.date, end: dt.date) -> List[Tuple[dt.date, float, float, float, float, int]]:
+    """
+    銘柄ごとに再現性のある合成の日足（取引所の休日を除く平日のみ）を生成
+
+    Args:
+        symbol (str): 銘柄シンボル（乱数の種に使う）
+        start (dt.date): 開始日
+        end (dt.date): 終了日（この日を含む）
+
+    Returns:
+        List[Tuple]: (日付, 始値, 高値, 安値, 終値, 出来高) のリスト
+    """
+    days, open_, high, low, close, volume = _synthetic_arrays(symbol, start, end)
+    return [(day.astype(dt.date), float(o), float(h), float(l), float(c), int(v))
+            for day, o, h, l, c, v in zip(days, open_, high, low, close, volume)]
+
+
+def write_stooq_archive(path: str,
+                        codes: List[str],
+                        start: dt.date,
+                        end: dt.date,
+                        compression: int = zipfile.ZIP_DEFLATED) -> int:
+    """
+    Stooqの一括ダウンロード（d_jp_txt.zip）と同じ構成の合成アーカイブを作成（取り込みのオフライン検証用）
+
+    銘柄ごとに data/daily/jp/tse stocks/{n}/{code}.jp.txt を作成する。値はStooqのスタンドインの応答と同じ。
+
+    Args:
+        path (str): 作成するzipファイルのパス
+        codes (List[str]): 銘柄コードのリスト（.jpなし）
+        start (dt.date): 開始日
+        end (dt.date): 終了日（この日を含む）
+        compression (int): zipの圧縮方式
+
+    Returns:
+        int: 作成したメンバー数
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with zipfile.ZipFile(path + '.tmp', 'w', compression=compression) as archive:
+        for i, code in enumerate(codes):
+            symbol = f"{code}.JP"
+            days, open_, high, low, close, volume = _synthetic_arrays(symbol, start, end)
+            member = pd.DataFrame({
+                "<TICKER>": symbol, "<PER>": "D",
+                "<DATE>": pd.DatetimeIndex(days).strftime("%Y%m%d"), "<TIME>": "000000",
+                "<OPEN>": open_, "<HIGH>": high, "<LOW>": low, "<CLOSE>": close, "<VOL>": volume, "<OPENINT>": 0,
+            })
+            archive.writestr(f"data/daily/jp/tse stocks/{i // 1000 + 1}/{code.lower()}.jp.txt",
+                             member.to_csv(index=False, lineterminator="\n"))
+    os.replace(path + '.tmp', path)
+    return len(codes)
+
+
+class StandInServer:
+    """Stooq・Yahoo Financeの代わりに応答するローカルHTTPサーバー"""
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 recordings_dir: Optional[str] = None,
+                 seed: int = 0,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        """
+        初期化
+
+        Args:
+            latency (float): 応答までの遅延（秒）
+            jitter (float): 遅延に加える一様乱数の最大値（秒）
+            error_rate (float): HTTP 503を返す割合（0〜1）
+            recordings_dir (str): 記録済みの応答を置いたディレクトリ
+                                  （stooq/{シンボル}.csv, yahoo/chart/{シンボル}.json,
+                                  yahoo/quoteSummary/{シンボル}.json があればそれを返す）
+            seed (int): 遅延・エラーの乱数の種
+            host (str): 待ち受けるアドレス
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.recordings_dir = recordings_dir
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        """バックグラウンドのスレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"スタンドインサーバーを起動しました: {self.base_url}")
+        return self
+
+    def stop(self):
+        """待ち受けを終了"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def session(self, pool_maxsize: int = 10) -> requests.Session:
+        """Stooq・Yahoo Financeへのリクエストをこのサーバーに送るセッションを作成"""
+        return StandInSession(self.base_url, pool_maxsize=pool_maxsize)
+
+    def _count(self, key: str):
+        with self._counts_lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        parts = urlsplit(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        path = unquote(parts.path)
+
+        with self._random_lock:
+            delay = self.latency + self._random.random() * self.jitter
+            fail = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+
+        if path.startswith("/q/d/l"):
+            kind = "stooq"
+        elif path.startswith("/v8/finance/chart/"):
+            kind = "yahoo_chart"
+        elif "/quoteSummary/" in path:
+            kind = "yahoo_quote"
+        elif "/fundamentals-timeseries/" in path:
+            kind = "yahoo_timeseries"
+        else:
+            kind = "unknown"
+        self._count(kind)
+
+        if fail:
+            self._count("errors")
+            self._send(handler, 503, "text/plain", b"Service Unavailable (stand-in)")
+            return
+
+        if kind == "stooq":
+            body = self._stooq(query)
+            self._send(handler, 200, "text/csv", body)
+        elif kind == "yahoo_chart":
+            body = self._yahoo_chart(path.rsplit("/", 1)[-1], query)
+            self._send(handler, 200, "application/json", body)
+        elif kind == "yahoo_quote":
+            body = self._yahoo_quote(path.rsplit("/", 1)[-1])
+            self._send(handler, 200, "application/json", body)
+        elif kind == "yahoo_timeseries":
+            self._send(handler, 200, "application/json", json.dumps({"timeseries": {"result": []}}).encode())
+        else:
+            self._send(handler, 404, "text/plain", b"Not Found")
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, content_type: str, body: bytes):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _recorded(self, *parts: str) -> Optional[bytes]:
+        if not self.recordings_dir:
+            return None
+        path = os.path.join(self.recordings_dir, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _stooq(self, query: Dict[str, str]) -> bytes:
+        symbol = query.get("s", "")
+        recorded = self._recorded("stooq", f"{symbol}.csv")
+        if recorded is not None:
+            return recorded
+
+        start = dt.datetime.strptime(query.get("d1", "20220101"), "%Y%m%d").date()
+        end = dt.datetime.strptime(query.get("d2", dt.date.today().strftime("%Y%m%d")), "%Y%m%d").date()
+        lines = ["Date,Open,High,Low,Close,Volume"]
+        # Stooqは新しい日付から順に返す
+        for day, o, h, l, c, v in reversed(synthetic_bars(symbol, start, end)):
+            lines.append(f"{day.isoformat()},{o},{h},{l},{c},{v}")
+        return ("\n".join(lines) + "\n").encode()
+
+    def _yahoo_chart(self, symbol: str, query: Dict[str, str]) -> bytes:
+        recorded = self._recorded("yahoo", "chart", f"{symbol}.json")
+        if recorded is not None:
+            return recorded
+
+        today = dt.datetime.now(_JST).date()
+        if "period1" in query:
+            start = dt.datetime.fromtimestamp(int(query["period1"]), _JST).date()
+            end = dt.datetime.fromtimestamp(int(query.get("period2", time.time())), _JST).date() - dt.timedelta(days=1)
+        else:
+            days = {"1d": 1, "5d": 7, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366}.get(query.get("range", "1mo"), 31)
+            start, end = today - dt.timedelta(days=days), today
+
+        bars = synthetic_bars(symbol, start, end)
+        timestamps = [int(dt.datetime.combine(day, dt.time(9, 0), _JST).timestamp()) for day, *_ in bars]
+        quote = {
+            "open": [bar[1] for bar in bars],
+            "high": [bar[2] for bar in bars],
+            "low": [bar[3] for bar in bars],
+            "close": [bar[4] for bar in bars],
+            "volume": [bar[5] for bar in bars],
+        }
+        now = int(time.time())
+        meta = {
+            "currency": "JPY",
+            "symbol": symbol,
+            "exchangeName": "JPX",
+            "instrumentType": "EQUITY",
+            "exchangeTimezoneName": "Asia/Tokyo",
+            "timezone": "JST",
+            "gmtoffset": 32400,
+            "regularMarketPrice": bars[-1][4] if bars else None,
+            "chartPreviousClose": bars[-2][4] if len(bars) > 1 else None,
+            "regularMarketTime": now,
+            "dataGranularity": query.get("interval", "1d"),
+            "range": query.get("range", ""),
+            "validRanges": ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"],
+            "currentTradingPeriod": {
+                period: {"timezone": "JST", "start": now - 3600, "end": now + 3600, "gmtoffset": 32400}
+                for period in ("pre", "regular", "post")
+            },
+        }
+        result = {"meta": meta}
+        if bars:
+            result["timestamp"] = timestamps
+            result["indicators"] = {"quote": [quote], "adjclose": [{"adjclose": quote["close"]}]}
+        else:
+            result["indicators"] = {"quote": [{}]}
+        return json.dumps({"chart": {"result": [result], "error": None}}).encode()
+
+    def _yahoo_quote(self, symbol: str) -> bytes:
+        recorded = self._recorded("yahoo", "quoteSummary", f"{symbol}.json")
+        if recorded is not None:
+            return recorded
+
+        today = dt.datetime.now(_JST).date()
+        bars = synthetic_bars(symbol, today - dt.timedelta(days=7), today)
+        last, previous = bars[-1], bars[-2]
+
+        def raw(value):
+            return {"raw": value, "fmt": str(value)}
+
+        result = {
+            "symbol": symbol,
+            "price": {
+                "longName": f"Stand-in {symbol}",
+                "regularMarketPrice": raw(last[4]),
+                "currency": "JPY",
+            },
+            "summaryDetail": {
+                "previousClose": raw(previous[4]),
+                "open": raw(last[1]),
+                "dayHigh": raw(last[2]),
+                "dayLow": raw(last[3]),
+                "volume": raw(last[5]),
+                "marketCap": raw(int(last[4] * 1_000_000_000)),
+                "trailingPE": raw(15.0),
+                "dividendYield": raw(0.02),
+            },
+            "financialData": {
+                "currentPrice": raw(last[4]),
+            },
+        }
+        return json.dumps({"quoteSummary": {"result": [result], "error": None}}).encode()
+
+
+class _RedirectAdapter(HTTPAdapter):
+    """指定したホストへのリクエストをスタンドインサーバーに転送するアダプター"""
+
+    def __init__(self, prefix: str, base_url: str, **kwargs):
+        self._prefix = prefix
+        self._base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request.url = self._base_url + request.url[len(self._prefix):]
+        return super().send(request, **kwargs)
+
+
+class StandInSession(requests.Session):
+    """Stooq・Yahoo Financeへのリクエストをスタンドインサーバーに送るセッション"""
+
+    def __init__(self, base_url: str, pool_maxsize: int = 10):
+        """
+        初期化
+
+        Args:
+            base_url (str): スタンドインサーバーのURL
+            pool_maxsize (int): 接続プールの大きさ
+        """
+        super().__init__()
+        for prefix in (STOOQ_HOST,) + YAHOO_HOSTS:
+            self.mount(prefix, _RedirectAdapter(prefix, base_url, pool_maxsize=pool_maxsize))
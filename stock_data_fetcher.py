@@ -5,28 +5,149 @@
 
 import os
 import datetime as dt
+import numpy as np
 import pandas as pd
-import pandas_datareader.data as web
-import yfinance as yf
-from typing import Optional, Dict, List
+import requests
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Optional, Dict, List, Callable, Iterable, Iterator, Tuple
 import logging
+from ohlcv_cache import OHLCVCache, prices_differ, to_date
+from quote_cache import QuoteCache
+from ohlcv_store import OHLCVStore
+from ohlcv_panel import OHLCVPanel, DEFAULT_FIELDS
+from ohlcv_schema import normalize, conform, empty_frame, concat as concat_frames
+from jpx_calendar import JPXCalendar
+from fetch_metrics import FetchMetrics
+from fetch_policy import FetchPolicy
+from providers import get_provider, available_providers
+from http_session import PooledSession, pool_stats, DEFAULT_USER_AGENT
 
-# ログ設定
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# データソースごとの同時リクエスト数の上限（デフォルト）
+DEFAULT_SOURCE_LIMITS = {
+    "stooq": 4,
+    "yahoo": 8,
+}
+
+# DEFAULT_SOURCE_LIMITS・source_limitsに無いデータソース（register_providerで追加したもの）の同時リクエスト数の上限
+DEFAULT_PROVIDER_LIMIT = 4
+
+def _slice_dates(df: pd.DataFrame, start: dt.date, end: dt.date) -> pd.DataFrame:
+    """日付の古い順に並んだデータから指定期間（終了日を含む）を切り出す"""
+    if df.empty:
+        return df
+    return df.loc[start.isoformat():end.isoformat()]
+
+
 class JapaneseStockDataFetcher:
     """日本の株価データを取得するクラス"""
     
-    def __init__(self, data_dir: str = "stock_data"):
+    def __init__(self,
+                 data_dir: str = "stock_data",
+                 use_cache: bool = True,
+                 source_limits: Optional[Dict[str, int]] = None,
+                 quote_ttl: float = 5.0,
+                 quote_cache_size: int = 1000,
+                 quote_mode: str = "lite",
+                 profile_ttl: float = 6 * 60 * 60,
+                 session: Optional[requests.Session] = None,
+                 metrics_enabled: bool = False,
+                 fetch_policy: Optional[FetchPolicy] = None,
+                 pool_maxsize: Optional[int] = None,
+                 user_agent: Optional[str] = DEFAULT_USER_AGENT,
+                 connect_timeout: float = 5.0,
+                 calendar: Optional[JPXCalendar] = None):
         """
         初期化
         
         Args:
             data_dir (str): データ保存ディレクトリ
+            use_cache (bool): 取得済み期間をキャッシュし、不足分のみ取得するか
+                              （取得したデータはストレージに追記し、ストレージに保存済みの期間も取得しない）
+            source_limits (Dict[str, int]): データソースごとの同時リクエスト数の上限（指定の無い追加のデータソースはDEFAULT_PROVIDER_LIMIT）
+            quote_ttl (float): リアルタイム株価のキャッシュ有効期限（秒）
+            quote_cache_size (int): リアルタイム株価のキャッシュ最大件数
+            quote_mode (str): リアルタイム株価の取得方法
+                              （"lite": 日足のみ取得し会社情報は別途キャッシュ, "full": 毎回ticker.infoを取得）
+            profile_ttl (float): 会社名・時価総額・PER・配当利回りのキャッシュ有効期限（秒）
+            session (requests.Session): データソースへのリクエストに使うセッション
+                                        （省略時は接続プール付きのセッションを作成し、すべてのデータソースで共有する）
+            metrics_enabled (bool): 処理段階ごとの所要時間や成功/失敗数などのメトリクスを集計するか
+            fetch_policy (FetchPolicy): タイムアウト・リトライ・サーキットブレーカー・ヘッジの設定
+                                        （省略時はヘッジ無しのデフォルト設定）
+            pool_maxsize (int): ホストごとに保持するキープアライブ接続数（省略時は同時リクエスト数の上限の最大値）
+            user_agent (str): リクエストのUser-Agent（sessionを省略した場合のみ使用）
+            connect_timeout (float): 接続のタイムアウト（秒。sessionを省略した場合のみ使用）
+            calendar (JPXCalendar): 取引カレンダー（日足が存在し得ない期間の取得を省略する。省略時はJPXの休日で作成）
         """
         self.data_dir = data_dir
         self._create_data_directory()
+        self.store = OHLCVStore(os.path.join(data_dir, "store"))
+        # キャッシュは取得済み期間のみを記録し、データはストレージに保存済みでない行のみを追記する
+        self.cache = OHLCVCache(os.path.join(data_dir, "cache"), self.store) if use_cache else None
+        
+        limits = dict(DEFAULT_SOURCE_LIMITS)
+        limits.update(source_limits or {})
+        self.source_limits = limits
+        self._source_slots = {
+            source: threading.BoundedSemaphore(limit) for source, limit in limits.items()
+        }
+        self._source_slots_lock = threading.Lock()
+        
+        self.policy = fetch_policy or FetchPolicy()
+        self.calendar = calendar or JPXCalendar()
+        
+        # 接続を再利用するため、すべてのデータソースへのリクエストで同じセッションを使う
+        self._owns_session = session is None
+        if session is None:
+            session = PooledSession(pool_maxsize=pool_maxsize or max(limits.values()),
+                                    timeout=(connect_timeout, self.policy.timeout),
+                                    user_agent=user_agent)
+        self.session = session
+        
+        if quote_mode not in ("lite", "full"):
+            raise ValueError(f"サポートされていない取得方法: {quote_mode}")
+        self.quote_mode = quote_mode
+        self.quote_cache = QuoteCache(ttl=quote_ttl, max_entries=quote_cache_size)
+        self.profile_cache = QuoteCache(ttl=profile_ttl, max_entries=quote_cache_size)
+        
+        self.metrics = FetchMetrics(enabled=metrics_enabled)
+        self.metrics.register_collector("quote_cache", self.quote_cache.stats)
+        self.metrics.register_collector("profile_cache", self.profile_cache.stats)
+        self.metrics.register_collector("fetch_policy", self.policy.stats)
+        if isinstance(self.session, PooledSession):
+            self.metrics.register_collector("http_pool", self.session.stats)
+        if metrics_enabled:
+            self.session.hooks.setdefault('response', []).append(self._record_response)
+        
+        # get_multiple_stocksで取得に失敗した銘柄とその理由
+        self.last_errors: Dict[str, str] = {}
+    
+    def _record_response(self, response: requests.Response, *args, **kwargs):
+        """HTTP応答までの時間と受信バイト数をメトリクスに記録"""
+        host = requests.utils.urlparse(response.url).hostname or ""
+        self.metrics.observe("http", response.elapsed.total_seconds(), host=host)
+        self.metrics.count("bytes_fetched", int(response.headers.get('Content-Length') or len(response.content)), host=host)
+        self.metrics.count("http_responses", host=host, status=response.status_code)
+    
+    def pool_utilization(self) -> Dict[str, Dict[str, float]]:
+        """
+        HTTP接続プールのホストごとの使用状況を取得
+        
+        Returns:
+            Dict[str, Dict[str, float]]: ホストをキーとしたリクエスト数・新規接続数・接続の再利用率・使用中の接続数など
+        """
+        if isinstance(self.session, PooledSession):
+            return self.session.utilization()
+        return pool_stats(self.session)
+    
+    def close(self):
+        """作成したセッションの接続を閉じる（引数で渡されたセッションは閉じない）"""
+        if self._owns_session:
+            self.session.close()
     
     def _create_data_directory(self):
         """データ保存ディレクトリを作成"""
@@ -47,41 +168,40 @@ class JapaneseStockDataFetcher:
             end_date (str): 終了日（YYYY-MM-DD形式）
             
         Returns:
-            pd.DataFrame: 株価データ
+            pd.DataFrame: 株価データ（共通形式、日付の古い順。新しい順の表示には ohlcv_schema.newest_first を使用）
         """
         try:
-            # デフォルト日付設定
-            if start_date is None:
-                start_date = '2022-01-01'
-            if end_date is None:
-                end_date = dt.date.today().strftime('%Y-%m-%d')
-            
-            # 銘柄コードの形式を調整
-            ticker_symbol_dr = f"{ticker_symbol}.JP"
-            
-            logger.info(f"Stooqからデータを取得中: {ticker_symbol} ({start_date} - {end_date})")
-            
-            # データ取得
-            df = web.DataReader(
-                ticker_symbol_dr, 
-                data_source='stooq', 
-                start=start_date, 
-                end=end_date
-            )
-            
-            # 銘柄コード列を追加
-            df.insert(0, "code", ticker_symbol, allow_duplicates=False)
-            
-            # 日付でソート（新しい順）
-            df = df.sort_index(ascending=False)
-            
-            logger.info(f"データ取得成功: {len(df)}件")
-            return df
-            
+            return self._load("stooq", ticker_symbol, start_date, end_date)
         except Exception as e:
             logger.error(f"Stooqからのデータ取得に失敗: {e}")
             return pd.DataFrame()
     
+    def _load_stooq(self, ticker_symbol: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """Stooqから指定期間（終了日を含む）の株価データを取得（失敗時は例外を送出）"""
+        # ストレージと同じ .T なしの銘柄コードでキャッシュする
+        code = ticker_symbol.replace('.T', '')
+        logger.info(f"Stooqからデータを取得中: {code} ({start} - {end})")
+        
+        with self.metrics.track("fetch", "stooq", code):
+            df = self._get_with_cache("stooq", code, start, end, self._fetch_stooq)
+            
+            # 空のデータも共通形式にする（すでに共通形式の場合はそのまま）
+            df = normalize(df, code)
+        
+        self.metrics.count("rows_fetched", len(df), source="stooq")
+        logger.info(f"データ取得成功: {len(df)}件")
+        return df
+    
+    def _fetch_stooq(self, ticker_symbol: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """Stooqから指定期間（終了日を含む）のデータを取得"""
+        with self.metrics.phase("provider", source="stooq"):
+            df = get_provider("stooq").history(ticker_symbol, start, end,
+                                               session=self.session, timeout=self.policy.timeout)
+        
+        # 共通形式（日付の古い順・float32の価格・int64の出来高・categoryの銘柄コード）に変換
+        with self.metrics.phase("build", source="stooq"):
+            return normalize(df, ticker_symbol)
+    
     def get_stock_data_yahoo(self, 
                             ticker_symbol: str, 
                             start_date: str = None, 
@@ -95,96 +215,743 @@ class JapaneseStockDataFetcher:
             end_date (str): 終了日（YYYY-MM-DD形式）
             
         Returns:
-            pd.DataFrame: 株価データ
+            pd.DataFrame: 株価データ（共通形式、日付の古い順。新しい順の表示には ohlcv_schema.newest_first を使用）
         """
         try:
-            # デフォルト日付設定
-            if start_date is None:
-                start_date = '2022-01-01'
-            if end_date is None:
-                end_date = dt.date.today().strftime('%Y-%m-%d')
-            
-            # 銘柄コードの形式を調整（.Tを追加）
-            if not ticker_symbol.endswith('.T'):
-                ticker_symbol_yahoo = f"{ticker_symbol}.T"
-            else:
-                ticker_symbol_yahoo = ticker_symbol
+            return self._load("yahoo", ticker_symbol, start_date, end_date)
+        except Exception as e:
+            logger.error(f"Yahoo Financeからのデータ取得に失敗: {e}")
+            return pd.DataFrame()
+    
+    def _load_yahoo(self, ticker_symbol: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """Yahoo Financeから指定期間（終了日を含む）の株価データを取得（失敗時は例外を送出）"""
+        code = ticker_symbol.replace('.T', '')
+        
+        logger.info(f"Yahoo Financeからデータを取得中: {code}.T ({start} - {end})")
+        
+        with self.metrics.track("fetch", "yahoo", code):
+            df = self._get_with_cache("yahoo", code, start, end, self._fetch_yahoo)
+            
+            # 空のデータも共通形式にする（すでに共通形式の場合はそのまま）
+            df = normalize(df, code)
+        
+        self.metrics.count("rows_fetched", len(df), source="yahoo")
+        logger.info(f"データ取得成功: {len(df)}件")
+        return df
+    
+    def _fetch_yahoo(self, code: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """Yahoo Financeから指定期間（終了日を含む）のデータを取得"""
+        with self.metrics.phase("provider", source="yahoo"):
+            df = get_provider("yahoo").history(code, start, end,
+                                               session=self.session, timeout=self.policy.timeout)
+        
+        # 共通形式に変換（タイムゾーンを外し、Dividends・Stock Splits列は除く）
+        with self.metrics.phase("build", source="yahoo"):
+            return normalize(df, code)
+    
+    def _get_with_cache(self,
+                        source: str,
+                        code: str,
+                        start: dt.date,
+                        end: dt.date,
+                        fetch: Callable[[str, dt.date, dt.date], pd.DataFrame]) -> pd.DataFrame:
+        """
+        キャッシュを参照し、不足している期間のみ取得して返す
+        
+        取得したデータはストレージに保存済みでない行のみを追記し、指定期間をストレージから読み込んで返す。
+        不足している期間はキャッシュ済みの最初・最後の日足と重ねて取得し、その価格が変わっている場合
+        （分割・配当による調整後の価格の変化）は指定期間をすべて取得し直して保存済みの行を置き換える。
+        
+        Args:
+            source (str): データソース
+            code (str): 銘柄コード
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
+            fetch (Callable): 指定期間のデータを取得する関数
             
-            logger.info(f"Yahoo Financeからデータを取得中: {ticker_symbol_yahoo} ({start_date} - {end_date})")
+        Returns:
+            pd.DataFrame: 指定期間のデータ（日付の古い順）
+        """
+        if self.cache is None:
+            window = self._fetch_window(source, code, start, end)
+            if window is None:
+                return empty_frame(code)
+            return _slice_dates(self._call_source(source, fetch, code, *window), start, end)
+        
+        with self.cache.lock(source, code):
+            if self.cache.is_invalidated(source, code):
+                self.metrics.count("ohlcv_cache_misses", source=source)
+                return self._refetch_invalidated(source, code, start, end, fetch)
             
-            # データ取得
-            ticker = yf.Ticker(ticker_symbol_yahoo)
-            df = ticker.history(start=start_date, end=end_date)
+            missing = self.cache.missing_ranges(source, code, start, end)
+            self.metrics.count("ohlcv_cache_misses" if missing else "ohlcv_cache_hits", source=source)
+            edges = self.cache.edges(source, code) if missing else pd.DataFrame()
             
-            # 列名を統一
-            df.columns = [col.title() for col in df.columns]
+            for fetch_start, fetch_end in missing:
+                window = self._overlapping_window(source, code, edges, fetch_start, fetch_end)
+                if window is None:
+                    # 取引日の無い期間も取得済みとして記録し、次回は判定も省略する
+                    fetched = empty_frame(code)
+                else:
+                    logger.info(f"キャッシュに無い期間を取得: {source}/{code} ({window[0]} - {window[1]})")
+                    fetched = self._call_source(source, fetch, code, *window)
+                if prices_differ(edges, fetched):
+                    return self._refetch_invalidated(source, code, start, end, fetch)
+                with self.metrics.phase("cache_merge", source=source):
+                    self._merge_fetched(source, code, fetched, fetch_start, fetch_end)
             
-            # 銘柄コード列を追加
-            df.insert(0, "code", ticker_symbol.replace('.T', ''), allow_duplicates=False)
+            with self.metrics.phase("cache_load", source=source):
+                return self.cache.load(source, code, start, end)
+    
+    def _overlapping_window(self,
+                            source: str,
+                            code: str,
+                            edges: pd.DataFrame,
+                            start: dt.date,
+                            end: dt.date) -> Optional[Tuple[dt.date, dt.date]]:
+        """
+        キャッシュに無い期間の取得範囲を、隣接するキャッシュ済みの最初・最後の日足まで広げる
+        （取得が必要な取引日が無い場合はNone）
+        """
+        window = self._fetch_window(source, code, start, end)
+        if window is None or edges.empty:
+            return window
+        first, last = edges.index[0].date(), edges.index[-1].date()
+        if window[0] > last:
+            return last, window[1]
+        if window[1] < first:
+            return window[0], first
+        return window
+    
+    def _refetch_invalidated(self,
+                             source: str,
+                             code: str,
+                             start: dt.date,
+                             end: dt.date,
+                             fetch: Callable[[str, dt.date, dt.date], pd.DataFrame]) -> pd.DataFrame:
+        """
+        調整後の価格が変わった銘柄・破棄した銘柄を取得し直し、保存済みの行を置き換える
+        （呼び出し側で銘柄のロックを取得すること）
+        
+        保存済みの行はすべて調整前の価格のため、指定期間に保存済みの期間も加えて取得し直し、
+        調整前と調整後の価格が混在しないようにする。
+        """
+        logger.warning(f"キャッシュ済みの価格が変わったか破棄されたため、取得し直して保存済みの行を置き換えます: {source}/{code}")
+        self.metrics.count("ohlcv_cache_invalidations", source=source)
+        stored = self.store.date_range(source, code)
+        refetch_start, refetch_end = start, end
+        if stored is not None:
+            refetch_start, refetch_end = min(start, stored[0].date()), max(end, stored[1].date())
+        window = self._fetch_window(source, code, refetch_start, refetch_end)
+        fetched = empty_frame(code) if window is None else self._call_source(source, fetch, code, *window)
+        with self.metrics.phase("cache_merge", source=source):
+            self.cache.replace(source, code, fetched, refetch_start,
+                               self._cover_end(fetched, refetch_start, refetch_end))
+        with self.metrics.phase("cache_load", source=source):
+            return self.cache.load(source, code, start, end)
+    
+    def refresh(self,
+                ticker_symbol: str,
+                start_date: str = None,
+                end_date: str = None,
+                source: str = "stooq") -> pd.DataFrame:
+        """
+        キャッシュ済みのデータを破棄して株価データを取得し直す
+        
+        分割・配当で調整後の価格が変わった銘柄を明示的に取得し直す場合に使用する
+        （キャッシュを使う取得でも、キャッシュ済みの最初・最後の日足の価格が変わっていれば自動的に取得し直す）。
+        
+        Args:
+            ticker_symbol (str): 銘柄コード
+            start_date (str): 開始日（YYYY-MM-DD形式）
+            end_date (str): 終了日（YYYY-MM-DD形式）
+            source (str): データソース（stooq または yahoo）
             
-            # 日付でソート（新しい順）
-            df = df.sort_index(ascending=False)
+        Returns:
+            pd.DataFrame: 株価データ（共通形式、日付の古い順）
+        """
+        self.invalidate_cache(ticker_symbol, source)
+        return self._load(source, ticker_symbol, start_date, end_date)
+    
+    def invalidate_cache(self, ticker_symbol: Optional[str] = None, source: Optional[str] = None):
+        """
+        キャッシュ済みの株価データを破棄（次回の取得で指定期間をすべて取得し直す）
+        
+        ストレージに保存済みの行はすぐには削除せず、次回の取得で取得し直したデータに置き換える。
+        
+        Args:
+            ticker_symbol (str): 銘柄コード（省略時はすべて）
+            source (str): データソース（省略時はすべて）
+        """
+        if self.cache is None:
+            return
+        if ticker_symbol is None:
+            self.cache.clear(source)
+            return
+        # どのデータソースも .T なしの銘柄コードでキャッシュしている
+        code = ticker_symbol.replace('.T', '')
+        for src in [source] if source else available_providers():
+            with self.cache.lock(src, code):
+                self.cache.clear(src, code)
+    
+    def _fetch_window(self, source: str, code: str, start: dt.date, end: dt.date) -> Optional[Tuple[dt.date, dt.date]]:
+        """取引カレンダーで期間を日足が存在し得る範囲に絞る（休日のみ・大引け前の当日のみの場合はNone）"""
+        window = self.calendar.fetch_window(start, end)
+        if window is None:
+            logger.debug(f"日足が存在し得ない期間のため取得を省略: {source}/{code} ({start} - {end})")
+            self.metrics.count("fetches_skipped", source=source)
+        return window
+    
+    def _call_source(self,
+                     source: str,
+                     fetch: Callable[[str, dt.date, dt.date], pd.DataFrame],
+                     code: str,
+                     start: dt.date,
+                     end: dt.date) -> pd.DataFrame:
+        """取得ポリシー（サーキットブレーカー・リトライ）を適用して取得（再試行の待機中は同時リクエスト数の枠を使わない）"""
+        def attempt() -> pd.DataFrame:
+            with self._source_slot(source):
+                return fetch(code, start, end)
+        return self.policy.call(source, attempt)
+    
+    def _source_slot(self, source: str) -> threading.BoundedSemaphore:
+        """データソースの同時リクエスト数の枠（register_providerで追加したデータソースは初回に作成する）"""
+        slot = self._source_slots.get(source)
+        if slot is None:
+            with self._source_slots_lock:
+                slot = self._source_slots.get(source)
+                if slot is None:
+                    slot = threading.BoundedSemaphore(self.source_limits.get(source, DEFAULT_PROVIDER_LIMIT))
+                    self._source_slots[source] = slot
+        return slot
+    
+    def _loader(self, source: str) -> Callable[..., pd.DataFrame]:
+        """
+        データソースの取得関数（銘柄コード, 開始日, 終了日（この日を含む）を受け取る）
+        
+        専用の _load_{source} があるデータソース（stooq, yahoo）はそれを使い、
+        register_providerで追加したデータソースはプロバイダーのhistoryを呼び出す共通の取得関数を使う。
+        """
+        loader = getattr(self, f"_load_{source}", None)
+        if loader is not None:
+            return loader
+        if source not in available_providers():
+            raise ValueError(f"サポートされていないデータソース: {source}")
+        return lambda ticker_symbol, start, end: self._load_provider(source, ticker_symbol, start, end)
+    
+    def _load_provider(self, source: str, ticker_symbol: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """register_providerで追加したデータソースから指定期間（終了日を含む）の株価データを取得（失敗時は例外を送出）"""
+        code = ticker_symbol.replace('.T', '')
+        logger.info(f"{source}からデータを取得中: {code} ({start} - {end})")
+        
+        with self.metrics.track("fetch", source, code):
+            df = self._get_with_cache(source, code, start, end,
+                                      lambda code, start, end: self._fetch_provider(source, code, start, end))
+            df = normalize(df, code)
+        
+        self.metrics.count("rows_fetched", len(df), source=source)
+        logger.info(f"データ取得成功: {len(df)}件")
+        return df
+    
+    def _fetch_provider(self, source: str, code: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """登録されたプロバイダーから指定期間（終了日を含む）のデータを取得"""
+        with self.metrics.phase("provider", source=source):
+            df = get_provider(source).history(code, start, end, session=self.session, timeout=self.policy.timeout)
+        with self.metrics.phase("build", source=source):
+            return normalize(df, code)
+    
+    def _request_window(self, source: str, start_date: str = None, end_date: str = None) -> Tuple[dt.date, dt.date]:
+        """
+        呼び出し側の期間を、取得処理で共通に使う期間（終了日を含むdt.date）に変換
+        
+        Yahoo Financeの終了日は当日を含まない（yfinanceと同じ扱い）ため前日までとし、
+        Stooq・register_providerで追加したデータソースの終了日はそのまま含める。
+        """
+        start = to_date(start_date) if start_date is not None else dt.date(2022, 1, 1)
+        end = to_date(end_date) if end_date is not None else dt.date.today()
+        if source == "yahoo":
+            end -= dt.timedelta(days=1)
+        return start, end
+    
+    def _load(self, source: str, ticker_symbol: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+        """
+        データソースを指定して株価データを取得（失敗時は例外を送出）
+        
+        終了日はここでデータソースごとの扱いから終了日を含む日付に1回だけ変換し、ヘッジの有無によらず同じ期間を返す。
+        取得ポリシーでヘッジが有効な場合、一定時間内に応答が無いか失敗したときは別のデータソースにも問い合わせ、
+        先に取得できた方を共通の列・日付形式に揃えて返す（取得元はdf.attrs["source"]に入る）。
+        """
+        loader = self._loader(source)
+        start, end = self._request_window(source, start_date, end_date)
+        if not self.policy.hedge:
+            return loader(ticker_symbol, start, end)
+        return self._load_hedged(source, ticker_symbol, start, end)
+    
+    def _load_hedged(self, source: str, ticker_symbol: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """最初のデータソースの応答が遅い場合・失敗した場合に別のデータソースからも取得し、先に取得できた方を返す"""
+        alternate = "yahoo" if source == "stooq" else "stooq"
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            futures = {executor.submit(self._load_from, source, ticker_symbol, start, end): source}
+            done, _ = wait(futures, timeout=self.policy.hedge_delay(source))
+            primary_failed = bool(done) and next(iter(done)).exception() is not None
+            if not done or primary_failed:
+                if self.policy.breaker(alternate).state == "open":
+                    logger.info(f"{alternate} は一時停止中のためヘッジしません")
+                else:
+                    logger.info(f"{source} の応答が{'失敗' if primary_failed else '遅い'}ため {alternate} からも取得します: {ticker_symbol}")
+                    self.metrics.count("hedges", source=source, reason="failure" if primary_failed else "slow")
+                    # 別のデータソースには .T なしの銘柄コードで、同じ期間（終了日を含む）を問い合わせる
+                    futures[executor.submit(self._load_from, alternate, ticker_symbol.replace('.T', ''),
+                                            start, end)] = alternate
             
-            logger.info(f"データ取得成功: {len(df)}件")
-            return df
+            # 先に取得できた方を返す（データが空の場合はもう一方の結果を待つ）
+            fallback, error = None, None
+            for future in as_completed(futures):
+                try:
+                    df = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if df.empty:
+                    fallback = df
+                    continue
+                if futures[future] != source:
+                    self.metrics.count("hedge_wins", source=futures[future])
+                return df
+            if fallback is not None:
+                return fallback
+            raise error
+        finally:
+            # 遅れている方の取得は待たない（完了すればキャッシュに反映される）
+            executor.shutdown(wait=False)
+    
+    def _load_from(self, source: str, ticker_symbol: str, start: dt.date, end: dt.date) -> pd.DataFrame:
+        """データソースから指定期間（終了日を含む）を取得し、取得元をdf.attrs["source"]に記録する"""
+        # 取得時に共通形式（列・型・タイムゾーン無しの日付）に変換済み
+        df = self._loader(source)(ticker_symbol, start, end)
+        df.attrs["source"] = source
+        return df
+    
+    def _cover_end(self, fetched: pd.DataFrame, fetch_start: dt.date, fetch_end: dt.date) -> dt.date:
+        """
+        取得済み期間として記録する終了日
+        
+        日足が公開済みの最新の取引日までを記録する（その日の日足がまだデータソースに反映されていない場合は、次回に再取得する）。
+        """
+        latest = self.calendar.latest_session()
+        if fetch_end >= latest and (fetched.empty or fetched.index[-1].date() < latest):
+            return latest - dt.timedelta(days=1)
+        return min(fetch_end, latest)
+    
+    def _merge_fetched(self,
+                       source: str,
+                       code: str,
+                       fetched: pd.DataFrame,
+                       fetch_start: dt.date,
+                       fetch_end: dt.date) -> int:
+        """取得したデータの保存済みでない行をストレージに追記し、取得済み期間を記録（呼び出し側で銘柄のロックを取得すること）"""
+        cover_end = self._cover_end(fetched, fetch_start, fetch_end)
+        if fetch_start <= cover_end:
+            return self.cache.merge(source, code, fetched, fetch_start, cover_end)
+        return self.cache.merge(source, code, fetched)
+    
+    def _fetch_yahoo_batch(self, codes: List[str], start: dt.date, end: dt.date) -> Dict[str, pd.DataFrame]:
+        """
+        Yahoo Financeから複数銘柄の指定期間（終了日を含む）のデータを1回のリクエストで取得
+        
+        Args:
+            codes (List[str]): 銘柄コードのリスト（.Tなし）
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
             
-        except Exception as e:
-            logger.error(f"Yahoo Financeからのデータ取得に失敗: {e}")
-            return pd.DataFrame()
+        Returns:
+            Dict[str, pd.DataFrame]: 銘柄コードをキーとしたデータ辞書（取得できなかった銘柄は含まない）
+        """
+        symbols = [f"{code}.T" for code in codes]
+        
+        def download():
+            with self._source_slot("yahoo"), self.metrics.phase("provider_batch", source="yahoo"):
+                return get_provider("yahoo").download(codes, start, end,
+                                                      session=self.session, timeout=self.policy.timeout)
+        
+        raw, failed = self.policy.call("yahoo", download)
+        
+        frames = {}
+        for code, symbol in zip(codes, symbols):
+            if symbol in failed:
+                logger.warning(f"{symbol} の取得に失敗しました: {failed[symbol]}")
+                continue
+            if isinstance(raw.columns, pd.MultiIndex):
+                if symbol not in raw.columns.get_level_values(0):
+                    continue
+                df = raw[symbol].copy()
+            else:
+                df = raw.copy()
+            
+            # 他の銘柄にだけ存在する日付の行を除く
+            prices = [col for col in df.columns if col.title() in ('Open', 'High', 'Low', 'Close')]
+            df = df.dropna(how='all', subset=prices)
+            
+            frames[code] = normalize(df, code)
+        return frames
     
-    def get_realtime_price(self, ticker_symbol: str) -> Dict:
+    def _load_yahoo_batched(self,
+                            ticker_symbols: List[str],
+                            start_date: str = None,
+                            end_date: str = None,
+                            batch_size: int = 50) -> Dict[str, object]:
+        """
+        Yahoo Financeから複数銘柄をまとめて取得
+        
+        キャッシュに無い期間が同じ銘柄同士を最大batch_size銘柄ずつ1回のリクエストで取得し、
+        銘柄ごとのデータに分割する。
+        
+        Args:
+            ticker_symbols (List[str]): 銘柄コードのリスト
+            start_date (str): 開始日
+            end_date (str): 終了日
+            batch_size (int): 1回のリクエストで取得する銘柄数
+            
+        Returns:
+            Dict[str, object]: 銘柄コードをキーとした、データ（日付の古い順）または例外の辞書
+        """
+        # Yahoo Financeの終了日は当日を含まない
+        start, end = self._request_window("yahoo", start_date, end_date)
+        
+        codes = {symbol: symbol.replace('.T', '') for symbol in ticker_symbols}
+        # キャッシュを使わない場合に取得したデータ・キャッシュ済みの最初・最後の日足
+        current: Dict[str, pd.DataFrame] = {}
+        edges: Dict[str, pd.DataFrame] = {}
+        invalidated = set()
+        
+        # 取得が必要な期間（キャッシュ済みの最初・最後の日足と重ねた取得範囲）ごとに銘柄をまとめる
+        plan: Dict[tuple, List[str]] = {}
+        for code in codes.values():
+            if self.cache is None:
+                missing = [(start, end)]
+                current[code] = empty_frame(code)
+                edges[code] = pd.DataFrame()
+            elif self.cache.is_invalidated("yahoo", code):
+                invalidated.add(code)
+                continue
+            else:
+                missing = self.cache.missing_ranges("yahoo", code, start, end)
+                edges[code] = self.cache.edges("yahoo", code) if missing else pd.DataFrame()
+            for fetch_start, fetch_end in missing:
+                window = self._overlapping_window("yahoo", code, edges[code], fetch_start, fetch_end)
+                if window is not None:
+                    plan.setdefault((fetch_start, fetch_end, window), []).append(code)
+        
+        batches = []
+        for (fetch_start, fetch_end, window), group in plan.items():
+            for i in range(0, len(group), batch_size):
+                batches.append((group[i:i + batch_size], fetch_start, fetch_end, window))
+        
+        errors: Dict[str, Exception] = {}
+        
+        for batch_codes, fetch_start, fetch_end, window in batches:
+            logger.info(f"Yahoo Financeから{len(batch_codes)}銘柄をまとめて取得中 ({window[0]} - {window[1]})")
+            try:
+                frames = self._fetch_yahoo_batch(batch_codes, *window)
+            except Exception as e:
+                for code in batch_codes:
+                    errors[code] = e
+                continue
+            
+            for code in batch_codes:
+                if code in invalidated:
+                    continue
+                if code not in frames:
+                    errors[code] = ValueError(f"{code}.T のデータを取得できませんでした")
+                elif prices_differ(edges[code], frames[code]):
+                    # 調整後の価格が変わったため、後で指定期間をすべて取得し直す
+                    invalidated.add(code)
+                elif self.cache is None:
+                    current[code] = normalize(pd.concat([current[code], frames[code]]), code)
+                else:
+                    with self.cache.lock("yahoo", code):
+                        self._merge_fetched("yahoo", code, frames[code], fetch_start, fetch_end)
+        
+        for code in invalidated:
+            errors.pop(code, None)
+            try:
+                with self.cache.lock("yahoo", code):
+                    current[code] = self._refetch_invalidated("yahoo", code, start, end, self._fetch_yahoo)
+            except Exception as e:
+                errors[code] = e
+        
+        results: Dict[str, object] = {}
+        for symbol, code in codes.items():
+            if code in errors:
+                results[symbol] = errors[code]
+            elif code in current:
+                results[symbol] = normalize(_slice_dates(current[code], start, end), code)
+            else:
+                # キャッシュを使う場合は、追記した後のストレージから指定期間を読み込む
+                results[symbol] = normalize(self.cache.load("yahoo", code, start, end), code)
+        return results
+    
+    def get_realtime_price(self, ticker_symbol: str, use_cache: bool = True) -> Dict:
         """
         リアルタイム株価を取得
         
         Args:
             ticker_symbol (str): 銘柄コード
+            use_cache (bool): 有効期限内のキャッシュを使うか（Falseの場合は必ず取得し直す）
             
         Returns:
             Dict: リアルタイム株価情報
         """
         try:
-            # Yahoo Financeからリアルタイムデータを取得
-            if not ticker_symbol.endswith('.T'):
-                ticker_symbol_yahoo = f"{ticker_symbol}.T"
-            else:
-                ticker_symbol_yahoo = ticker_symbol
-            
-            ticker = yf.Ticker(ticker_symbol_yahoo)
-            info = ticker.info
-            
-            # 基本情報を取得
-            realtime_data = {
-                'code': ticker_symbol.replace('.T', ''),
-                'name': info.get('longName', 'N/A'),
-                'current_price': info.get('currentPrice', 0),
-                'previous_close': info.get('previousClose', 0),
-                'open': info.get('open', 0),
-                'day_high': info.get('dayHigh', 0),
-                'day_low': info.get('dayLow', 0),
-                'volume': info.get('volume', 0),
-                'market_cap': info.get('marketCap', 0),
-                'pe_ratio': info.get('trailingPE', 0),
-                'dividend_yield': info.get('dividendYield', 0),
-                'timestamp': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            
-            # 価格変化を計算
-            if realtime_data['current_price'] and realtime_data['previous_close']:
-                change = realtime_data['current_price'] - realtime_data['previous_close']
-                change_percent = (change / realtime_data['previous_close']) * 100
-                realtime_data['change'] = change
-                realtime_data['change_percent'] = change_percent
+            code = ticker_symbol.replace('.T', '')
+            with self.metrics.track("quote", "yahoo", code):
+                if use_cache:
+                    realtime_data = self.quote_cache.get(code, lambda: self._fetch_realtime_price(code))
+                else:
+                    realtime_data = self._fetch_realtime_price(code)
             
             logger.info(f"リアルタイムデータ取得成功: {ticker_symbol}")
-            return realtime_data
+            # 呼び出し側での変更がキャッシュに影響しないようコピーを返す
+            return dict(realtime_data)
             
         except Exception as e:
             logger.error(f"リアルタイムデータ取得に失敗: {e}")
             return {}
     
+    def _fetch_realtime_price(self, code: str) -> Dict:
+        """リアルタイム株価を取得（quote_modeに応じて取得方法を切り替え、失敗時は例外を送出）"""
+        if self.quote_mode == "lite":
+            return self._fetch_realtime_price_lite(code)
+        
+        ticker = get_provider("yahoo").ticker(code, self.session)
+        info = ticker.info
+        
+        return self._build_realtime_data(code, {
+            'current_price': info.get('currentPrice', 0),
+            'previous_close': info.get('previousClose', 0),
+            'open': info.get('open', 0),
+            'day_high': info.get('dayHigh', 0),
+            'day_low': info.get('dayLow', 0),
+            'volume': info.get('volume', 0),
+        }, self._profile_from_info(info))
+    
+    def _fetch_realtime_price_lite(self, code: str) -> Dict:
+        """
+        直近数日の日足（チャートAPI 1回）から価格・前日終値・日中の値幅・出来高のみ取得する
+        
+        会社名・時価総額・PER・配当利回りはticker.infoから別途取得し、profile_ttl秒間キャッシュする。
+        """
+        ticker = get_provider("yahoo").ticker(code, self.session)
+        bars = ticker.history(period="5d", interval="1d", auto_adjust=False)
+        if bars.empty:
+            raise ValueError(f"{code}.T の株価データがありません")
+        
+        # history()取得時のメタ情報を使うため追加のリクエストは発生しない
+        meta = ticker.get_history_metadata() or {}
+        latest = bars.iloc[-1]
+        if len(bars) > 1:
+            previous_close = float(bars['Close'].iloc[-2])
+        else:
+            previous_close = meta.get('chartPreviousClose', 0)
+        
+        quote = {
+            'current_price': meta.get('regularMarketPrice') or float(latest['Close']),
+            'previous_close': previous_close,
+            'open': float(latest['Open']),
+            'day_high': float(latest['High']),
+            'day_low': float(latest['Low']),
+            'volume': int(latest['Volume']),
+        }
+        
+        try:
+            profile = self.profile_cache.get(code, lambda: self._profile_from_info(
+                get_provider("yahoo").ticker(code, self.session).info))
+        except Exception as e:
+            logger.warning(f"会社情報の取得に失敗: {code} ({e})")
+            profile = self._profile_from_info({})
+        
+        return self._build_realtime_data(code, quote, profile)
+    
+    @staticmethod
+    def _profile_from_info(info: Dict) -> Dict:
+        """ticker.infoから変化の少ない項目（会社名・時価総額・PER・配当利回り）を取り出す"""
+        return {
+            'name': info.get('longName', 'N/A'),
+            'market_cap': info.get('marketCap', 0),
+            'pe_ratio': info.get('trailingPE', 0),
+            'dividend_yield': info.get('dividendYield', 0),
+        }
+    
+    @staticmethod
+    def _build_realtime_data(code: str, quote: Dict, profile: Dict) -> Dict:
+        """価格情報と会社情報からリアルタイム株価情報を組み立てる"""
+        # 基本情報を取得
+        realtime_data = {
+            'code': code,
+            'name': profile['name'],
+            'current_price': quote['current_price'],
+            'previous_close': quote['previous_close'],
+            'open': quote['open'],
+            'day_high': quote['day_high'],
+            'day_low': quote['day_low'],
+            'volume': quote['volume'],
+            'market_cap': profile['market_cap'],
+            'pe_ratio': profile['pe_ratio'],
+            'dividend_yield': profile['dividend_yield'],
+            'timestamp': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        # 価格変化を計算
+        if realtime_data['current_price'] and realtime_data['previous_close']:
+            change = realtime_data['current_price'] - realtime_data['previous_close']
+            change_percent = (change / realtime_data['previous_close']) * 100
+            realtime_data['change'] = change
+            realtime_data['change_percent'] = change_percent
+        
+        return realtime_data
+    
+    def save(self, df: pd.DataFrame, ticker_symbol: str, source: str = "stooq") -> int:
+        """
+        データを列指向ストレージ（データソース/銘柄コード/年 で分割したParquet）に追記
+        
+        保存済みでない日付の行（保存済みの期間より前の行を含む）のみを書き込むため、同じ期間を繰り返し保存しても書き込み量は増えない。
+        保存済みの最終日（dfに含まれない場合は最初の日）の価格がdfと異なる場合は、分割・配当で調整後の価格が変わったため、
+        追記せずに銘柄の保存済みの行をすべてdfで置き換える（dfの期間外の保存済みの行は調整前の価格のため残さない）。
+        
+        Args:
+            df (pd.DataFrame): 保存するデータ
+            ticker_symbol (str): 銘柄コード
+            source (str): データソース（stooq または yahoo）
+            
+        Returns:
+            int: 書き込んだ行数
+        """
+        if df.empty:
+            logger.warning("保存するデータがありません")
+            return 0
+        
+        code = ticker_symbol.replace('.T', '')
+        with self.metrics.phase("save_store", source=source):
+            if self._stored_prices_differ(df, source, code):
+                logger.warning(f"保存済みの価格が変わったため、保存済みの行を置き換えます: {source}/{code}")
+                self.metrics.count("store_rewrites", source=source)
+                rows = self.store.replace(df, source, code)
+                if self.cache is not None:
+                    # キャッシュの取得済み期間には置き換えで削除した期間も含まれるため、次回の取得で取得し直す
+                    with self.cache.lock(source, code):
+                        self.cache.clear(source, code)
+            else:
+                rows = self.store.append_new(df, source, code)
+        self.metrics.count("rows_saved", rows, source=source)
+        self.metrics.count("rows_skipped", len(df) - rows, source=source)
+        return rows
+    
+    def _stored_prices_differ(self, df: pd.DataFrame, source: str, code: str) -> bool:
+        """保存済みの最終日（dfに含まれない場合は最初の日）の価格がdfと異なるか（保存済みの最終日の行はメモリ上に保持している）"""
+        stored = self.store.last_row(source, code)
+        if stored.empty:
+            return False
+        df = conform(df)
+        if stored.index[-1] not in df.index:
+            stored = self.store.first_row(source, code)
+        return prices_differ(stored, df)
+    
+    def load_stock_data(self,
+                        codes,
+                        start_date: str = None,
+                        end_date: str = None,
+                        columns: Optional[List[str]] = None,
+                        source: str = "stooq",
+                        layout: str = "long") -> pd.DataFrame:
+        """
+        ストレージに保存済みの株価データを読み込む（ネットワークにはアクセスしない）
+        
+        Args:
+            codes (str または List[str]): 銘柄コードまたはそのリスト
+            start_date (str): 開始日（YYYY-MM-DD形式、省略時は最初から）
+            end_date (str): 終了日（YYYY-MM-DD形式、この日を含む。省略時は最後まで）
+            columns (List[str]): 読み込む列（例: ["Close", "Volume"]、省略時はすべて）
+            source (str): データソース（stooq または yahoo）
+            layout (str): "long"は銘柄を縦に連結（code列付き）、
+                          "wide"は日付×銘柄のパネル（列は(列名, 銘柄コード)、1列のみ指定時は銘柄コード）
+            
+        Returns:
+            pd.DataFrame: 株価データ（日付の古い順）。保存済みデータが無い場合は空のDataFrame
+        """
+        if isinstance(codes, str):
+            codes = [codes]
+        codes = [code.replace('.T', '') for code in codes]
+        if layout not in ("long", "wide"):
+            raise ValueError(f"サポートされていない形式: {layout}")
+        
+        # code列は保存データに含まれているが、銘柄の区別に使うため読み込み時に付け直す
+        read_columns = [col for col in columns if col != "code"] if columns else None
+        
+        def read(code: str) -> pd.DataFrame:
+            df = self.store.read(source, code, start_date, end_date, read_columns)
+            if df.empty:
+                return df
+            if "code" in df.columns:
+                df = df.drop(columns="code")
+            df.insert(0, "code", pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[code]))
+            return df
+        
+        # Parquetの読み込みはGILを解放するため、複数銘柄はスレッドで並列に読み込む
+        with ThreadPoolExecutor(max_workers=min(8, max(1, len(codes)))) as executor:
+            frames = [df for df in executor.map(read, codes) if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        
+        # code列は読み込んだ銘柄をカテゴリとするcategory型のまま連結する
+        long_df = concat_frames(frames, codes)
+        if layout == "long":
+            return long_df
+        
+        values = [col for col in long_df.columns if col != "code"]
+        wide_df = long_df.pivot(columns="code", values=values)
+        if len(values) == 1:
+            wide_df = wide_df[values[0]]
+        # 日付の軸は取引カレンダーの取引日に揃える（全銘柄にデータの無い取引日も行として残す）
+        return wide_df.reindex(self.calendar.sessions(wide_df.index.min(), wide_df.index.max()))
+    
+    def build_panel(self,
+                    path: str,
+                    codes: List[str],
+                    start_date: str = None,
+                    end_date: str = None,
+                    source: str = "stooq",
+                    fields: List[str] = DEFAULT_FIELDS,
+                    dtype: str = "float64") -> OHLCVPanel:
+        """
+        保存済みデータからメモリマップの株価パネル（日付 × 銘柄 × 列）を作成
+        
+        Args:
+            path (str): パネルのディレクトリ
+            codes (List[str]): 銘柄コードのリスト
+            start_date (str): 開始日（省略時は最初から）
+            end_date (str): 終了日（省略時は最後まで）
+            source (str): データソース
+            fields (List[str]): パネルに含める列
+            dtype (str): 値の型（float32は出来高を含まない場合のみ推奨）
+            
+        Returns:
+            OHLCVPanel: 作成したパネル
+        """
+        frames = {
+            code.replace('.T', ''): self.store.read(source, code.replace('.T', ''), start_date, end_date, list(fields))
+            for code in codes
+        }
+        # 日付の軸は取引カレンダーの取引日（データのある最初の日から最後の日まで）
+        loaded = [df for df in frames.values() if not df.empty]
+        dates = None
+        if loaded:
+            dates = self.calendar.sessions(min(df.index[0] for df in loaded), max(df.index[-1] for df in loaded))
+        return OHLCVPanel.build(path, frames, fields=fields, dates=dates, dtype=dtype)
+    
     def save_to_csv(self, df: pd.DataFrame, ticker_symbol: str, source: str = "stooq"):
         """
-        データをCSVファイルに保存
+        データをCSVファイルにエクスポート（保存にはsaveを使用）
         
         Args:
             df (pd.DataFrame): 保存するデータ
@@ -198,43 +965,172 @@ class JapaneseStockDataFetcher:
         filename = f"{source}_stock_data_{ticker_symbol}_{dt.date.today()}.csv"
         filepath = os.path.join(self.data_dir, filename)
         
-        df.to_csv(filepath, encoding='utf-8-sig')
+        with self.metrics.phase("save_csv", source=source):
+            df.to_csv(filepath, encoding='utf-8-sig')
+        if self.metrics.enabled:
+            self.metrics.count("bytes_written", os.path.getsize(filepath), source=source)
         logger.info(f"データを保存しました: {filepath}")
     
     def get_multiple_stocks(self, 
                            ticker_symbols: List[str], 
                            start_date: str = None, 
                            end_date: str = None,
-                           source: str = "stooq") -> Dict[str, pd.DataFrame]:
+                           source: str = "stooq",
+                           max_workers: int = 1,
+                           batch_size: Optional[int] = None,
+                           on_result: Optional[Callable[[str, Optional[pd.DataFrame], Optional[str]], None]] = None) -> Dict[str, pd.DataFrame]:
         """
         複数銘柄のデータを一括取得
         
+        すべての銘柄のデータを保持して返すため、銘柄数が多い場合はiter_stocksを使用すること。
+        
         Args:
             ticker_symbols (List[str]): 銘柄コードのリスト
             start_date (str): 開始日
             end_date (str): 終了日
             source (str): データソース
+            max_workers (int): 同時に処理する銘柄数（1の場合は順番に取得）
+            batch_size (int): Yahoo Financeから1回のリクエストでまとめて取得する銘柄数
+                              （source="yahoo"のときのみ有効。指定した場合max_workersは使用しない）
+            on_result (Callable): 銘柄ごとの処理が終わるたびに 銘柄コード, データ（失敗時はNone）, 失敗理由（成功時はNone）
+                                  を渡して呼び出す関数（呼び出し元のスレッドで実行される）
             
         Returns:
-            Dict[str, pd.DataFrame]: 銘柄コードをキーとしたデータ辞書
+            Dict[str, pd.DataFrame]: 銘柄コードをキーとしたデータ辞書（取得が完了した順）
+        """
+        results = dict(self.iter_stocks(ticker_symbols, start_date, end_date, source=source,
+                                        max_workers=max_workers, batch_size=batch_size, on_result=on_result))
+        logger.info(f"一括取得完了: 成功 {len(results)}件, 失敗 {len(self.last_errors)}件")
+        return results
+    
+    def iter_stocks(self,
+                    ticker_symbols: Iterable[str],
+                    start_date: str = None,
+                    end_date: str = None,
+                    source: str = "stooq",
+                    max_workers: int = 1,
+                    batch_size: Optional[int] = None,
+                    max_pending: Optional[int] = None,
+                    save: bool = True,
+                    on_result: Optional[Callable[[str, Optional[pd.DataFrame], Optional[str]], None]] = None
+                    ) -> Iterator[Tuple[str, pd.DataFrame]]:
         """
-        results = {}
+        複数銘柄のデータを取得が完了した順に1銘柄ずつ返すジェネレーター
         
-        for symbol in ticker_symbols:
-            logger.info(f"銘柄 {symbol} のデータを取得中...")
-            
-            if source.lower() == "stooq":
-                data = self.get_stock_data_stooq(symbol, start_date, end_date)
-            elif source.lower() == "yahoo":
-                data = self.get_stock_data_yahoo(symbol, start_date, end_date)
-            else:
-                logger.error(f"サポートされていないデータソース: {source}")
-                continue
+        取得中・受け取り待ちの銘柄数をmax_pendingまでに制限するため、呼び出し側の処理が遅い場合は
+        新しい取得を始めずに待つ。銘柄数が増えても同時に保持するデータはmax_pending銘柄分までになる。
+        取得に失敗した銘柄は返さず、last_errorsに記録する。
+        
+        Args:
+            ticker_symbols (Iterable[str]): 銘柄コード（必要になった時点で順に読み出す）
+            start_date (str): 開始日
+            end_date (str): 終了日
+            source (str): データソース
+            max_workers (int): 同時に処理する銘柄数（1の場合は順番に取得）
+            batch_size (int): Yahoo Financeから1回のリクエストでまとめて取得する銘柄数
+                              （source="yahoo"のときのみ有効。指定した場合max_workersは使用しない）
+            max_pending (int): 取得中・受け取り待ちの銘柄数の上限（省略時はmax_workersの2倍）
+            save (bool): 取得したデータをストレージに保存するか
+                         （キャッシュを使う場合、取得した行は取得時にストレージに追記される）
+            on_result (Callable): 銘柄ごとの処理が終わるたびに 銘柄コード, データ（失敗時はNone）, 失敗理由（成功時はNone）
+                                  を渡して呼び出す関数
             
-            if not data.empty:
-                results[symbol] = data
-                self.save_to_csv(data, symbol, source)
-            else:
-                logger.warning(f"銘柄 {symbol} のデータ取得に失敗しました")
+        Yields:
+            Tuple[str, pd.DataFrame]: 銘柄コードとデータ（取得が完了した順）
+        """
+        self.last_errors = {}
+        
+        source = source.lower()
+        if source not in available_providers():
+            logger.error(f"サポートされていないデータソース: {source}")
+            return
+        
+        def fetch_and_save(symbol: str) -> pd.DataFrame:
+            logger.info(f"銘柄 {symbol} のデータを取得中...")
+            data = self._load(source, symbol, start_date, end_date)
+            if save and not data.empty:
+                # ヘッジにより別のデータソースから取得した場合は、そのデータソースとして保存する
+                self.save(data, symbol, data.attrs.get("source", source))
+            return data
         
-        return results 
\ No newline at end of file
+        if source == "yahoo" and batch_size:
+            outcomes = self._iter_yahoo_batches(ticker_symbols, start_date, end_date, batch_size, save)
+        elif max_workers <= 1:
+            outcomes = self._iter_sequential(ticker_symbols, fetch_and_save)
+        else:
+            outcomes = self._iter_parallel(ticker_symbols, fetch_and_save, max_workers,
+                                           max_pending or max_workers * 2)
+        
+        for symbol, data, error in outcomes:
+            if error is not None:
+                logger.error(f"銘柄 {symbol} のデータ取得に失敗しました: {error}")
+                self.last_errors[symbol] = str(error)
+            elif data.empty:
+                logger.warning(f"銘柄 {symbol} のデータ取得に失敗しました")
+                self.last_errors[symbol] = "データがありません"
+            if on_result is not None:
+                on_result(symbol, None if symbol in self.last_errors else data, self.last_errors.get(symbol))
+            if symbol not in self.last_errors:
+                yield symbol, data
+    
+    @staticmethod
+    def _iter_sequential(ticker_symbols: Iterable[str],
+                         fetch: Callable[[str], pd.DataFrame]) -> Iterator[Tuple[str, Optional[pd.DataFrame], Optional[Exception]]]:
+        """銘柄を順番に取得"""
+        for symbol in ticker_symbols:
+            try:
+                yield symbol, fetch(symbol), None
+            except Exception as e:
+                yield symbol, None, e
+    
+    @staticmethod
+    def _iter_parallel(ticker_symbols: Iterable[str],
+                       fetch: Callable[[str], pd.DataFrame],
+                       max_workers: int,
+                       max_pending: int) -> Iterator[Tuple[str, Optional[pd.DataFrame], Optional[Exception]]]:
+        """取得中・受け取り待ちの銘柄数をmax_pendingまでに制限して並列に取得"""
+        symbols = iter(ticker_symbols)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = {}
+        try:
+            while True:
+                # 呼び出し側が結果を受け取った分だけ新しい取得を始める
+                for symbol in symbols:
+                    pending[executor.submit(fetch, symbol)] = symbol
+                    if len(pending) >= max(max_pending, 1):
+                        break
+                if not pending:
+                    return
+                # データソースごとの同時リクエスト数は_source_slotsで制限される
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    symbol = pending.pop(future)
+                    try:
+                        yield symbol, future.result(), None
+                    except Exception as e:
+                        yield symbol, None, e
+        finally:
+            # 途中で受け取りをやめた場合は、まだ始まっていない取得を取り消す
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    def _iter_yahoo_batches(self,
+                            ticker_symbols: Iterable[str],
+                            start_date: str,
+                            end_date: str,
+                            batch_size: int,
+                            save: bool) -> Iterator[Tuple[str, Optional[pd.DataFrame], Optional[Exception]]]:
+        """Yahoo Financeからbatch_size銘柄ずつまとめて取得"""
+        symbols = iter(ticker_symbols)
+        while True:
+            chunk = list(itertools.islice(symbols, batch_size))
+            if not chunk:
+                return
+            for symbol, data in self._load_yahoo_batched(chunk, start_date, end_date, batch_size).items():
+                if isinstance(data, Exception):
+                    yield symbol, None, data
+                    continue
+                if save and not data.empty:
+                    self.save(data, symbol, "yahoo")
+                yield symbol, data, None
@@ -0,0 +1,182 @@
+"""
+Stooqの一括ダウンロード（銘柄別の日足テキストファイルのzip）の取り込み
+ダウンロード済みのアーカイブを複数プロセスで並列に読み込み、列指向ストレージに直接書き込む
+
+    https://stooq.com/db/h/ の「Japan / daily」（d_jp_txt.zip）など
+"""
+
+import io
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, Dict, List, Tuple, Iterable, Callable
+import pandas as pd
+import logging
+from ohlcv_schema import normalize
+from ohlcv_store import OHLCVStore
+
+logger = logging.getLogger(__name__)
+
+# メンバー名の例: data/daily/jp/tse stocks/1/7203.jp.txt
+_MEMBER_PATTERN = re.compile(r'(?:^|/)([0-9a-z]+)\.jp\.txt$', re.IGNORECASE)
+
+_COLUMNS = {"<DATE>": "Date", "<OPEN>": "Open", "<HIGH>": "High", "<LOW>": "Low", "<CLOSE>": "Close", "<VOL>": "Volume"}
+
+# ワーカープロセスごとに1回だけ開くアーカイブとストレージ
+_worker_archive: Optional[zipfile.ZipFile] = None
+_worker_store: Optional[OHLCVStore] = None
+
+
+def member_code(name: str) -> Optional[str]:
+    """
+    アーカイブのメンバー名から銘柄コードを取得（JapaneseStockDataFetcherと同じ .T なしのコード）
+
+    Args:
+        name (str): メンバー名（例: "data/daily/jp/tse stocks/1/7203.jp.txt"）
+
+    Returns:
+        Optional[str]: 銘柄コード（例: "7203"）。日本株の日足ファイルでない場合はNone
+    """
+    match = _MEMBER_PATTERN.search(name)
+    return match.group(1).upper() if match else None
+
+
+def parse_member(data: bytes, code: str, since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+    """
+    メンバーのテキスト（<TICKER>,<PER>,<DATE>,... 形式）を共通形式のデータに変換
+
+    Args:
+        data (bytes): メンバーの内容
+        code (str): 銘柄コード
+        since (str): 取り込む開始日（YYYY-MM-DD形式、省略時は最初から）
+        until (str): 取り込む終了日（YYYY-MM-DD形式、この日を含む。省略時は最後まで）
+
+    Returns:
+        pd.DataFrame: 共通形式のデータ
+    """
+    df = pd.read_csv(io.BytesIO(data), usecols=["<PER>", *_COLUMNS], dtype={"<PER>": str, "<DATE>": str})
+    df = df[df["<PER>"] == "D"].drop(columns="<PER>").rename(columns=_COLUMNS)
+    df = df.set_index(pd.to_datetime(df.pop("Date"), format="%Y%m%d"))
+    if since or until:
+        df = df.sort_index().loc[since:until]
+    return normalize(df, code)
+
+
+def _init_worker(archive_path: str, store_root: str, compression: str):
+    global _worker_archive, _worker_store
+    _worker_archive = zipfile.ZipFile(archive_path)
+    # 追記ごとのまとめ直しは行わず、銘柄ごとの追記の後に1回だけまとめ直す
+    _worker_store = OHLCVStore(store_root, compression=compression, compact_parts=None)
+
+
+def _import_members(members: List[Tuple[str, str]],
+                    source: str,
+                    since: Optional[str],
+                    until: Optional[str]) -> List[Tuple[str, int, int, Optional[str]]]:
+    """ワーカープロセスでメンバーを読み込み、保存済みでない行をストレージに書き込んで既存のファイルとまとめる"""
+    results = []
+    for name, code in members:
+        try:
+            df = parse_member(_worker_archive.read(name), code, since, until)
+            new = _worker_store.unstored(df, source, code)
+            if not new.empty:
+                # 保存済みの期間より前の行（過去分）も含めて追記し、既存のファイルとまとめ直す
+                _worker_store.append(new, source, code)
+                _worker_store.compact(source, code)
+            results.append((code, len(new), len(df) - len(new), None))
+        except Exception as e:
+            results.append((code, 0, 0, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def import_archive(archive_path: str,
+                   store: OHLCVStore,
+                   source: str = "stooq",
+                   processes: Optional[int] = None,
+                   codes: Optional[Iterable[str]] = None,
+                   since: Optional[str] = None,
+                   until: Optional[str] = None,
+                   chunk_size: int = 50,
+                   on_result: Optional[Callable[[str, int, Optional[str]], None]] = None) -> Dict:
+    """
+    Stooqのアーカイブを取り込んでストレージに保存
+
+    保存済みでない日付の行（保存済みの期間より前の過去分を含む）のみを書き込むため、同じアーカイブを再度取り込んでも重複しない。
+    保存済みの日付の行は書き込まず、銘柄ごとの行数をskippedに記録する。
+
+    Args:
+        archive_path (str): ダウンロード済みのzipファイル
+        store (OHLCVStore): 書き込み先のストレージ（JapaneseStockDataFetcher.store など）
+        source (str): 保存先のデータソース名
+        processes (int): ワーカープロセス数（省略時はCPU数、1の場合はこのプロセスで処理）
+        codes (Iterable[str]): 取り込む銘柄コード（省略時はすべて）
+        since (str): 取り込む開始日（YYYY-MM-DD形式）
+        until (str): 取り込む終了日（YYYY-MM-DD形式、この日を含む）
+        chunk_size (int): ワーカーに1回で渡すメンバー数
+        on_result (Callable[[str, int, Optional[str]], None]): 銘柄ごとに (銘柄コード, 書き込んだ行数, エラー) で呼び出す関数
+
+    Returns:
+        Dict: 集計（members, imported, unchanged, failed, rows, skipped_rows, seconds, codes_per_sec, rows_per_sec,
+              skipped（銘柄ごとの書き込まなかった行数）, errors）
+    """
+    started = time.monotonic()
+    with zipfile.ZipFile(archive_path) as archive:
+        members: Dict[str, str] = {}
+        for info in archive.infolist():
+            code = member_code(info.filename)
+            if code is not None and code not in members:
+                members[code] = info.filename
+    if codes is not None:
+        wanted = {code.replace('.T', '').upper() for code in codes}
+        members = {code: name for code, name in members.items() if code in wanted}
+
+    items = [(name, code) for code, name in members.items()]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(chunks) or 1))
+    logger.info(f"アーカイブを取り込み中: {archive_path} ({len(items)}銘柄, {processes}プロセス)")
+
+    summary = {'members': len(items), 'imported': 0, 'unchanged': 0, 'failed': 0, 'rows': 0, 'skipped_rows': 0,
+               'skipped': {}, 'errors': {}}
+
+    def collect(results: List[Tuple[str, int, int, Optional[str]]]):
+        for code, rows, skipped, error in results:
+            if skipped:
+                summary['skipped'][code] = skipped
+                summary['skipped_rows'] += skipped
+            if error is None:
+                # 書き込んだ行が無い銘柄（すべて保存済み、または期間内のデータが無い）は取り込みに数えない
+                summary['imported' if rows else 'unchanged'] += 1
+                summary['rows'] += rows
+            else:
+                summary['failed'] += 1
+                summary['errors'][code] = error
+            if on_result is not None:
+                on_result(code, rows, error)
+
+    init_args = (archive_path, store.root_dir, store.compression)
+    if processes == 1:
+        _init_worker(*init_args)
+        try:
+            for chunk in chunks:
+                collect(_import_members(chunk, source, since, until))
+        finally:
+            _worker_archive.close()
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=init_args) as executor:
+            futures = [executor.submit(_import_members, chunk, source, since, until) for chunk in chunks]
+            for future in as_completed(futures):
+                collect(future.result())
+
+    # 別プロセスで書き込んだため、このプロセスで保持している最終行は使わない
+    store.invalidate(source)
+
+    elapsed = time.monotonic() - started
+    summary['seconds'] = round(elapsed, 2)
+    summary['codes_per_sec'] = round(summary['imported'] / elapsed, 1) if elapsed > 0 else 0.0
+    summary['rows_per_sec'] = round(summary['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+    logger.info(f"アーカイブの取り込みが完了しました: {summary['imported']}銘柄, {summary['rows']}行, "
+                f"保存済みのため書き込まなかった行 {summary['skipped_rows']}行, "
+                f"変更無し {summary['unchanged']}銘柄, 失敗 {summary['failed']}銘柄 ({summary['seconds']}秒)")
+    return summary
@@ -0,0 +1,57 @@
+"""
+Stooqのプロバイダー（pandas_datareaderを使用）
+providers.get_provider("stooq") で最初に使用する時点で読み込まれる
+"""
+
+import datetime as dt
+import pandas as pd
+import requests
+from typing import Optional
+from pandas_datareader._utils import RemoteDataError
+from pandas_datareader.stooq import StooqDailyReader
+from fetch_policy import DataNotFoundError
+
+
+class StooqProvider:
+    """Stooqから日足を取得する"""
+
+    def history(self,
+                code: str,
+                start: dt.date,
+                end: dt.date,
+                session: Optional[requests.Session] = None,
+                timeout: float = 30.0) -> pd.DataFrame:
+        """
+        指定期間（終了日を含む）の日足を取得
+
+        再試行は呼び出し側（FetchPolicy）で行うため、ライブラリ側では再試行しない。
+
+        Args:
+            code (str): 銘柄コード（.JPなし）
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
+            session (requests.Session): リクエストに使うセッション
+            timeout (float): リクエストのタイムアウト（秒）
+
+        Returns:
+            pd.DataFrame: Open, High, Low, Close, Volume 列の日足（日付の新しい順）
+
+        Raises:
+            DataNotFoundError: Stooqが応答したが銘柄のデータが無い場合
+            requests.HTTPError: Stooqが正常でない状態コードを返した場合
+        """
+        reader = StooqDailyReader(
+            symbols=f"{code}.JP",
+            start=start,
+            end=end,
+            retry_count=0,
+            session=session
+        )
+        reader.timeout = timeout
+        try:
+            return reader.read()
+        except RemoteDataError as e:
+            if str(e).startswith("No data fetched"):
+                raise DataNotFoundError(f"{code}.JP のデータがありません") from e
+            # 200以外の状態コードの応答（状態コードは例外に含まれないため、一時的な失敗として扱う）
+            raise requests.HTTPError(str(e)) from e
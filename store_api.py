@@ -0,0 +1,403 @@
+"""
+保存済みの株価データ（OHLCVStore）を参照するローカルHTTP API
+銘柄・期間・列を指定したデータを列指向（Parquet・Arrow）またはCSVで返す。
+ETag/If-None-Matchに対応し、保存済みデータが変わっていない場合は本文を送らずに304を返す。
+よく参照される範囲の応答は、データを読み込み直さずにメモリ上のLRUキャッシュから返す。
+
+    GET /ohlcv?codes=7203,6758&start=2024-01-01&end=2024-12-31&columns=Close,Volume&format=parquet
+    GET /codes?source=stooq
+    GET /stats
+"""
+
+import io
+import gzip
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from typing import Optional, Dict, List, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+import logging
+from ohlcv_schema import PRICE_COLUMNS, concat as concat_frames, conform
+from ohlcv_store import OHLCVStore
+from quote_cache import QuoteCache
+
+logger = logging.getLogger(__name__)
+
+# 形式ごとのContent-Type（Parquet・Arrowは列ごとにzstdで圧縮済みのため、CSVのみgzipで圧縮する）
+FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv; charset=utf-8",
+}
+
+_VALUE_COLUMNS = PRICE_COLUMNS + ("Volume",)
+
+# この大きさ未満の本文は圧縮しない
+_MIN_COMPRESS_BYTES = 1024
+
+
+class _Response:
+    """キャッシュする応答の本文"""
+
+    def __init__(self, body: bytes, content_type: str, encoding: Optional[str], rows: int):
+        self.body = body
+        self.content_type = content_type
+        self.encoding = encoding
+        self.rows = rows
+
+
+def _accepts_gzip(header: Optional[str]) -> bool:
+    """Accept-Encodingにgzipが含まれるか（q=0の場合は除く）"""
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*") and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return True
+    return False
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-MatchのいずれかのETagが一致するか（弱いETagも同じ値として比較する）"""
+    if not header:
+        return False
+    candidates = [item.strip() for item in header.split(",")]
+    return "*" in candidates or etag in [item[2:] if item.startswith("W/") else item for item in candidates]
+
+
+def render(df: pd.DataFrame, fmt: str) -> bytes:
+    """
+    データを指定した形式の本文に変換
+
+    Args:
+        df (pd.DataFrame): code列付きの日付インデックスのデータ
+        fmt (str): 形式（parquet, arrow, csv）
+
+    Returns:
+        bytes: 本文
+    """
+    if fmt == "csv":
+        return df.to_csv(index=True).encode("utf-8")
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def parse(body: bytes, fmt: str) -> pd.DataFrame:
+    """
+    本文をデータに変換（renderの逆）
+
+    Args:
+        body (bytes): 本文
+        fmt (str): 形式（parquet, arrow, csv）
+
+    Returns:
+        pd.DataFrame: code列付きの日付インデックスのデータ（共通形式の型）
+    """
+    if fmt == "parquet":
+        df = pd.read_parquet(io.BytesIO(body))
+    elif fmt == "arrow":
+        df = pa.ipc.open_stream(body).read_pandas()
+    else:
+        df = pd.read_csv(io.BytesIO(body), index_col=0, parse_dates=True, dtype={"code": str})
+    return conform(df)
+
+
+class StoreAPIServer:
+    """OHLCVStoreの保存済みデータを返すHTTPサーバー"""
+
+    def __init__(self,
+                 store: OHLCVStore,
+                 host: str = "127.0.0.1",
+                 port: int = 8766,
+                 cache_entries: int = 256,
+                 cache_ttl: float = 60 * 60,
+                 max_codes: int = 1000):
+        """
+        初期化
+
+        Args:
+            store (OHLCVStore): 参照するストレージ（JapaneseStockDataFetcher.store など）
+            host (str): 待ち受けるアドレス
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            cache_entries (int): メモリに保持する応答の最大件数（超えた場合は最も古く使われたものから削除）
+            cache_ttl (float): 応答を保持する時間（秒）。保存済みデータが変わった場合は保持時間によらず読み込み直す
+            max_codes (int): 1回のリクエストで指定できる銘柄数の上限
+        """
+        self.store = store
+        self.max_codes = max_codes
+        # キーは保存済みデータの版を含むETagのため、書き込みがあると別のキーになる
+        self.cache = QuoteCache(ttl=cache_ttl, max_entries=cache_entries)
+        self._counts = {'requests': 0, 'not_modified': 0, 'bytes_sent': 0, 'rows_sent': 0}
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StoreAPIServer":
+        """別スレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="store-api", daemon=True)
+        self._thread.start()
+        logger.info(f"保存済みデータのAPIを開始しました: {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        """このスレッドで待ち受ける（Ctrl+Cで終了）"""
+        logger.info(f"保存済みデータのAPIを開始しました: {self.base_url}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict:
+        """
+        リクエスト数・304の数・送信量とキャッシュの統計情報
+
+        Returns:
+            Dict: requests, not_modified, bytes_sent, rows_sent, cache
+        """
+        with self._counts_lock:
+            stats = dict(self._counts)
+        stats['cache'] = self.cache.stats()
+        return stats
+
+    def _count(self, **values):
+        with self._counts_lock:
+            for key, value in values.items():
+                self._counts[key] += value
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: bytes = b"", headers: Optional[Dict] = None):
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        if status != 304:
+            handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if body and handler.command != "HEAD":
+            handler.wfile.write(body)
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(handler, status, body, {"Content-Type": "application/json; charset=utf-8"})
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        self._count(requests=1)
+        url = urlsplit(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/ohlcv":
+                return self._ohlcv(handler, query)
+            if url.path == "/codes":
+                source = query.get("source", "stooq")
+                return self._send_json(handler, 200, {'source': source, 'codes': self.store.codes(source)})
+            if url.path == "/stats":
+                return self._send_json(handler, 200, self.stats())
+            return self._send_json(handler, 404, {'error': "not found"})
+        except ValueError as e:
+            return self._send_json(handler, 400, {'error': str(e)})
+        except Exception as e:
+            logger.error(f"リクエストの処理に失敗しました: {handler.path} ({e})")
+            return self._send_json(handler, 500, {'error': str(e)})
+
+    def _ohlcv(self, handler: BaseHTTPRequestHandler, query: Dict[str, str]):
+        """銘柄・期間・列を指定したデータを返す"""
+        codes = list(dict.fromkeys(code.strip().replace('.T', '')
+                                   for code in query.get("codes", query.get("code", "")).split(",") if code.strip()))
+        source = query.get("source", "stooq")
+        start, end = query.get("start") or None, query.get("end") or None
+        fmt = query.get("format", "parquet")
+        columns = [col.strip().title() for col in query["columns"].split(",")] if query.get("columns") else None
+        if not codes:
+            raise ValueError("codes を指定してください")
+        if len(codes) > self.max_codes:
+            raise ValueError(f"銘柄数が上限（{self.max_codes}）を超えています")
+        if fmt not in FORMATS:
+            raise ValueError(f"サポートされていない形式: {fmt}（{', '.join(FORMATS)}）")
+        if columns and any(col not in _VALUE_COLUMNS for col in columns):
+            raise ValueError(f"サポートされていない列: {','.join(columns)}（{', '.join(_VALUE_COLUMNS)}）")
+        for value in (start, end):
+            if value:
+                pd.Timestamp(value)
+
+        encoding = "gzip" if fmt == "csv" and _accepts_gzip(handler.headers.get("Accept-Encoding")) else None
+        request_key = (source, tuple(codes), start, end, tuple(columns or ()), fmt, encoding)
+
+        def etag_of(versions: List[str]) -> str:
+            digest = hashlib.blake2b(repr((request_key, versions)).encode(), digest_size=16)
+            return f'"{digest.hexdigest()}"'
+
+        # ファイルを読み込まずに保存済みデータの版からETagを求め、変わっていなければ304を返す
+        versions = [self.store.version(source, code, start, end) for code in codes]
+        etag = etag_of(versions)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if _etag_matches(handler.headers.get("If-None-Match"), etag):
+            self._count(not_modified=1)
+            return self._send(handler, 304, headers=headers)
+
+        def load() -> _Response:
+            frames, found = [], []
+            for code in codes:
+                df = self.store.read(source, code, start, end, columns)
+                if df.empty:
+                    continue
+                # code列は保存データに含まれない場合もあるため付け直す
+                df = df.drop(columns="code", errors="ignore")
+                df.insert(0, "code", code)
+                frames.append(df)
+                found.append(code)
+            if not frames:
+                return _Response(b"", FORMATS[fmt], None, 0)
+            df = concat_frames(frames, found)
+            body = render(df, fmt)
+            if encoding and len(body) >= _MIN_COMPRESS_BYTES:
+                return _Response(gzip.compress(body, compresslevel=6), FORMATS[fmt], encoding, len(df))
+            return _Response(body, FORMATS[fmt], None, len(df))
+
+        response = self.cache.get(etag, load)
+        if self._changed(source, codes, start, end, versions):
+            # 読み込み中に書き込みがあった場合は、読み込んだ時点の版として返し直す
+            self.cache.invalidate(etag)
+            versions = [self.store.version(source, code, start, end) for code in codes]
+            headers["ETag"] = etag_of(versions)
+            response = self.cache.get(headers["ETag"], load)
+
+        if not response.rows:
+            return self._send_json(handler, 404, {'error': "期間内のデータがありません", 'codes': codes})
+        if response.encoding:
+            headers["Content-Encoding"] = response.encoding
+        headers["Content-Type"] = response.content_type
+        headers["X-Rows"] = str(response.rows)
+        self._count(bytes_sent=len(response.body), rows_sent=response.rows)
+        self._send(handler, 200, response.body, headers)
+
+    def _changed(self, source: str, codes: List[str], start: Optional[str], end: Optional[str], versions: List[str]) -> bool:
+        return [self.store.version(source, code, start, end) for code in codes] != versions
+
+
+class StoreAPIClient:
+    """
+    StoreAPIServerのクライアント
+
+    受け取ったデータをETagとともに保持し、同じ問い合わせではIf-None-Matchを送る。
+    保存済みデータが変わっていない場合は304を受け取り、保持しているデータを返す。
+    """
+
+    def __init__(self, base_url: str, session: Optional[requests.Session] = None, max_entries: int = 128,
+                 timeout: float = 30.0):
+        """
+        初期化
+
+        Args:
+            base_url (str): APIのURL（例: "http://127.0.0.1:8766"）
+            session (requests.Session): リクエストに使うセッション
+            max_entries (int): 保持する応答の最大件数
+            timeout (float): リクエストのタイムアウト（秒）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.not_modified = 0
+        self._entries: "OrderedDict[Tuple, Tuple[str, pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self,
+            codes,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+            columns: Optional[List[str]] = None,
+            source: str = "stooq",
+            fmt: str = "parquet") -> pd.DataFrame:
+        """
+        保存済みデータを取得
+
+        Args:
+            codes (str または List[str]): 銘柄コードまたはそのリスト
+            start_date (str): 開始日（YYYY-MM-DD形式、省略時は最初から）
+            end_date (str): 終了日（YYYY-MM-DD形式、この日を含む。省略時は最後まで）
+            columns (List[str]): 列（省略時はすべて）
+            source (str): データソース
+            fmt (str): 転送形式（parquet, arrow, csv）
+
+        Returns:
+            pd.DataFrame: code列付きの日付インデックスのデータ（データが無い場合は空のDataFrame）
+        """
+        if isinstance(codes, str):
+            codes = [codes]
+        params = {'codes': ",".join(codes), 'source': source, 'format': fmt}
+        if start_date:
+            params['start'] = str(start_date)[:10]
+        if end_date:
+            params['end'] = str(end_date)[:10]
+        if columns:
+            params['columns'] = ",".join(columns)
+        key = tuple(sorted(params.items()))
+
+        with self._lock:
+            cached = self._entries.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        response = self.session.get(f"{self.base_url}/ohlcv", params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.not_modified += 1
+                # 問い合わせ中に他のスレッドが削除した場合もあるため、残っている場合のみ最近使ったものにする
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return cached[1].copy()
+        if response.status_code == 404:
+            return pd.DataFrame()
+        response.raise_for_status()
+
+        df = parse(response.content, fmt)
+        etag = response.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._entries[key] = (etag, df)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return df.copy()
+
+    def codes(self, source: str = "stooq") -> List[str]:
+        """保存済みの銘柄コード一覧"""
+        response = self.session.get(f"{self.base_url}/codes", params={'source': source}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['codes']
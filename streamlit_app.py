@@ -5,11 +5,25 @@ Streamlitを使用した株価データ可視化アプリケーション
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
 import datetime as dt
+import os
+import time
+import uuid
+import hashlib
+import logging
 from stock_data_fetcher import JapaneseStockDataFetcher
+from ohlcv_schema import newest_first
+from chart_data import MAX_POINTS, ohlcv_for_chart, line_for_chart, rows_for_heatmap
+import comparison
+from ohlcv_export import export_stocks
+from quote_service import QuoteClient
+
+# ログ設定
+logging.basicConfig(level=logging.INFO)
 
 # ページ設定
 st.set_page_config(
@@ -29,6 +43,74 @@ def get_fetcher():
 
 fetcher = get_fetcher()
 
+@st.cache_data(ttl=15 * 60, max_entries=256, show_spinner=False)
+def _load_prices(code: str, source: str, start: str, end: str) -> pd.DataFrame:
+    df = fetcher.get_stock_data_yahoo(code, start, end) if source == "Yahoo Finance" else \
+        fetcher.get_stock_data_stooq(code, start, end)
+    if df.empty:
+        # 取得に失敗した結果はキャッシュしない
+        raise LookupError(f"{code} のデータを取得できませんでした")
+    return df
+
+def load_prices(code: str, source: str, start, end) -> pd.DataFrame:
+    """株価データを取得（銘柄・データソース・期間ごとに、セッションをまたいで15分間キャッシュ）"""
+    try:
+        return _load_prices(code, source, str(start), str(end))
+    except LookupError:
+        return pd.DataFrame()
+
+SOURCES = {"Yahoo Finance": "yahoo", "Stooq": "stooq"}
+
+@st.cache_resource
+def get_quote_client(url: str) -> QuoteClient:
+    """配信サービスの購読（全セッションで1つの接続を共有する）"""
+    return QuoteClient(url, list(MAJOR_STOCKS.keys()))
+
+def get_realtime_price(code: str) -> dict:
+    """リアルタイム株価を取得（配信サービスを指定した場合は購読している最新の株価）"""
+    if quote_service_url:
+        return get_quote_client(quote_service_url.strip()).get(code)
+    return fetcher.get_realtime_price(code)
+
+# ダウンロードボタンで送信するファイルサイズの上限（超える場合はサーバー上のパスを表示）
+DOWNLOAD_LIMIT_BYTES = 200 * 1024 * 1024
+
+# サーバー上に残した書き出しファイルを保持する時間（秒）
+EXPORT_RETENTION_SECONDS = 24 * 60 * 60
+
+def cleanup_exports(directory: str):
+    """保持する時間を過ぎた書き出しファイル（サーバー上に残した大きなファイル・中断した書き出し）を削除"""
+    if not os.path.isdir(directory):
+        return
+    expired = time.time() - EXPORT_RETENTION_SECONDS
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < expired:
+                os.remove(path)
+        except OSError:
+            # 他のセッションが削除済み
+            pass
+
+# 複数銘柄比較で銘柄ごとの折れ線を描く上限（超える場合はヒートマップで表示）
+LINE_CHART_LIMIT = 10
+
+@st.cache_data(ttl=15 * 60, max_entries=32, show_spinner=False)
+def _load_closes(codes: tuple, source: str, start: str, end: str, from_store: bool) -> pd.DataFrame:
+    close = comparison.load_closes(fetcher, codes, start, end, source=SOURCES[source],
+                                   from_store=from_store, max_workers=8)
+    if close.empty:
+        # 取得に失敗した結果はキャッシュしない
+        raise LookupError("データを取得できませんでした")
+    return close
+
+def load_closes(codes, source: str, start, end, from_store: bool = False) -> pd.DataFrame:
+    """複数銘柄の終値を同時に取得して日付を揃える（銘柄・データソース・期間ごとに15分間キャッシュ）"""
+    try:
+        return _load_closes(tuple(codes), source, str(start), str(end), from_store)
+    except LookupError:
+        return pd.DataFrame()
+
 # 主要な日本株の銘柄コード
 MAJOR_STOCKS = {
     "7203": "トヨタ自動車",
@@ -51,6 +133,14 @@ MAJOR_STOCKS = {
 # サイドバー
 st.sidebar.header("設定")
 
+# リアルタイム株価の配信サービス（指定した場合はセッションごとに取得せず、サービスの配信を購読する）
+quote_service_url = st.sidebar.text_input(
+    "リアルタイム株価の配信サービスURL",
+    value=os.environ.get("QUOTE_SERVICE_URL", ""),
+    placeholder="http://127.0.0.1:8765",
+    help="python main.py quote-service で起動したサービスのURL。空欄の場合は直接取得します。"
+)
+
 # タブ選択
 tab1, tab2, tab3, tab4 = st.tabs(["📊 株価チャート", "💰 リアルタイム株価", "📈 複数銘柄比較", "📋 データダウンロード"])
 
@@ -86,26 +176,36 @@ with tab1:
         horizontal=True
     )
     
+    # 表示方法（自動の場合は期間に応じて日足・週足・月足を選ぶ）
+    col1, col2 = st.columns(2)
+    with col1:
+        chart_type = st.radio("チャートの種類", ["ローソク足", "ライン"], horizontal=True)
+    with col2:
+        bar_level = st.radio("足の種類", ["自動", "日足", "週足", "月足"], horizontal=True,
+                             disabled=chart_type == "ライン")
+    
     if st.button("📊 チャートを表示"):
         with st.spinner("データを取得中..."):
-            if data_source == "Yahoo Finance":
-                df = fetcher.get_stock_data_yahoo(selected_stock, str(start_date), str(end_date))
-            else:
-                df = fetcher.get_stock_data_stooq(selected_stock, str(start_date), str(end_date))
+            df = load_prices(selected_stock, data_source, start_date, end_date)
             
             if not df.empty:
-                # 日付でソート（古い順）
-                df_sorted = df.sort_index()
-                
-                # キャンドルスティックチャート
-                fig = go.Figure(data=[go.Candlestick(
-                    x=df_sorted.index,
-                    open=df_sorted['Open'],
-                    high=df_sorted['High'],
-                    low=df_sorted['Low'],
-                    close=df_sorted['Close'],
-                    name="株価"
-                )])
+                # 描画する点の数が期間によらずMAX_POINTS以下になるよう、サーバー側でまとめてから描画する
+                if chart_type == "ローソク足":
+                    bars, level = ohlcv_for_chart(df, MAX_POINTS, minimum="日足" if bar_level == "自動" else bar_level)
+                    fig = go.Figure(data=[go.Candlestick(
+                        x=bars.index,
+                        open=bars['Open'],
+                        high=bars['High'],
+                        low=bars['Low'],
+                        close=bars['Close'],
+                        name="株価"
+                    )])
+                else:
+                    bars, level = ohlcv_for_chart(df, MAX_POINTS)
+                    close = line_for_chart(df['Close'], MAX_POINTS)
+                    fig = go.Figure(data=[go.Scatter(x=close.index, y=close.values, mode='lines', name="終値")])
+                    level = "日足" if len(close) == len(df) else f"{len(close)}点に間引いた日足"
+                st.caption(f"{level}で表示（日足 {len(df)}本）")
                 
                 fig.update_layout(
                     title=f"{MAJOR_STOCKS[selected_stock]} ({selected_stock}) 株価チャート",
@@ -116,10 +216,10 @@ with tab1:
                 
                 st.plotly_chart(fig, use_container_width=True)
                 
-                # 出来高チャート
+                # 出来高チャート（ローソク足と同じ期間単位の合計）
                 fig_volume = go.Figure(data=[go.Bar(
-                    x=df_sorted.index,
-                    y=df_sorted['Volume'],
+                    x=bars.index,
+                    y=bars['Volume'],
                     name="出来高"
                 )])
                 
@@ -135,13 +235,13 @@ with tab1:
                 # 統計情報
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("最新終値", f"¥{df_sorted['Close'].iloc[-1]:,.0f}")
+                    st.metric("最新終値", f"¥{df['Close'].iloc[-1]:,.0f}")
                 with col2:
-                    st.metric("最高値", f"¥{df_sorted['High'].max():,.0f}")
+                    st.metric("最高値", f"¥{df['High'].max():,.0f}")
                 with col3:
-                    st.metric("最安値", f"¥{df_sorted['Low'].min():,.0f}")
+                    st.metric("最安値", f"¥{df['Low'].min():,.0f}")
                 with col4:
-                    st.metric("平均終値", f"¥{df_sorted['Close'].mean():,.0f}")
+                    st.metric("平均終値", f"¥{df['Close'].mean():,.0f}")
                 
             else:
                 st.error("データの取得に失敗しました。")
@@ -159,7 +259,7 @@ with tab2:
     
     if st.button("🔄 リアルタイムデータを更新"):
         with st.spinner("リアルタイムデータを取得中..."):
-            realtime_data = fetcher.get_realtime_price(realtime_stock)
+            realtime_data = get_realtime_price(realtime_stock)
             
             if realtime_data and realtime_data['current_price']:
                 # メトリクス表示
@@ -221,17 +321,18 @@ with tab2:
 with tab3:
     st.header("📈 複数銘柄比較")
     
-    # 複数銘柄選択
+    # 複数銘柄選択（主要銘柄から選ぶほか、銘柄コードを直接入力できる）
     selected_stocks = st.multiselect(
-        "比較する銘柄を選択してください（最大5銘柄）",
+        "比較する銘柄を選択してください",
         options=list(MAJOR_STOCKS.keys()),
         format_func=lambda x: f"{x} - {MAJOR_STOCKS[x]}",
         default=["7203", "6758", "9984"]
     )
-    
-    if len(selected_stocks) > 5:
-        st.warning("最大5銘柄まで選択できます。")
-        selected_stocks = selected_stocks[:5]
+    extra_codes = st.text_area(
+        "銘柄コードを追加（カンマ・空白・改行区切り）",
+        placeholder="例: 4063, 6098, 8035",
+        key="compare_codes"
+    )
     
     # 期間選択
     col1, col2 = st.columns(2)
@@ -250,74 +351,119 @@ with tab3:
             key="compare_end"
         )
     
-    if st.button("📈 比較チャートを表示") and selected_stocks:
-        with st.spinner("複数銘柄のデータを取得中..."):
-            all_data = {}
-            
-            for stock in selected_stocks:
-                df = fetcher.get_stock_data_yahoo(stock, str(compare_start_date), str(compare_end_date))
-                if not df.empty:
-                    # 終値を正規化（開始日を100とする）
-                    df_sorted = df.sort_index()
-                    normalized_close = (df_sorted['Close'] / df_sorted['Close'].iloc[0]) * 100
-                    all_data[stock] = normalized_close
+    # データソース選択（保存済みデータの場合はネットワークにアクセスしない）
+    col1, col2 = st.columns(2)
+    with col1:
+        compare_source = st.radio("データソース", ["Yahoo Finance", "Stooq"], horizontal=True, key="compare_source")
+    with col2:
+        from_store = st.checkbox("保存済みデータから読み込む", key="compare_from_store")
+        all_stored = st.checkbox("保存済みの全銘柄を比較", key="compare_all_stored", disabled=not from_store)
+    
+    codes = list(dict.fromkeys(selected_stocks + extra_codes.replace(',', ' ').split()))
+    if from_store and all_stored:
+        codes = fetcher.store.codes(SOURCES[compare_source])
+    
+    if st.button("📈 比較チャートを表示") and codes:
+        with st.spinner(f"{len(codes)}銘柄のデータを取得中..."):
+            close = load_closes(codes, compare_source, compare_start_date, compare_end_date, from_store)
             
-            if all_data:
-                # 比較チャート
-                fig = go.Figure()
+            if not close.empty:
+                # 終値を正規化（開始日を100とする）
+                normalized_close = comparison.normalized(close)
+                labels = [f"{code} - {MAJOR_STOCKS[code]}" if code in MAJOR_STOCKS else code for code in close.columns]
+                st.caption(f"{close.shape[1]}銘柄 × {close.shape[0]}日"
+                           + (f"（取得できなかった銘柄: {len(codes) - close.shape[1]}）" if close.shape[1] < len(codes) else ""))
                 
-                for stock, data in all_data.items():
-                    fig.add_trace(go.Scatter(
-                        x=data.index,
-                        y=data.values,
-                        mode='lines',
-                        name=f"{stock} - {MAJOR_STOCKS[stock]}",
-                        line=dict(width=2)
+                if close.shape[1] <= LINE_CHART_LIMIT:
+                    # 比較チャート
+                    fig = go.Figure()
+                    
+                    for code, label in zip(close.columns, labels):
+                        data = line_for_chart(normalized_close[code].dropna(), MAX_POINTS)
+                        fig.add_trace(go.Scatter(
+                            x=data.index,
+                            y=data.values,
+                            mode='lines',
+                            name=label,
+                            line=dict(width=2)
+                        ))
+                    
+                    fig.update_layout(
+                        title="複数銘柄比較（正規化終値）",
+                        xaxis_title="日付",
+                        yaxis_title="正規化価格（開始日=100）",
+                        height=600,
+                        hovermode='x unified'
+                    )
+                else:
+                    # 銘柄が多い場合は 銘柄 × 日付 のヒートマップ（最終日の騰落率の順）
+                    heat = rows_for_heatmap(normalized_close, MAX_POINTS) - 100
+                    order = np.argsort(-heat.iloc[-1].fillna(-np.inf).to_numpy(), kind='stable')
+                    fig = go.Figure(data=go.Heatmap(
+                        z=heat.to_numpy().T[order],
+                        x=heat.index,
+                        y=[labels[i] for i in order],
+                        colorscale="RdYlGn",
+                        zmid=0,
+                        colorbar=dict(title="騰落率 (%)")
                     ))
-                
-                fig.update_layout(
-                    title="複数銘柄比較（正規化終値）",
-                    xaxis_title="日付",
-                    yaxis_title="正規化価格（開始日=100）",
-                    height=600,
-                    hovermode='x unified'
-                )
+                    fig.update_layout(
+                        title="複数銘柄比較（開始日からの騰落率）",
+                        xaxis_title="日付",
+                        yaxis=dict(autorange="reversed", showticklabels=close.shape[1] <= 60),
+                        height=min(1200, 300 + 12 * close.shape[1])
+                    )
                 
                 st.plotly_chart(fig, use_container_width=True)
                 
-                # 統計比較表
-                st.subheader("統計比較")
-                comparison_data = []
-                
-                for stock in selected_stocks:
-                    if stock in all_data:
-                        data = all_data[stock]
-                        comparison_data.append({
-                            "銘柄コード": stock,
-                            "会社名": MAJOR_STOCKS[stock],
-                            "期間最高値": f"{data.max():.2f}",
-                            "期間最安値": f"{data.min():.2f}",
-                            "期間変動率": f"{((data.iloc[-1] - data.iloc[0]) / data.iloc[0] * 100):.2f}%"
-                        })
+                # 相関行列（日次リターン）
+                st.subheader("相関行列（日次リターン）")
+                corr = comparison.correlation(comparison.returns(close))
+                fig_corr = px.imshow(
+                    corr,
+                    color_continuous_scale="RdBu_r",
+                    zmin=-1,
+                    zmax=1,
+                    aspect="auto",
+                    text_auto=".2f" if close.shape[1] <= LINE_CHART_LIMIT else False
+                )
+                fig_corr.update_layout(height=min(900, 250 + 12 * close.shape[1]))
+                st.plotly_chart(fig_corr, use_container_width=True)
                 
-                if comparison_data:
-                    comparison_df = pd.DataFrame(comparison_data)
-                    st.dataframe(comparison_df, use_container_width=True)
+                # 統計比較表（ベータは比較する全銘柄の等加重平均に対する値）
+                st.subheader("統計比較")
+                stats = comparison.summary(close)
+                comparison_df = pd.DataFrame({
+                    "銘柄コード": close.columns,
+                    "会社名": [MAJOR_STOCKS.get(code, "") for code in close.columns],
+                    "期間最高値": stats['high'].round(2).to_numpy(),
+                    "期間最安値": stats['low'].round(2).to_numpy(),
+                    "期間変動率(%)": (stats['change'] * 100).round(2).to_numpy(),
+                    "ボラティリティ(年率%)": (stats['volatility'] * 100).round(2).to_numpy(),
+                    "最大ドローダウン(%)": (stats['max_drawdown'] * 100).round(2).to_numpy(),
+                    "ベータ": stats['beta'].round(2).to_numpy(),
+                })
+                st.dataframe(comparison_df, use_container_width=True, hide_index=True)
             else:
                 st.error("データの取得に失敗しました。")
 
 with tab4:
     st.header("📋 データダウンロード")
     
-    # ダウンロード設定
+    # ダウンロード設定（複数銘柄を1つのアーカイブにまとめて書き出す）
     col1, col2 = st.columns(2)
     
     with col1:
-        download_stock = st.selectbox(
+        download_stocks = st.multiselect(
             "ダウンロードする銘柄",
             options=list(MAJOR_STOCKS.keys()),
             format_func=lambda x: f"{x} - {MAJOR_STOCKS[x]}",
-            key="download_stock"
+            default=["7203"],
+            key="download_stocks"
+        )
+        download_codes = st.text_area(
+            "銘柄コードを追加（カンマ・空白・改行区切り）",
+            key="download_codes"
         )
         
         download_source = st.radio(
@@ -340,34 +486,84 @@ with tab4:
             max_value=datetime.now(),
             key="download_end"
         )
+        
+        download_format = st.radio(
+            "ファイル形式",
+            ["CSV（銘柄別・zip圧縮）", "Parquet（全銘柄を1ファイル）"],
+            key="download_format"
+        )
+        store_only = st.checkbox("保存済みデータのみ（取得しない）", key="download_store_only")
+        download_all = st.checkbox("保存済みの全銘柄", key="download_all", disabled=not store_only)
     
-    if st.button("📥 データをダウンロード"):
-        with st.spinner("データを取得中..."):
-            if download_source == "Yahoo Finance":
-                df = fetcher.get_stock_data_yahoo(download_stock, str(download_start), str(download_end))
-            else:
-                df = fetcher.get_stock_data_stooq(download_stock, str(download_start), str(download_end))
+    codes = list(dict.fromkeys(download_stocks + download_codes.replace(',', ' ').split()))
+    if store_only and download_all:
+        codes = fetcher.store.codes(SOURCES[download_source])
+    
+    if st.button("📥 データをダウンロード") and codes:
+        fmt = "csv" if download_format.startswith("CSV") else "parquet"
+        extension = "zip" if fmt == "csv" else "parquet"
+        # ダウンロード時のファイル名は銘柄の組ごとに変え、サーバー上のファイルはリクエストごとに別にする
+        # （他のセッションの書き出しで上書きされないようにする）
+        digest = hashlib.sha1("\n".join(codes).encode()).hexdigest()[:10]
+        file_name = f"stocks_{SOURCES[download_source]}_{download_start}_{download_end}_{digest}.{extension}"
+        export_dir = os.path.join(fetcher.data_dir, "exports")
+        cleanup_exports(export_dir)
+        path = os.path.join(export_dir, f"{uuid.uuid4().hex[:8]}_{file_name}")
+        
+        # 1銘柄ずつ読み込んで書き出すため、銘柄数が多くてもメモリには数銘柄分のみを置く
+        progress = st.progress(0.0, text=f"{len(codes)}銘柄を書き出し中...")
+        done = []
+        
+        def on_result(code: str, rows: int, error):
+            done.append(code)
+            progress.progress(min(1.0, len(done) / len(codes)), text=f"{len(done)}/{len(codes)}銘柄を書き出し中...")
+        
+        summary = export_stocks(fetcher, codes, path,
+                                fmt=fmt,
+                                source=SOURCES[download_source],
+                                start_date=str(download_start),
+                                end_date=str(download_end),
+                                fetch_missing=not store_only,
+                                max_workers=8,
+                                on_result=on_result)
+        progress.empty()
+        
+        if summary['exported']:
+            st.caption(f"{summary['exported']}銘柄・{summary['rows']:,}行（保存済みデータ {summary['from_store']}銘柄, "
+                       f"取得 {summary['fetched']}銘柄）, {summary['bytes'] / 1024 / 1024:.1f}MB")
+            if summary['failed']:
+                st.warning(f"{summary['failed']}銘柄は書き出せませんでした: {', '.join(list(summary['errors'])[:20])}")
             
-            if not df.empty:
-                # CSVダウンロード
-                csv = df.to_csv(index=True, encoding='utf-8-sig')
+            if summary['bytes'] <= DOWNLOAD_LIMIT_BYTES:
+                # ダウンロードボタンはデータをメモリに保持するため、読み込んだファイルは削除する
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.remove(path)
                 st.download_button(
-                    label="📄 CSVファイルをダウンロード",
-                    data=csv,
-                    file_name=f"{download_stock}_{download_source.lower()}_{download_start}_{download_end}.csv",
-                    mime="text/csv"
+                    label=f"📄 {'CSV（zip）' if fmt == 'csv' else 'Parquet'}ファイルをダウンロード",
+                    data=data,
+                    file_name=file_name,
+                    mime="application/zip" if fmt == "csv" else "application/octet-stream"
                 )
-                
-                # データプレビュー
-                st.subheader("データプレビュー")
-                st.dataframe(df.head(10), use_container_width=True)
+            else:
+                # ブラウザへの送信はファイル全体をメモリに読み込むため、大きなファイルはサーバー上のパスを表示する
+                hours = EXPORT_RETENTION_SECONDS // 3600
+                st.info(f"ファイルが大きいため、サーバー上に保存しました（{hours}時間後に削除します）: {os.path.abspath(path)}")
+            
+            # データプレビュー（最初の銘柄）
+            preview = fetcher.load_stock_data(codes[0], str(download_start), str(download_end),
+                                              source=SOURCES[download_source])
+            if not preview.empty:
+                st.subheader(f"データプレビュー（{codes[0]}）")
+                st.dataframe(newest_first(preview).head(10), use_container_width=True)
                 
                 # 基本統計
                 st.subheader("基本統計")
-                st.write(df.describe())
-                
-            else:
-                st.error("データの取得に失敗しました。")
+                st.write(preview.describe())
+            
+        else:
+            os.remove(path)
+            st.error("データの取得に失敗しました。")
 
 # フッター
 st.markdown("---")
@@ -0,0 +1,124 @@
+"""
+JapaneseStockDataFetcher の取得期間・キャッシュのテスト（ローカルのスタンドインサーバーのみを使う）
+"""
+
+import pandas as pd
+import pytest
+from fetch_policy import DataNotFoundError, FetchPolicy
+from ohlcv_schema import PRICE_COLUMNS
+from stand_in_server import StandInServer
+from stock_data_fetcher import JapaneseStockDataFetcher
+
+START, END = "2024-03-01", "2024-03-15"
+
+
+@pytest.fixture(scope="module")
+def server():
+    with StandInServer() as server:
+        yield server
+
+
+def _fetcher(server, tmp_path, name, **policy) -> JapaneseStockDataFetcher:
+    return JapaneseStockDataFetcher(str(tmp_path / name), session=server.session(),
+                                    fetch_policy=FetchPolicy(retries=0, **policy))
+
+
+def test_hedged_yahoo_uses_same_end_date(server, tmp_path):
+    plain = _fetcher(server, tmp_path, "plain").get_stock_data_yahoo("7203.T", START, END)
+    hedged = _fetcher(server, tmp_path, "hedged", hedge=True).get_stock_data_yahoo("7203.T", START, END)
+
+    assert not plain.empty
+    # Yahoo Financeの終了日は当日を含まない
+    assert plain.index[-1] == pd.Timestamp("2024-03-14")
+    assert hedged.index[-1] == plain.index[-1]
+    assert hedged.attrs["source"] == "yahoo"
+
+
+def test_hedged_fallback_requests_same_period(server, tmp_path):
+    fetcher = _fetcher(server, tmp_path, "fallback", hedge=True)
+
+    def missing(code, start, end):
+        raise DataNotFoundError(f"{code}.T: No data found")
+
+    fetcher._fetch_yahoo = missing
+    df = fetcher.get_stock_data_yahoo("7203.T", START, END)
+
+    # Stooqから取得した場合も、Yahoo Financeに指定した期間と同じ日付までを返す
+    assert df.attrs["source"] == "stooq"
+    assert df.index[-1] == pd.Timestamp("2024-03-14")
+
+
+def test_stooq_end_date_is_inclusive(server, tmp_path):
+    plain = _fetcher(server, tmp_path, "plain").get_stock_data_stooq("7203", START, END)
+    hedged = _fetcher(server, tmp_path, "hedged", hedge=True).get_stock_data_stooq("7203", START, END)
+
+    assert plain.index[-1] == pd.Timestamp("2024-03-15")
+    assert hedged.index[-1] == plain.index[-1]
+
+
+def test_cache_appends_only_new_rows(server, tmp_path):
+    fetcher = _fetcher(server, tmp_path, "cache")
+    first = fetcher.get_stock_data_yahoo("7203.T", "2024-01-01", "2024-06-30")
+    extended = fetcher.get_stock_data_yahoo("7203.T", "2024-01-01", "2024-07-31")
+
+    # キャッシュには取得済み期間のみを書き、データはストレージに新しい行だけを追記する
+    assert sorted(p.name for p in (tmp_path / "cache" / "cache" / "yahoo").iterdir()) == ["7203.json"]
+    stored = fetcher.store.read("yahoo", "7203")
+    pd.testing.assert_frame_equal(stored, extended, check_categorical=False)
+    assert fetcher.save(extended, "7203.T", "yahoo") == 0
+    assert len(extended) > len(first)
+
+
+def test_stored_history_is_not_fetched_again(server, tmp_path):
+    fetcher = _fetcher(server, tmp_path, "stored")
+    history = _fetcher(server, tmp_path, "source").get_stock_data_stooq("6758", "2023-01-01", "2024-06-28")
+    fetcher.store.append(history, "stooq", "6758")
+
+    before = server.counts.get("stooq", 0)
+    df = fetcher.get_stock_data_stooq("6758", "2023-06-01", "2024-06-28")
+
+    assert server.counts.get("stooq", 0) == before
+    assert df.index[0] == pd.Timestamp("2023-06-01")
+    assert df.index[-1] == pd.Timestamp("2024-06-28")
+
+
+def _adjust_prices(fetcher: JapaneseStockDataFetcher, ratio: float = 0.5):
+    """分割後のように、データソースが返す過去の価格をすべて変える"""
+    fetch = fetcher._fetch_yahoo
+
+    def adjusted(code, start, end):
+        df = fetch(code, start, end)
+        df[list(PRICE_COLUMNS)] = df[list(PRICE_COLUMNS)] * ratio
+        return df
+
+    fetcher._fetch_yahoo = adjusted
+
+
+def test_adjustment_replaces_all_stored_rows(server, tmp_path):
+    fetcher = _fetcher(server, tmp_path, "adjusted")
+    before = fetcher.get_stock_data_yahoo("7203.T", "2024-01-01", "2024-06-30")
+
+    _adjust_prices(fetcher)
+    after = fetcher.get_stock_data_yahoo("7203.T", "2024-03-01", "2024-07-31")
+
+    # 指定期間より前の保存済みの行も調整後の価格に置き換わり、調整前の価格と混在しない
+    stored = fetcher.load_stock_data("7203", source="yahoo")
+    assert stored.index[0] == before.index[0]
+    assert stored.index[-1] == after.index[-1]
+    assert stored["Close"].iloc[0] == pytest.approx(before["Close"].iloc[0] * 0.5)
+    pd.testing.assert_series_equal(stored["Close"].loc[after.index[0]:], after["Close"], check_names=False)
+
+
+def test_save_rewrites_code_when_prices_changed(server, tmp_path):
+    fetcher = _fetcher(server, tmp_path, "nocache")
+    fetcher.cache = None
+    before = fetcher.get_stock_data_yahoo("7203.T", "2024-01-01", "2024-06-30")
+    fetcher.save(before, "7203.T", "yahoo")
+
+    _adjust_prices(fetcher)
+    after = fetcher.get_stock_data_yahoo("7203.T", "2024-03-01", "2024-07-31")
+    assert fetcher.save(after, "7203.T", "yahoo") == len(after)
+
+    # 期間外の調整前の行は残さない
+    stored = fetcher.store.read("yahoo", "7203")
+    pd.testing.assert_frame_equal(stored, after, check_categorical=False)
@@ -0,0 +1,65 @@
+"""
+stooq_archive の取り込みのテスト（合成アーカイブを使うためネットワークにはアクセスしない）
+"""
+
+import datetime as dt
+import zipfile
+import pandas as pd
+import pytest
+from ohlcv_store import OHLCVStore
+from stand_in_server import write_stooq_archive
+from stooq_archive import import_archive, member_code, parse_member
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = str(tmp_path / "d_jp_txt.zip")
+    write_stooq_archive(path, ["7203", "6758"], dt.date(2005, 1, 1), dt.date(2024, 6, 30))
+    return path
+
+
+def _member(path: str, code: str) -> pd.DataFrame:
+    with zipfile.ZipFile(path) as archive:
+        name = next(name for name in archive.namelist() if member_code(name) == code)
+        return parse_member(archive.read(name), code)
+
+
+def test_import_into_empty_store(archive, tmp_path):
+    store = OHLCVStore(str(tmp_path / "store"))
+    summary = import_archive(archive, store, processes=1)
+
+    assert summary['imported'] == 2
+    assert summary['failed'] == 0
+    assert summary['skipped_rows'] == 0
+    assert store.codes("stooq") == ["6758", "7203"]
+    assert len(store.read("stooq", "7203")) == len(_member(archive, "7203"))
+
+
+def test_import_backfills_history_before_stored_rows(archive, tmp_path):
+    store = OHLCVStore(str(tmp_path / "store"))
+    full = _member(archive, "7203")
+    store.append(full.iloc[-120:], "stooq", "7203")
+
+    summary = import_archive(archive, store, processes=1)
+
+    assert summary['errors'] == {}
+    assert summary['imported'] == 2
+    assert summary['rows'] == 2 * len(full) - 120
+    assert summary['skipped'] == {"7203": 120}
+    stored = store.read("stooq", "7203")
+    assert stored.index[0] == full.index[0]
+    pd.testing.assert_frame_equal(stored, full[stored.columns], check_categorical=False)
+    # 追記したファイルは既存のファイルとまとめ直される
+    assert all(len(store._parts(directory)) == 1 for directory in store._partition_dirs("stooq", "7203"))
+
+
+def test_reimport_reports_skipped_rows(archive, tmp_path):
+    store = OHLCVStore(str(tmp_path / "store"))
+    import_archive(archive, store, processes=1)
+
+    summary = import_archive(archive, store, processes=2)
+
+    assert summary['imported'] == 0
+    assert summary['unchanged'] == 2
+    assert summary['rows'] == 0
+    assert summary['skipped_rows'] == 2 * len(_member(archive, "7203"))
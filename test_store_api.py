@@ -0,0 +1,108 @@
+"""
+store_api のETag・304・LRUキャッシュと、OHLCVStoreの読み込みのテスト（ローカルのサーバーのみを使う）
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+from ohlcv_schema import normalize
+from ohlcv_store import OHLCVStore
+from store_api import StoreAPIClient, StoreAPIServer
+
+
+def _frame(code: str, start: str, periods: int) -> pd.DataFrame:
+    index = pd.bdate_range(start, periods=periods, name="Date")
+    prices = np.linspace(1000, 1100, periods)
+    return normalize(pd.DataFrame({"Open": prices, "High": prices + 5, "Low": prices - 5, "Close": prices,
+                                   "Volume": np.arange(periods) * 1000}, index=index), code)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OHLCVStore(str(tmp_path / "store"))
+    store.append(_frame("7203", "2024-01-01", 120), "stooq", "7203")
+    store.append(_frame("6758", "2024-01-01", 120), "stooq", "6758")
+    return store
+
+
+@pytest.fixture
+def server(store):
+    with StoreAPIServer(store, port=0, cache_entries=2) as server:
+        yield server
+
+
+def _get(server, **params):
+    params.setdefault("codes", "7203,6758")
+    params.setdefault("start", "2024-02-01")
+    params.setdefault("end", "2024-03-31")
+    headers = params.pop("headers", {})
+    return requests.get(f"{server.base_url}/ohlcv", params=params, headers=headers, timeout=10)
+
+
+def test_not_modified_while_store_unchanged(server):
+    first = _get(server)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    second = _get(server, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == etag
+    assert server.stats()["not_modified"] == 1
+
+
+def test_append_changes_etag(server, store):
+    etag = _get(server).headers["ETag"]
+
+    store.append(_frame("7203", "2024-03-01", 5), "stooq", "7203")
+
+    response = _get(server, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_repeated_requests_are_served_from_cache(server):
+    for _ in range(5):
+        assert _get(server).status_code == 200
+    cache = server.stats()["cache"]
+    assert cache["misses"] == 1
+    assert cache["hits"] == 4
+
+
+def test_cache_evicts_least_recently_used(server):
+    for fmt in ("parquet", "arrow", "csv"):
+        assert _get(server, format=fmt).status_code == 200
+    cache = server.stats()["cache"]
+    assert cache["size"] == 2
+    assert cache["evictions"] == 1
+
+
+def test_client_replays_etag(server, store):
+    client = StoreAPIClient(server.base_url)
+    first = client.get(["7203", "6758"], "2024-02-01", "2024-03-31")
+    second = client.get(["7203", "6758"], "2024-02-01", "2024-03-31")
+    assert client.not_modified == 1
+    pd.testing.assert_frame_equal(first, second)
+    expected = store.read("stooq", "7203", "2024-02-01", "2024-03-31")
+    assert len(first[first["code"] == "7203"]) == len(expected)
+
+
+def test_read_retries_when_compacted_concurrently(store, monkeypatch):
+    store.append(_frame("7203", "2024-06-03", 5), "stooq", "7203")
+    store.append(_frame("7203", "2024-06-10", 5), "stooq", "7203")
+    expected = store.read("stooq", "7203")
+
+    # 一覧した直後に別のスレッドがまとめ直し、一覧したファイルが削除された状態を再現する
+    parts = OHLCVStore._parts
+    calls = []
+
+    def stale_parts(directory):
+        listed = parts(directory)
+        if not calls:
+            calls.append(directory)
+            store._compact_partition(directory, 2)
+        return listed
+
+    monkeypatch.setattr(OHLCVStore, "_parts", staticmethod(stale_parts))
+    pd.testing.assert_frame_equal(store.read("stooq", "7203"), expected)
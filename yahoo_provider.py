@@ -0,0 +1,132 @@
+"""
+Yahoo Financeのプロバイダー（yfinanceを使用）
+providers.get_provider("yahoo") で最初に使用する時点で読み込まれる
+"""
+
+import datetime as dt
+import threading
+import pandas as pd
+import requests
+import yfinance as yf
+from typing import Dict, List, Optional, Tuple
+from fetch_policy import DataNotFoundError
+
+# yf.downloadはモジュール共有の状態に結果を書き込むため、同時には1回だけ実行する
+_DOWNLOAD_LOCK = threading.Lock()
+
+# yfinanceが銘柄のデータが無い場合に送出する例外のメッセージ
+# （通信の失敗も同じメッセージになるため、応答の状態コードと合わせて判定する）
+_MISSING_DATA_MESSAGES = ("symbol may be delisted", "No data found", "No price data found")
+
+# スレッドごとの、historyの実行中に受け取った応答
+_responses = threading.local()
+
+
+def _record_response(response: requests.Response, *args, **kwargs):
+    """セッションの応答フック（historyの実行中のみ、このスレッドの応答を記録する）"""
+    received = getattr(_responses, "received", None)
+    if received is not None:
+        received.append(response)
+
+
+class YahooProvider:
+    """Yahoo Financeから日足・銘柄情報を取得する"""
+
+    def ticker(self, code: str, session: Optional[requests.Session] = None) -> "yf.Ticker":
+        """
+        銘柄のTickerを取得（リアルタイム株価・会社情報の取得に使用）
+
+        Args:
+            code (str): 銘柄コード（.Tなし）
+            session (requests.Session): リクエストに使うセッション
+        """
+        return yf.Ticker(f"{code}.T", session=session)
+
+    def history(self,
+                code: str,
+                start: dt.date,
+                end: dt.date,
+                session: Optional[requests.Session] = None,
+                timeout: float = 10.0) -> pd.DataFrame:
+        """
+        指定期間（終了日を含む）の日足を取得
+
+        Args:
+            code (str): 銘柄コード（.Tなし）
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
+            session (requests.Session): リクエストに使うセッション
+            timeout (float): リクエストのタイムアウト（秒）
+
+        Returns:
+            pd.DataFrame: yfinanceのhistory()の結果（失敗時は空にせず例外を送出）
+
+        Raises:
+            DataNotFoundError: Yahoo Financeが応答したが銘柄のデータが無い場合
+            requests.HTTPError / requests.ConnectionError: 通信の失敗・HTTP 5xxの場合
+        """
+        if session is not None and _record_response not in session.hooks.setdefault('response', []):
+            session.hooks['response'].append(_record_response)
+        _responses.received = []
+        try:
+            # historyのendは当日を含まないため1日進める
+            return self.ticker(code, session).history(start=start, end=end + dt.timedelta(days=1),
+                                                      timeout=timeout, raise_errors=True)
+        except Exception as e:
+            if not any(message in str(e) for message in _MISSING_DATA_MESSAGES):
+                raise
+            raise self._classify(e, _responses.received) from e
+        finally:
+            _responses.received = None
+
+    @staticmethod
+    def _classify(error: Exception, responses: List[requests.Response]) -> Exception:
+        """
+        yfinanceの「データが無い」例外を、実際に受け取った応答から分類する
+
+        yfinanceは通信の失敗・HTTP 5xxも「銘柄のデータが無い」として送出するため、
+        Yahoo Financeが応答した（5xx・429以外の応答を受け取った）場合のみDataNotFoundErrorとする。
+        """
+        for response in responses:
+            if response.status_code >= 500 or response.status_code == 429:
+                return requests.HTTPError(str(error), response=response)
+        if not responses:
+            # 応答を受け取っていない（接続できなかった、またはセッションを渡されていない）
+            return requests.ConnectionError(str(error))
+        return DataNotFoundError(str(error))
+
+    def download(self,
+                 codes: List[str],
+                 start: dt.date,
+                 end: dt.date,
+                 session: Optional[requests.Session] = None,
+                 timeout: float = 10.0) -> Tuple[pd.DataFrame, Dict[str, str]]:
+        """
+        複数銘柄の指定期間（終了日を含む）の日足を1回のリクエストで取得
+
+        Args:
+            codes (List[str]): 銘柄コードのリスト（.Tなし）
+            start (dt.date): 開始日
+            end (dt.date): 終了日（この日を含む）
+            session (requests.Session): リクエストに使うセッション
+            timeout (float): リクエストのタイムアウト（秒）
+
+        Returns:
+            Tuple[pd.DataFrame, Dict[str, str]]: 銘柄（"XXXX.T"）ごとに列をまとめたデータと、取得に失敗した銘柄とその理由
+        """
+        # Ticker.history()と同じ列・タイムゾーン付きの日付になるよう指定する
+        with _DOWNLOAD_LOCK:
+            raw = yf.download(
+                [f"{code}.T" for code in codes],
+                start=start,
+                end=end + dt.timedelta(days=1),
+                group_by='ticker',
+                auto_adjust=True,
+                actions=True,
+                ignore_tz=False,
+                progress=False,
+                threads=False,
+                timeout=timeout,
+                session=session
+            )
+            return raw, dict(getattr(yf.shared, '_ERRORS', {}))